@@ -0,0 +1,78 @@
+"""Time of basic_clean and strict_clean on large pages, per parser backend.
+
+    python -m benchmarks.bench_clean [--sizes 1024,3072,5120] [--corpus DIR] [--check]
+
+The baseline is the previous BeautifulSoup implementation, which walked the
+tree once per removed tag and once more for the attributes. With ``--check``
+the benchmark exits with status 1 when a backend is not faster than it.
+"""
+import argparse
+import pathlib
+import sys
+import time
+from typing import Callable, Iterable
+
+from bs4 import BeautifulSoup
+
+from mcp_server_requests.clean import DEFAULT_CLEAN_TAGS, clean_html, has_lxml
+from mcp_server_requests.convert import CONVERTERS
+
+from .fixtures import make_article
+
+
+def bs4_clean_html(html: str, *, allowed_attrs: Iterable[str] | bool = True, clean_tags: Iterable[str] = DEFAULT_CLEAN_TAGS) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in set(clean_tags):
+        for element in soup.find_all(tag):
+            element.decompose()
+    if allowed_attrs is True:
+        pass
+    elif not allowed_attrs:
+        for node in soup.find_all():
+            node.attrs.clear()
+    else:
+        allowed_attrs = {*allowed_attrs}
+        for node in soup.find_all():
+            for attr in [a for a in node.attrs if a not in allowed_attrs]:
+                node.attrs.pop(attr)
+    return str(soup)
+
+
+def timed(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1024,3072,5120", help="sizes of the generated pages in KiB")
+    parser.add_argument("--corpus", type=pathlib.Path, help="directory of .html files to use instead of generated pages")
+    parser.add_argument("--check", action="store_true", help="fail when a backend is slower than the baseline")
+    args = parser.parse_args()
+
+    if args.corpus:
+        pages = {p.name: p.read_text("utf-8", errors="replace") for p in sorted(args.corpus.glob("*.html"))}
+    else:
+        pages = {f"{kb} KiB": make_article(kb) for kb in map(int, args.sizes.split(","))}
+    backends = ["html.parser"] + (["lxml"] if has_lxml() else [])
+
+    failed = False
+    for name, page in pages.items():
+        for mode in ("basic_clean", "strict_clean"):
+            settings = CONVERTERS[mode][1]
+            baseline = timed(lambda: bs4_clean_html(page, **settings))
+            line = f"{name:>10s} {mode:12s} bs4 {baseline:7.3f}s"
+            for backend in backends:
+                elapsed = timed(lambda: clean_html(page, parser=backend, **settings))
+                line += f"  {backend} {elapsed:7.3f}s ({baseline / elapsed:5.1f}x)"
+                failed = failed or elapsed >= baseline
+            print(line)
+
+    if args.check and failed:
+        print("regression: a backend is not faster than the BeautifulSoup baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Bytes on the wire and wall time of a page fetched with and without compression.
+
+    python -m benchmarks.bench_compression [--kb 256] [--bps 2000000] [-n 5]
+"""
+import argparse
+import re
+import time
+
+from mcp_server_requests.pool import ConnectionPool
+from mcp_server_requests.request import http_request
+
+from .fixtures import FixtureServer
+
+
+def run(url: str, n: int, headers: dict[str, str]) -> tuple[float, int, int]:
+    pool = ConnectionPool()
+    start = time.perf_counter()
+    for _ in range(n):
+        response = http_request("GET", url, headers=headers, pool=pool)
+    elapsed = (time.perf_counter() - start) / n
+    decoded = response.annotations.get("Content-Decoded")
+    wire = int(re.search(r"(\d+) bytes transferred", decoded).group(1)) if decoded else len(response.content)
+    return elapsed, wire, len(response.content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=5, help="number of requests per mode")
+    parser.add_argument("--kb", type=int, default=256, help="size of the page in KiB")
+    parser.add_argument("--bps", type=float, default=2_000_000, help="server bandwidth in bytes per second, 0 for unlimited")
+    args = parser.parse_args()
+
+    with FixtureServer() as server:
+        url = f"{server.base_url}/page?kb={args.kb}&bps={args.bps}"
+        for name, headers in (("identity", {"Accept-Encoding": "identity"}), ("negotiated", {})):
+            elapsed, wire, size = run(url, args.n, headers)
+            print(f"{name:12s} {elapsed:8.3f}s per call  {wire:10d} bytes on the wire  {size:10d} bytes decoded")
+
+
+if __name__ == "__main__":
+    main()
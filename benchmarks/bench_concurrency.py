@@ -0,0 +1,49 @@
+"""N concurrent slow calls on one event loop should take about as long as one call.
+
+    python -m benchmarks.bench_concurrency [-n 20] [--delay 0.5]
+"""
+import argparse
+import asyncio
+import time
+
+from mcp_server_requests.request import async_mcp_http_request, mcp_http_request
+
+from .fixtures import FixtureServer
+
+
+async def run_concurrent(url: str, n: int) -> float:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(async_mcp_http_request("GET", url) for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    assert all(" 200 " in r.splitlines()[0] for r in results), results
+    return elapsed
+
+
+def run_sequential(url: str, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        mcp_http_request("GET", url)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=20, help="number of requests")
+    parser.add_argument("--delay", type=float, default=0.5, help="server side delay of each request in seconds")
+    parser.add_argument("--skip-sequential", action="store_true", help="do not run the sequential baseline")
+    args = parser.parse_args()
+
+    with FixtureServer() as server:
+        url = f"{server.base_url}/delay?seconds={args.delay}"
+
+        single = run_sequential(url, 1)
+        concurrent = asyncio.run(run_concurrent(url, args.n))
+        print(f"single call:              {single:8.3f}s")
+        print(f"{args.n:3d} concurrent calls:    {concurrent:8.3f}s  ({concurrent / single:.2f}x single)")
+        if not args.skip_sequential:
+            sequential = run_sequential(url, args.n)
+            print(f"{args.n:3d} sequential calls:    {sequential:8.3f}s  ({sequential / single:.2f}x single)")
+
+
+if __name__ == "__main__":
+    main()
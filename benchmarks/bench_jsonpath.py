@@ -0,0 +1,66 @@
+"""Time and peak memory of JSONPath projections, scanned against ``json.loads``.
+
+    python -m benchmarks.bench_jsonpath [--kb 5120] [-n 3] [--file FILE] [PATH ...]
+
+Without ``--file`` a generated JSON list of records is used, and without
+paths a few typical projections of it.
+"""
+import argparse
+import json
+import pathlib
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from mcp_server_requests.jsonpath import JSONPath, _evaluate, compile_query
+
+from .fixtures import make_json
+
+PATHS = (
+    "$.items[0]",
+    "$.items[-1].name",
+    "$.items[*].id",
+    "$.items[?@.price > 70000].name",
+    "$..name",
+)
+
+
+def measure(select: Callable[[], list[Any]], n: int) -> tuple[float, int, int]:
+    count = len(select())
+    start = time.perf_counter()
+    for _ in range(n):
+        select()
+    elapsed = (time.perf_counter() - start) / n
+
+    tracemalloc.start()
+    try:
+        select()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="JSONPath expressions")
+    parser.add_argument("--file", type=pathlib.Path, help="JSON document")
+    parser.add_argument("--kb", type=int, default=5 * 1024, help="size of the generated document in KiB")
+    parser.add_argument("-n", type=int, default=3, help="number of runs")
+    args = parser.parse_args()
+
+    text = args.file.read_text("utf-8") if args.file else make_json(args.kb).decode("utf-8")
+    print(f"{len(text) / 1024:.0f} KiB")
+    for expression in args.paths or PATHS:
+        path = JSONPath(expression)
+        query = compile_query(expression)
+        for name, select in (
+            ("scan", lambda: path.select(text)),
+            ("json.loads", lambda: list(_evaluate(json.loads(text), query))),
+        ):
+            elapsed, peak, count = measure(select, args.n)
+            print(f"{expression:36s} {name:10s} {elapsed * 1000:9.1f}ms  peak {peak / 1024 ** 2:7.2f} MiB  {count} values")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Time and output size of the ``main`` content extraction against ``markdown``.
+
+    python -m benchmarks.bench_main [--corpus DIR | --generated] [-n 3]
+
+The pages are the corpus of ``bench_suite``: the pages saved in
+``benchmarks/corpus``, every ``*.html`` file in DIR (for example pages saved
+from a browser), or with ``--generated`` synthetic pages. For
+every page the time of both modes and the size of their output is printed,
+``saved`` is how much smaller the ``main`` output is.
+"""
+import argparse
+import pathlib
+import time
+from typing import Callable
+
+from mcp_server_requests.readability import extract_main_content, main_content_to_markdown
+from mcp_server_requests.utils import html_to_markdown
+
+from .fixtures import make_corpus
+
+
+MODES: dict[str, Callable[[str], str]] = {
+    "markdown": html_to_markdown,
+    "main": main_content_to_markdown,
+}
+
+
+def measure(convert: Callable[[str], str], page: str, n: int) -> tuple[float, str]:
+    output = convert(page)
+    start = time.perf_counter()
+    for _ in range(n):
+        convert(page)
+    return (time.perf_counter() - start) / n, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=pathlib.Path, help="directory of .html files")
+    parser.add_argument("--generated", action="store_true", help="use generated pages")
+    parser.add_argument("-n", type=int, default=3, help="number of runs")
+    args = parser.parse_args()
+
+    pages = {name: body.decode("utf-8", errors="replace") for name, body in make_corpus(args.corpus, generated=args.generated).items()}
+    print(f"{'page':24s} {'KiB':>7s} {'markdown':>10s} {'main':>10s} {'extract':>10s} {'markdown':>10s} {'main':>10s} {'saved':>7s}")
+    totals = {mode: [0.0, 0] for mode in MODES}
+    for name, page in pages.items():
+        extract, _ = measure(extract_main_content, page, args.n)
+        times = {}
+        for mode, convert in MODES.items():
+            elapsed, output = measure(convert, page, args.n)
+            times[mode] = (elapsed, len(output))
+            totals[mode][0] += elapsed
+            totals[mode][1] += len(output)
+        (markdown_time, markdown_size), (main_time, main_size) = times["markdown"], times["main"]
+        saved = 1 - main_size / markdown_size if markdown_size else 0
+        print(f"{name[:24]:24s} {len(page) / 1024:7.0f} {markdown_time * 1000:8.1f}ms {main_time * 1000:8.1f}ms"
+              f" {extract * 1000:8.1f}ms {markdown_size:10d} {main_size:10d} {saved:7.1%}")
+    (markdown_time, markdown_size), (main_time, main_size) = totals["markdown"], totals["main"]
+    print(f"\ntotal: markdown {markdown_time:.3f}s {markdown_size} chars, main {main_time:.3f}s {main_size} chars,"
+          f" {main_time / markdown_time:.2f}x the time, {1 - main_size / max(markdown_size, 1):.1%} smaller")
+
+
+if __name__ == "__main__":
+    main()
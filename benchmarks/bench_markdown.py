@@ -0,0 +1,73 @@
+"""Time and peak memory of the HTML to Markdown converters.
+
+    python -m benchmarks.bench_markdown [--corpus DIR | --generated [--kb 512]] [-n 3]
+
+The pages are the corpus of ``bench_suite``: the pages saved in
+``benchmarks/corpus``, or every ``*.html`` file in DIR (for example pages
+saved from a browser). With ``--generated`` a generated documentation like
+page of ``--kb`` KiB is used instead.
+"""
+import argparse
+import pathlib
+import time
+import tracemalloc
+from typing import Callable
+
+from mcp_server_requests.markdown import stream_html_to_markdown
+from mcp_server_requests.utils import simple_html_to_markdown
+
+from .fixtures import make_article, make_corpus
+
+
+def converters() -> dict[str, Callable[[str], str]]:
+    result = {
+        "streaming": stream_html_to_markdown,
+        "simple (bs4)": simple_html_to_markdown,
+    }
+    try:
+        from markdownify import markdownify
+        result["markdownify"] = markdownify
+    except ImportError:
+        pass
+    return result
+
+
+def measure(convert: Callable[[str], str], pages: list[str], n: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    for _ in range(n):
+        for page in pages:
+            convert(page)
+    elapsed = (time.perf_counter() - start) / n
+
+    tracemalloc.start()
+    try:
+        for page in pages:
+            convert(page)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=pathlib.Path, help="directory of .html files")
+    parser.add_argument("--generated", action="store_true", help="use a generated page")
+    parser.add_argument("--kb", type=int, default=512, help="size of the generated page in KiB")
+    parser.add_argument("-n", type=int, default=3, help="number of runs")
+    args = parser.parse_args()
+
+    if args.generated:
+        pages = [make_article(args.kb)]
+    else:
+        pages = [body.decode("utf-8", errors="replace") for body in make_corpus(args.corpus).values()]
+    total = sum(len(p.encode("utf-8")) for p in pages)
+    print(f"{len(pages)} pages, {total / 1024:.0f} KiB")
+
+    for name, convert in converters().items():
+        elapsed, peak = measure(convert, pages, args.n)
+        print(f"{name:14s} {elapsed:8.3f}s  {total / elapsed / 1024 ** 2:7.2f} MiB/s  peak {peak / 1024 ** 2:8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
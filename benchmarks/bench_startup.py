@@ -0,0 +1,67 @@
+"""Cold start time of the CLI and the server, measured with ``python -X importtime``.
+
+    python -m benchmarks.bench_startup [-n 5] [--check] [--budget-ms 250]
+
+Every scenario runs in a fresh interpreter. ``cli`` imports what the click
+subcommands need, ``server`` also builds the MCP server. The time is the
+median of the cumulative import time of ``-n`` runs. With ``--check`` the
+benchmark exits with status 1 when the CLI takes longer than ``--budget-ms``
+or imports one of the heavy dependencies that should only load on first use.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    "cli": "import mcp_server_requests.__main__",
+    "server": "from mcp_server_requests.__main__ import create_mcp_server; create_mcp_server()",
+}
+
+# top level packages the CLI must not import
+HEAVY_MODULES = ("mcp", "bs4", "markdownify", "lxml", "asyncio")
+
+
+def importtime(code: str) -> tuple[float, set[str]]:
+    """Total import time in milliseconds of running ``code``, and the modules it imported."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        if not name.startswith("  "):
+            # the slowest top level import includes everything it imported
+            total += int(cumulative)
+        modules.add(name.strip())
+    return total / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=5, help="runs per scenario")
+    parser.add_argument("--check", action="store_true", help="fail when the CLI is slower than the budget or imports heavy modules")
+    parser.add_argument("--budget-ms", type=float, default=250, help="import time budget of the CLI in milliseconds")
+    args = parser.parse_args()
+
+    failed = False
+    for name, code in SCENARIOS.items():
+        times = []
+        for _ in range(args.n):
+            elapsed, modules = importtime(code)
+            times.append(elapsed)
+        heavy = sorted(m for m in modules if m.split(".")[0] in HEAVY_MODULES and "." not in m)
+        print(f"{name:8s} median {statistics.median(times):7.1f}ms  min {min(times):7.1f}ms  heavy: {', '.join(heavy) or '-'}")
+        if name == "cli":
+            failed = statistics.median(times) > args.budget_ms or bool(heavy)
+
+    if args.check and failed:
+        print(f"regression: the CLI takes more than {args.budget_ms:g}ms to import or imports {', '.join(HEAVY_MODULES)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Throughput, latency percentiles and peak RSS of requests, conversions and tools, saved as JSON.
+
+    python -m benchmarks.bench_suite [-n 20] [--corpus DIR | --generated] [--groups request,convert,tools]
+                                     [--output FILE] [--compare FILE [--check] [--tolerance 0.2]]
+
+Everything runs against the local fixture server, which serves a corpus of
+pages, JSON, and slow and chunked responses. The pages are the ones saved
+from real sites in ``benchmarks/corpus``, every ``*.html`` file in
+``--corpus``, or with ``--generated`` synthetic pages of up to 1 MiB. The
+groups are:
+
+    request   ``http_request`` of every page and endpoint
+    convert   ``format_response_result`` of every page in each ``return_content`` mode
+    tools     ``mcp_http_request``, ``mcp_http_download`` and ``async_mcp_fetch_many`` end to end
+
+Every group runs in a fresh interpreter so its peak RSS is its own. The
+results are written to ``--output``, by default
+``benchmarks/results/<commit>.json``. With ``--compare`` the mean of every
+case is compared to an earlier result file, and with ``--check`` the
+benchmark exits with status 1 when one is slower by more than
+``--tolerance``.
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+from mcp_server_requests.pool import ConnectionPool
+from mcp_server_requests.request import (
+    async_mcp_fetch_many, format_response_result, http_request, mcp_http_download, mcp_http_request,
+)
+
+from .fixtures import FixtureServer, make_corpus
+
+GROUPS = ("request", "convert", "tools")
+RETURN_CONTENTS = ("raw", "basic_clean", "strict_clean", "markdown", "main")
+RESULTS_DIR = pathlib.Path(__file__).parent / "results"
+
+
+def percentile(values: list[float], q: float) -> float:
+    """The ``q`` percentile of sorted ``values`` by the nearest rank."""
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+def peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def measure(group: str, name: str, func: Callable[[], object], n: int, size: int = 0) -> dict:
+    func()  # warm up the connection and the caches of the imports
+    times = []
+    start = time.perf_counter()
+    for _ in range(n):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    times.sort()
+    return {
+        "group": group,
+        "name": name,
+        "n": n,
+        "bytes": size,
+        "mean": elapsed / n,
+        "p50": percentile(times, 0.5),
+        "p95": percentile(times, 0.95),
+        "p99": percentile(times, 0.99),
+        "max": times[-1],
+        "ops_per_s": n / elapsed,
+        "mb_per_s": size * n / elapsed / 1e6 if size else None,
+    }
+
+
+def run_request(base_url: str, corpus: dict[str, bytes], n: int) -> list[dict]:
+    pool = ConnectionPool()
+    cases = [(f"corpus/{name}", f"{base_url}/corpus/{name}", len(body)) for name, body in corpus.items()]
+    cases += [
+        ("json-256k", f"{base_url}/json?kb=256", 256 * 1024),
+        ("chunked-256k", f"{base_url}/chunked?kb=256&chunks=64", 256 * 1024),
+        ("chunked-slow", f"{base_url}/chunked?kb=16&chunks=4&delay=0.005", 16 * 1024),
+        ("delay-10ms", f"{base_url}/delay?seconds=0.01", 0),
+    ]
+    return [measure("request", name, lambda url=url: http_request("GET", url, pool=pool), n, size)
+            for name, url, size in cases]
+
+
+def run_convert(base_url: str, corpus: dict[str, bytes], n: int) -> list[dict]:
+    results = []
+    for name, body in corpus.items():
+        response = http_request("GET", f"{base_url}/corpus/{name}", text_only=True)
+        for mode in RETURN_CONTENTS:
+            results.append(measure("convert", f"{mode}/{name}",
+                                   lambda mode=mode: format_response_result(response, return_content=mode), n, len(body)))
+    return results
+
+
+def run_tools(base_url: str, corpus: dict[str, bytes], n: int) -> list[dict]:
+    import asyncio
+
+    pool = ConnectionPool()
+    results = [
+        measure("tools", f"fetch/{name}",
+                lambda name=name: mcp_http_request("GET", f"{base_url}/corpus/{name}", return_content="markdown", pool=pool),
+                n, len(body))
+        for name, body in corpus.items()
+    ]
+    name, body = max(corpus.items(), key=lambda item: len(item[1]))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "page")
+        for mode in ("raw", "markdown"):
+            results.append(measure("tools", f"fetch_to_file-{mode}/{name}",
+                                   lambda mode=mode: mcp_http_download(f"{base_url}/corpus/{name}", path, return_content=mode, pool=pool),
+                                   n, len(body)))
+    urls = [f"{base_url}/corpus/{name}" for name in corpus]
+    results.append(measure("tools", f"fetch_many/{len(urls)} pages",
+                           lambda: asyncio.run(async_mcp_fetch_many(urls, return_content="markdown", pool=pool)),
+                           n, sum(map(len, corpus.values()))))
+    return results
+
+
+RUNNERS = {"request": run_request, "convert": run_convert, "tools": run_tools}
+
+
+def run_group(group: str, corpus_dir: Optional[pathlib.Path], generated: bool, n: int) -> dict:
+    corpus = make_corpus(corpus_dir, generated=generated)
+    with FixtureServer(corpus=corpus) as server:
+        results = RUNNERS[group](server.base_url, corpus, n)
+    return {"results": results, "peak_rss_kb": peak_rss_kb()}
+
+
+def run_isolated(group: str, args: argparse.Namespace) -> dict:
+    command = [sys.executable, "-m", "benchmarks.bench_suite", "--run-group", group, "-n", str(args.n)]
+    if args.corpus:
+        command += ["--corpus", str(args.corpus)]
+    if args.generated:
+        command.append("--generated")
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    import importlib.util
+
+    from mcp_server_requests.clean import has_lxml
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "lxml": has_lxml(),
+        "markdownify": importlib.util.find_spec("markdownify") is not None,
+    }
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> bool:
+    """Print the mean of every case against ``baseline``, return whether one regressed."""
+    old = {(r["group"], r["name"]): r["mean"] for r in baseline["results"]}
+    print(f"\ncompared to {(baseline['environment'].get('commit') or 'unknown')[:12]}:")
+    regressed = False
+    for r in results:
+        before = old.get((r["group"], r["name"]))
+        if before is None:
+            continue
+        ratio = r["mean"] / before
+        slower = ratio > 1 + tolerance
+        regressed = regressed or slower
+        print(f"  {r['group']:8s} {r['name']:40s} {before * 1000:9.2f}ms -> {r['mean'] * 1000:9.2f}ms  {ratio:5.2f}x{'  slower' if slower else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=20, help="timed runs of every case")
+    parser.add_argument("--corpus", type=pathlib.Path, help="directory of .html files to serve instead of benchmarks/corpus")
+    parser.add_argument("--generated", action="store_true", help="serve generated pages instead of benchmarks/corpus")
+    parser.add_argument("--groups", default=",".join(GROUPS), help="comma separated groups to run")
+    parser.add_argument("--output", type=pathlib.Path, help="result file, benchmarks/results/<commit>.json by default")
+    parser.add_argument("--compare", type=pathlib.Path, help="earlier result file to compare to")
+    parser.add_argument("--check", action="store_true", help="with --compare, fail when a case is slower by more than --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="share a case may be slower than in --compare")
+    parser.add_argument("--run-group", choices=GROUPS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_group:
+        # the child process of run_isolated
+        json.dump(run_group(args.run_group, args.corpus, args.generated, args.n), sys.stdout)
+        return
+
+    if args.corpus and args.generated:
+        parser.error("--corpus and --generated cannot be used together")
+    groups = [g.strip() for g in args.groups.split(",") if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}, expected some of {', '.join(GROUPS)}")
+
+    results = []
+    peak_rss = {}
+    for group in groups:
+        run = run_isolated(group, args)
+        results += run["results"]
+        peak_rss[group] = run["peak_rss_kb"]
+        print(f"{group} (peak RSS {run['peak_rss_kb'] or 0} KiB)")
+        for r in run["results"]:
+            throughput = f"{r['mb_per_s']:8.1f} MB/s" if r["mb_per_s"] else f"{r['ops_per_s']:8.1f} op/s"
+            print(f"  {r['name']:40s} mean {r['mean'] * 1000:9.2f}ms  p50 {r['p50'] * 1000:9.2f}ms"
+                  f"  p95 {r['p95'] * 1000:9.2f}ms  p99 {r['p99'] * 1000:9.2f}ms  {throughput}")
+
+    env = environment()
+    corpus = "generated" if args.generated else str(args.corpus or "benchmarks/corpus")
+    output = args.output or RESULTS_DIR / f"{(env['commit'] or 'unknown')[:12]}{'-dirty' if env['dirty'] else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": env, "n": args.n, "corpus": corpus,
+                   "peak_rss_kb": peak_rss, "results": results}, f, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        if args.check and regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
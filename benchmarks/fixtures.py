@@ -0,0 +1,241 @@
+"""Local HTTP server used by the benchmarks.
+
+Endpoints:
+    /delay?seconds=S    text/plain response sent after sleeping S seconds
+    /page?kb=N&bps=B    N KiB of HTML, gzip encoded when the client accepts it,
+                        sent at B bytes per second when ``bps`` is given
+    /corpus/NAME        page NAME of the corpus given to ``FixtureServer``
+    /json?kb=N          N KiB of JSON
+    /chunked?kb=N&chunks=C&delay=S
+                        N KiB of HTML sent with chunked encoding in C chunks,
+                        sleeping S seconds before each of them
+"""
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import functools
+import gzip
+import json
+import pathlib
+import threading
+import time
+
+
+# pages saved from real sites, see corpus/README.md
+CORPUS_DIR = pathlib.Path(__file__).parent / "corpus"
+
+
+@functools.lru_cache(maxsize=32)
+def make_page(kb: int) -> bytes:
+    """A typical looking HTML page of about ``kb`` KiB."""
+    row = "<tr><td class=\"name\">item {0}</td><td><a href=\"/items/{0}\">details of item {0}</a></td></tr>\n"
+    rows = []
+    size = 0
+    while size < kb * 1024:
+        rows.append(row.format(len(rows)))
+        size += len(rows[-1])
+    return ("<html><body><table>\n" + "".join(rows) + "</table></body></html>").encode("utf-8")
+
+
+def make_article(kb: int) -> str:
+    """A documentation like HTML page of about ``kb`` KiB, with the tags the converters handle."""
+    section = (
+        "<h2>Section {0}</h2>\n"
+        "<p>Paragraph {0} has <strong>bold</strong>, <em>italic</em> and <a href=\"/docs/{0}\">a link</a> in it,"
+        " followed by enough plain text to look like prose in a real document.</p>\n"
+        "<ul><li>first item of {0}</li><li>second item with <code>code</code></li><li>third item</li></ul>\n"
+        "<pre><code>def section_{0}():\n    return {0}\n</code></pre>\n"
+        "<blockquote><p>a quote in section {0}</p></blockquote>\n"
+        "<div class=\"nav\"><span><img src=\"/img/{0}.png\" alt=\"figure {0}\"></span></div><hr>\n"
+    )
+    parts = ["<html><head><title>Article</title><style>body { margin: 0 }</style></head><body><h1>Article</h1>\n"]
+    size = 0
+    while size < kb * 1024:
+        parts.append(section.format(len(parts)))
+        size += len(parts[-1])
+    parts.append("<script>console.log('done')</script></body></html>")
+    return "".join(parts)
+
+
+def make_news(kb: int) -> str:
+    """A news site like HTML page of about ``kb`` KiB, most of it navigation, scripts and ads around the story."""
+    nav = "".join(f"<li><a href=\"/section/{i}\" class=\"nav-link\" data-track=\"nav-{i}\">Section {i}</a></li>" for i in range(40))
+    head = (
+        "<!DOCTYPE html><html lang=\"en\"><head><meta charset=\"utf-8\"><title>Story</title>"
+        "<link rel=\"stylesheet\" href=\"/static/site.css\"><style>.ad { display: block } .nav-link { color: #333 }</style>"
+        "<script>window.dataLayer = window.dataLayer || []; function gtag(){ dataLayer.push(arguments) }</script></head>\n"
+        f"<body><header class=\"site-header\"><nav><ul>{nav}</ul></nav></header>\n"
+        "<main><article><h1 class=\"headline\">A story</h1><p class=\"byline\">By <a href=\"/authors/1\">A. Writer</a></p>\n"
+    )
+    block = (
+        "<p>Paragraph {0} of the story, with <a href=\"/related/{0}\" rel=\"noopener\">a related link</a>"
+        " and <em>some emphasis</em>, long enough to wrap over a few lines in a browser window.</p>\n"
+        "<div class=\"ad\" id=\"ad-{0}\" data-slot=\"{0}\"><iframe src=\"/ads/{0}\" width=\"300\" height=\"250\"></iframe></div>\n"
+        "<figure><img src=\"/img/{0}.jpg\" srcset=\"/img/{0}@2x.jpg 2x\" alt=\"photo {0}\"><figcaption>Photo {0}</figcaption></figure>\n"
+        "<script>gtag('event', 'scroll', {{ depth: {0} }})</script>\n"
+    )
+    parts = [head]
+    size = len(head)
+    while size < kb * 1024:
+        parts.append(block.format(len(parts)))
+        size += len(parts[-1])
+    parts.append("</article></main><footer><p>&copy; The Site</p><ul>" + nav + "</ul></footer></body></html>")
+    return "".join(parts)
+
+
+def make_blog(kb: int) -> str:
+    """A blog post like HTML page of about ``kb`` KiB, a short post among a sidebar, comments and related posts."""
+    links = "".join(f"<li><a href=\"/posts/{i}\">Older post number {i}</a></li>" for i in range(30))
+    parts = [
+        "<!DOCTYPE html><html><head><title>A post</title></head><body>"
+        f"<div id=\"header\"><div class=\"menu\"><ul>{links}</ul></div></div>\n"
+        "<div id=\"wrapper\"><div class=\"post-content\"><h1>A post</h1>\n",
+    ]
+    parts += [
+        f"<p>Paragraph {i} of the post explains one more thing, with a few commas, some words, and"
+        f" <a href=\"/notes/{i}\">a note</a>, so that it reads like the text of a real post.</p>\n"
+        for i in range(12)
+    ]
+    parts.append(f"</div><div class=\"sidebar\"><h3>Archive</h3><ul>{links}</ul></div>\n"
+                 f"<div class=\"related-posts\"><h3>Related</h3><ul>{links}</ul></div>\n<div id=\"comments\">")
+    size = sum(map(len, parts))
+    while size < kb * 1024:
+        comment = (f"<div class=\"comment\"><a href=\"/users/{len(parts)}\">user {len(parts)}</a>"
+                   f"<p>Comment {len(parts)}, nice post, thanks for writing it.</p><a href=\"#reply\">Reply</a></div>\n")
+        parts.append(comment)
+        size += len(comment)
+    parts.append("</div></div><div class=\"footer\"><p>&copy; The Blog</p></div></body></html>")
+    return "".join(parts)
+
+
+@functools.lru_cache(maxsize=32)
+def make_json(kb: int) -> bytes:
+    """A JSON list of records of about ``kb`` KiB."""
+    records = []
+    size = 0
+    while size < kb * 1024:
+        record = {"id": len(records), "name": f"item {len(records)}", "tags": ["a", "b", "c"], "price": len(records) * 1.5, "active": True}
+        records.append(record)
+        size += len(json.dumps(record)) + 2
+    return json.dumps({"items": records}).encode("utf-8")
+
+
+def make_corpus(directory: Optional[pathlib.Path] = None, *, generated: bool = False) -> dict[str, bytes]:
+    """Every ``*.html`` file in ``directory`` by name, ``CORPUS_DIR`` by default.
+
+    With ``generated``, or when ``CORPUS_DIR`` has no pages, generated pages
+    of different sizes and shapes are used instead.
+    """
+    if not generated:
+        pages = {p.name: p.read_bytes() for p in sorted((directory or CORPUS_DIR).glob("*.html"))}
+        if pages or directory is not None:
+            return pages
+    return make_generated_corpus()
+
+
+def make_generated_corpus() -> dict[str, bytes]:
+    """Generated pages of different sizes and shapes by name."""
+    return {
+        "table-16k.html": make_page(16),
+        "article-64k.html": make_article(64).encode("utf-8"),
+        "news-128k.html": make_news(128).encode("utf-8"),
+        "blog-96k.html": make_blog(96).encode("utf-8"),
+        "article-512k.html": make_article(512).encode("utf-8"),
+        "news-1m.html": make_news(1024).encode("utf-8"),
+    }
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # small writes are not held back waiting for the ACK of the headers
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(
+        self,
+        body: bytes,
+        content_type: str = "text/plain; charset=utf-8",
+        status: int = 200,
+        headers: Optional[dict[str, str]] = None,
+        bps: float = 0,
+    ):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if not bps:
+            self.wfile.write(body)
+            return
+        # throttle to ``bps`` bytes per second in pieces of 1/20 second
+        piece = max(1, int(bps / 20))
+        for i in range(0, len(body), piece):
+            self.wfile.write(body[i:i + piece])
+            time.sleep(0.05)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/delay":
+            seconds = float(query.get("seconds", "0.5"))
+            time.sleep(seconds)
+            self.send_body(f"slept {seconds}s".encode("utf-8"))
+        elif url.path == "/page":
+            body = make_page(int(query.get("kb", "256")))
+            headers = {}
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                headers["Content-Encoding"] = "gzip"
+            self.send_body(body, "text/html; charset=utf-8", headers=headers, bps=float(query.get("bps", "0")))
+        elif url.path.startswith("/corpus/"):
+            body = self.server.corpus.get(unquote(url.path[len("/corpus/"):]))
+            if body is None:
+                self.send_body(b"not found", status=404)
+            else:
+                self.send_body(body, "text/html; charset=utf-8")
+        elif url.path == "/json":
+            self.send_body(make_json(int(query.get("kb", "64"))), "application/json")
+        elif url.path == "/chunked":
+            self.send_chunked(make_page(int(query.get("kb", "64"))), int(query.get("chunks", "16")), float(query.get("delay", "0")))
+        else:
+            self.send_body(b"not found", status=404)
+
+    def send_chunked(self, body: bytes, chunks: int, delay: float):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, -(-len(body) // chunks))
+        for i in range(0, len(body), size):
+            if delay:
+                time.sleep(delay)
+            chunk = body[i:i + size]
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FixtureServer:
+    """Run ``FixtureHandler`` on a random local port in a background thread."""
+
+    def __init__(self, handler_class: type[BaseHTTPRequestHandler] = FixtureHandler, corpus: Optional[dict[str, bytes]] = None):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self._server.daemon_threads = True
+        self._server.corpus = corpus or {}
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
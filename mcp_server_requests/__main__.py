@@ -1,13 +1,52 @@
-from typing import Dict, Any, Optional, Literal
+from typing import TYPE_CHECKING, Dict, Any, Optional, Literal
+import dataclasses
+import functools
+import json
 import os
 
 import click
-from mcp.server.fastmcp import FastMCP
 
-from .version import __version__
-from .request import mcp_http_request
+from . import version
+from .request import (
+    ArgumentError,
+    DEFAULT_BATCH_CONCURRENCY, DEFAULT_BATCH_PER_HOST,
+    async_mcp_fetch_many, async_mcp_http_request, format_batch_result, format_error_result,
+    mcp_http_download, mcp_http_request, mcp_read_document, run_blocking,
+)
+from .cache import HTTPCache, DEFAULT_CACHE_SIZE
+from .convert import ConversionCache, DEFAULT_CONVERSION_CACHE_SIZE
+from .delta import DEFAULT_DELTA_STORE_SIZE, DeltaStore
+from .documents import DEFAULT_DOCUMENT_STORE_SIZE, DEFAULT_DOCUMENT_TTL, DocumentStore
+from .jsonpath import JSONPath
+from .pool import ConnectionPool, DEFAULT_POOL_SIZE, DEFAULT_IDLE_TIMEOUT
+from .profiling import PROFILE_MODES, ProfileMode, Profiler
+from .ratelimit import DEFAULT_HOST_BURST, DEFAULT_HOST_CONCURRENCY, RateLimiter
+from .retry import DEFAULT_MAX_RETRIES, RetryBudget, RetryPolicy
+from .selector import Selector
+from .singleflight import SingleFlight
+from .timeout import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_TOTAL_TIMEOUT, Timeouts
+from .timing import LatencyRecorder
 from .ua import list_ua_browsers, list_ua_oses, random_ua
-from .utils import parse
+from .utils import parse, parse_size
+
+if TYPE_CHECKING:
+    from mcp.server.fastmcp import FastMCP
+
+
+# the tools of the server that send requests, which --profile-tools selects from
+TOOLS = ("fetch", "fetch_many", "fetch_to_file", "http_get", "http_post", "http_put", "http_patch", "http_delete")
+
+
+class SizeParamType(click.ParamType):
+    name = "size"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, int):
+            return value
+        try:
+            return parse_size(value)
+        except ValueError as e:
+            self.fail(str(e), param, ctx)
 
 
 def get_user_agent(
@@ -16,74 +55,279 @@ def get_user_agent(
     ua_random: bool = False,
     ua_os: str | None = None,
     ua_browser: str | None = None,
+    ua_type: str | None = None,
 ) -> str:
     if not ua and ua_random:
-        ua = random_ua(browser=ua_browser, os=ua_os)
+        ua = random_ua(browser=ua_browser, os=ua_os, type=ua_type)
         if not ua:
-            raise RuntimeError(f"can't find suitable user-agent, os or browser: {ua_os}, {ua_browser}, try a different combination.")
+            raise RuntimeError(f"can't find suitable user-agent, os, browser or type: {ua_os}, {ua_browser}, {ua_type}, try a different combination.")
 
     if not ua:
-        ua = f"Mozilla/5.0 (compatible; mcp-server-requests/{__version__})"
+        ua = f"Mozilla/5.0 (compatible; mcp-server-requests/{version.__version__})"
 
     return ua
 
 
+def limit_bytes(*limits: Optional[int]) -> Optional[int]:
+    """The strictest of the given byte limits, ``None`` means no limit."""
+    limits = [limit for limit in limits if limit is not None]
+    return min(limits) if limits else None
+
+
 def create_mcp_server(
     *,
     ua: str | None = None,
     ua_random: bool = False,
     ua_os: str | None = None,
     ua_browser: str | None = None,
+    ua_type: str | None = None,
+    ua_rotate: bool = False,
     ua_force: bool | None = None,
-) -> FastMCP:
+    pool_size: int = DEFAULT_POOL_SIZE,
+    pool_idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    conversion_cache_size: int = DEFAULT_CONVERSION_CACHE_SIZE,
+    document_store_size: int = DEFAULT_DOCUMENT_STORE_SIZE,
+    document_ttl: float = DEFAULT_DOCUMENT_TTL,
+    delta_store_size: int = DEFAULT_DELTA_STORE_SIZE,
+    max_content_length: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    batch_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    batch_per_host: int = DEFAULT_BATCH_PER_HOST,
+    timeouts: Timeouts = Timeouts(),
+    retries: int = DEFAULT_MAX_RETRIES,
+    retry_post: bool = False,
+    host_rate: Optional[float] = None,
+    host_burst: int = DEFAULT_HOST_BURST,
+    host_concurrency: Optional[int] = DEFAULT_HOST_CONCURRENCY,
+    adaptive_rate: bool = False,
+    report_timing: bool = False,
+    profile_dir: Optional[str] = None,
+    profile_mode: ProfileMode = "cpu",
+    profile_sample: float = 1.0,
+    profile_threshold: float = 0.0,
+    profile_tools: Optional[set[str]] = None,
+) -> "FastMCP":
+    # the CLI subcommands do not need the MCP SDK, it is imported only to run the server
+    from mcp.server.fastmcp import FastMCP
 
     mcp = FastMCP("Requests", log_level="ERROR")
 
-    ua = get_user_agent(ua=ua, ua_random=ua_random, ua_os=ua_os, ua_browser=ua_browser)
+    pool = ConnectionPool(max_per_host=pool_size, idle_timeout=pool_idle_timeout)
+    cache = HTTPCache(cache_size) if cache_size > 0 else None
+    conversion_cache = ConversionCache(conversion_cache_size) if conversion_cache_size > 0 else None
+    documents = DocumentStore(document_store_size, document_ttl) if document_store_size > 0 else None
+    deltas = DeltaStore(delta_store_size) if delta_store_size > 0 else None
+    retry = RetryPolicy(max_retries=retries)
+    if retry_post:
+        retry = retry.retry_post()
+    retry_budget = RetryBudget()
+    single_flight = SingleFlight()
+    latency = LatencyRecorder()
+    rate_limiter = RateLimiter(rate=host_rate, burst=host_burst, max_concurrency=host_concurrency, adaptive=adaptive_rate)
+    profiler = None
+    unknown_tools = sorted(set(profile_tools or ()) - set(TOOLS))
+    if unknown_tools:
+        raise ValueError(f"unknown tools to profile: {', '.join(unknown_tools)}, expected some of {', '.join(TOOLS)}")
+    if profile_dir is not None:
+        profiler = Profiler(profile_dir, mode=profile_mode, sample_rate=profile_sample, threshold=profile_threshold)
+
+    ua = get_user_agent(ua=ua, ua_random=ua_random, ua_os=ua_os, ua_browser=ua_browser, ua_type=ua_type)
+    if ua_random and ua_rotate:
+        # a new random user agent for every request
+        ua = functools.partial(random_ua, browser=ua_browser, os=ua_os, type=ua_type)
+
+    server_max_bytes = max_bytes
+    server_timeouts = timeouts
+
+    def call_timeouts(timeout: Optional[float]) -> Timeouts:
+        # the timeout given to a tool replaces the total deadline of the server,
+        # and the connect and read timeouts of the server are clamped to it
+        if timeout is None:
+            return server_timeouts
+        if timeout <= 0:
+            raise ArgumentError(f"timeout must be greater than 0, got {timeout}")
+        return server_timeouts.within(timeout)
+
+    def call_selector(css: Optional[str], xpath: Optional[str]) -> Optional[Selector]:
+        # an invalid selector, or both of them, is reported by the request
+        if css is None and xpath is None:
+            return None
+        return Selector(css=css, xpath=xpath)
+
+    def call_json_path(json_path: Optional[str]) -> Optional[JSONPath]:
+        return JSONPath(json_path) if json_path is not None else None
+
+    options = dict(
+        user_agent=ua,
+        force_user_agnet=ua_force,
+        pool=pool,
+        cache=cache,
+        conversion_cache=conversion_cache,
+        max_content_length=max_content_length,
+        retry=retry,
+        retry_budget=retry_budget,
+        rate_limiter=rate_limiter,
+        single_flight=single_flight,
+        latency=latency,
+        report_timing=report_timing,
+    )
+
+    def tool_options(tool: str) -> dict[str, Any]:
+        # only the selected tools are profiled, all of them if none is selected
+        if profiler is None or (profile_tools is not None and tool not in profile_tools):
+            return options
+        return dict(options, profiler=profiler)
 
     @mcp.tool()
-    def fetch(url: str, *, return_content: Literal['raw', 'basic_clean', 'strict_clean', 'markdown'] = "markdown") -> str:
+    async def fetch(
+        url: str,
+        *,
+        return_content: Literal['raw', 'basic_clean', 'strict_clean', 'markdown', 'main'] = "markdown",
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+        css: Optional[str] = None,
+        xpath: Optional[str] = None,
+        json_path: Optional[str] = None,
+        delta: bool = False,
+    ) -> str:
         """获取网页内容。
         - 如果是 HTML, 则根据 returm 返回合适的内容，
         - 如果不是 HTML，但是是 Text 或 Json 内容，则直接返回其内容。
         - 如果是其它类型的内容，则返回错误信息。
+        - 如果指定了 offset 或 limit，只返回转换后内容的一页，并附带 X-MCP-Document（文档句柄）、X-MCP-Range（本页的字符范围和总字符数）
+          以及 X-MCP-Next-Offset（下一页的 offset，没有下一页时不附带）。转换后的内容会在服务端保留一段时间，
+          之后用相同的 url 和新的 offset 调用 fetch，或用句柄调用 read_document，都直接从内存返回，不会重新下载和转换。
+        - 如果 delta 为 true，服务端会保留转换后的内容，之后再次用相同参数获取该 URL 时只返回变化的部分，并附带 X-MCP-Delta 说明变化情况：
+          new（第一次获取，返回全部内容）、unchanged（没有变化）、diff（返回 unified diff）或 replaced（变化太大，返回全部内容）。
 
         Args:
             url (str): 要获取的网页 URL。
-            return_content ("raw" | "basic_clean" | "strict_clean" | "markdown", optional): 默认为 "markdown"，用于控制返回 html 内容的方式，
+            return_content ("raw" | "basic_clean" | "strict_clean" | "markdown" | "main", optional): 默认为 "markdown"，用于控制返回 html 内容的方式，
                 - 如果为 raw，返回原始 HTML 内容。
                 - 如果为 basic_clean，返回过滤后的 HTML 内容，过滤掉所有不会显示的标签，如 script, style 等。
                 - 如果为 strict_clean，返回过滤后的 HTML 内容，过滤掉所有不会显示的标签，如 script, style 等，并且会删除大部分无用的 HTML 属性。
                 - 如果为 markdown，HTML 转换为 Markdown 后返回。
+                - 如果为 main，去掉导航、侧边栏、页脚、广告等内容，只提取正文部分转换为 Markdown 后返回，适合新闻、博客等文章页面。
+            max_bytes (int, optional): 可选参数，最多读取的响应内容字节数，同时也限制返回内容的字节数，超出的部分会被截断并标注。
+            timeout (float, optional): 可选参数，整个请求最多允许的秒数，默认使用服务的设置，超时后返回超时错误；
+                连接和每次等待读取数据的超时也不会超过它。
+            offset (int, optional): 可选参数，返回的一页从转换后内容的第几个字符开始，默认为 0。
+            limit (int, optional): 可选参数，一页最多返回的字符数，指定了 offset 时默认为 20000。
+            css (str, optional): 可选参数，CSS 选择器，如 "main article"，只处理并返回 HTML 中与之匹配的元素，不能与 xpath 同时使用。
+            xpath (str, optional): 可选参数，XPath 表达式，如 "//table[1]"，作用与 css 相同，需要服务端安装 lxml。
+            json_path (str, optional): 可选参数，JSONPath 表达式，如 "$.data.items[?@.price < 10].name"，只对 JSON 响应有效，
+                在服务端解析 JSON，只返回匹配的值组成的 JSON 数组，适合只需要大响应中少量字段的情况；响应状态码不是 2xx 时返回原始内容。
+            delta (bool, optional): 可选参数，默认为 false，为 true 时只返回与上次获取该 URL 相比变化的部分，适合反复查看同一页面的情况，
+                页面没有变化时几乎不需要传输和转换；不能与 offset 或 limit 同时使用。
 
         Returns:
             - 如果 return_content 为 raw，返回原始 HTML 内容。
             - 如果 return_content 为 basic_clean，返回过滤后的 HTML 内容，过滤掉所有不会显示的标签，如 script, style 等。
             - 如果 return_content 为 strict_clean，返回过滤后的 HTML 内容，过滤掉所有不会显示的标签，如 script, style 等，并且会删除大部分无用的 HTML 属性。
             - 如果 return_content 为 markdown，HTML 转换为 Markdown 后返回。
+            - 如果 return_content 为 main，只返回正文部分转换后的 Markdown。
+        """
+        try:
+            timeouts = call_timeouts(timeout)
+        except ArgumentError as e:
+            return format_error_result(e)
+        return await async_mcp_http_request("GET", url, return_content=return_content, format_headers=False,
+                                            max_bytes=limit_bytes(max_bytes, server_max_bytes),
+                                            timeouts=timeouts, documents=documents, offset=offset, limit=limit,
+                                            selector=call_selector(css, xpath), json_path=call_json_path(json_path),
+                                            deltas=deltas, delta=delta, **tool_options("fetch"))
+
+    @mcp.tool()
+    async def read_document(
+        handle: str,
+        *,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> str:
+        """读取之前分页获取的文档的一页，直接从服务端内存返回，不发送请求。
+
+        Args:
+            handle (str): 分页调用 fetch 时结果中 X-MCP-Document 的值。
+            offset (int, optional): 可选参数，这一页从第几个字符开始，默认为 0，通常使用上一页结果中 X-MCP-Next-Offset 的值。
+            limit (int, optional): 可选参数，一页最多返回的字符数，默认为 20000。
+
+        Returns:
+            格式与分页调用 fetch 的结果相同。如果文档已过期或不存在，返回错误信息，此时需要重新分页调用 fetch。
         """
-        return mcp_http_request("GET", url, return_content=return_content, user_agent=ua, force_user_agnet=ua_force, format_headers=False)
+        return mcp_read_document(handle, documents=documents, offset=offset, limit=limit)
 
     @mcp.tool()
-    def fetch_to_file(
+    async def fetch_many(
+        urls: list[str],
+        *,
+        return_content: Literal['raw', 'basic_clean', 'strict_clean', 'markdown', 'main'] = "markdown",
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """并发获取多个网页的内容，每个网页的处理方式与 fetch 相同。
+        需要一次获取多个网页（如搜索结果、文档页面）时，应使用该工具而不是多次调用 fetch。
+
+        Args:
+            urls (list[str]): 要获取的网页 URL 列表，最多 100 个。
+            return_content ("raw" | "basic_clean" | "strict_clean" | "markdown" | "main", optional): 默认为 "markdown"，与 fetch 的 return_content 相同。
+            max_bytes (int, optional): 可选参数，每个网页最多读取的响应内容字节数，同时也限制每个网页返回内容的字节数，超出的部分会被截断并标注。
+            timeout (float, optional): 可选参数，整个请求最多允许的秒数，默认使用服务的设置，超时后返回超时错误；
+                连接和每次等待读取数据的超时也不会超过它。
+
+        Returns:
+            str: 按 urls 的顺序排列的每个网页的结果，每个结果以 "--- [序号/总数] URL ---" 开头，
+                获取失败的网页在对应位置返回错误信息，不影响其它网页。
+        """
+        try:
+            results = await async_mcp_fetch_many(
+                urls,
+                max_concurrency=batch_concurrency,
+                max_per_host=batch_per_host,
+                return_content=return_content,
+                format_headers=False,
+                max_bytes=limit_bytes(max_bytes, server_max_bytes),
+                timeouts=call_timeouts(timeout),
+                **tool_options("fetch_many"),
+            )
+        except ArgumentError as e:
+            return format_error_result(e)
+        return format_batch_result(urls, results)
+
+    @mcp.tool()
+    async def fetch_to_file(
         url: str,
         file_path: str,
         *,
-        return_content: Literal['raw', 'basic_clean', 'strict_clean', 'markdown'] = "markdown"
+        return_content: Literal['raw', 'basic_clean', 'strict_clean', 'markdown', 'main'] = "markdown",
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        css: Optional[str] = None,
+        xpath: Optional[str] = None,
     ) -> str:
         """获取网页内容并保存到文件。
-        - 如果是 HTML, 则根据 return_content 返回合适的内容，
+        - 如果 return_content 为 raw，则以流式方式将响应内容原样写入文件，支持任意类型的内容（包括二进制文件），适合下载大文件。
+        - 如果是 HTML, 则根据 return_content 保存合适的内容，
         - 如果不是 HTML，但是是 Text 或 Json 内容，则直接保存其内容。
         - 如果是其它类型的内容，则返回错误信息。
+        - 文件中只包含响应内容，不包含状态行；如果响应状态码不是 2xx，则不会写入文件并返回错误信息。
 
         Args:
             url (str): 要获取的网页 URL。
             file_path (str): 要保存到的文件路径，必须是绝对路径。
-            return_content ("raw" | "basic_clean" | "strict_clean" | "markdown", optional): 默认为 "markdown"，用于控制返回 html 内容的方式，
-                - 如果为 raw，返回原始 HTML 内容。
+            return_content ("raw" | "basic_clean" | "strict_clean" | "markdown" | "main", optional): 默认为 "markdown"，用于控制返回 html 内容的方式，
+                - 如果为 raw，保存原始内容，不做任何处理。
                 - 如果为 basic_clean，返回过滤后的 HTML 内容，过滤掉所有不会显示的标签，如 script, style 等。
                 - 如果为 strict_clean，返回过滤后的 HTML 内容，过滤掉所有不会显示的标签，如 script, style 等，并且会删除大部分无用的 HTML 属性。
                 - 如果为 markdown，HTML 转换为 Markdown 后返回。
+                - 如果为 main，去掉导航、侧边栏、页脚、广告等内容，只提取正文部分转换为 Markdown 后返回，适合新闻、博客等文章页面。
+            max_bytes (int, optional): 可选参数，最多读取的响应内容字节数，同时也限制写入文件的字节数，超出的部分会被截断。
+            timeout (float, optional): 可选参数，整个请求最多允许的秒数，默认使用服务的设置，超时后返回超时错误；
+                连接和每次等待读取数据的超时也不会超过它。
+            css (str, optional): 可选参数，CSS 选择器，只处理并保存 HTML 中与之匹配的元素，不能与 xpath 同时使用。
+            xpath (str, optional): 可选参数，XPath 表达式，作用与 css 相同，需要服务端安装 lxml。
 
         Returns:
             - 成功时返回文件保存路径
@@ -116,24 +360,29 @@ def create_mcp_server(
             if file_path.startswith(protected):
                 return f"Error: Do not allow writing to protected paths: {protected}"
 
-        # 获取内容
-        content = mcp_http_request("GET", url, return_content=return_content,
-                                   user_agent=ua, force_user_agnet=ua_force,
-                                   format_headers=False)
+        # 原样下载时写入的是文件而不是返回给模型的内容，所以只使用调用时指定的 max_bytes
+        if return_content != "raw":
+            max_bytes = limit_bytes(max_bytes, server_max_bytes)
 
-        # 写入文件
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        try:
+            timeouts = call_timeouts(timeout)
+        except ArgumentError as e:
+            return format_error_result(e)
 
-        return f"File written successfully to: {file_path}"
+        # 获取内容并写入文件
+        return await run_blocking(mcp_http_download, url, file_path, return_content=return_content, max_bytes=max_bytes,
+                                  timeouts=timeouts, selector=call_selector(css, xpath),
+                                  **tool_options("fetch_to_file"))
 
     @mcp.tool()
-    def http_get(
+    async def http_get(
         url: str,
         *,
         query: Optional[Dict[str, str | int | float]] = None,
-        headers: Optional[Dict[str, str]] = None
+        headers: Optional[Dict[str, str]] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        json_path: Optional[str] = None,
     ) -> str:
         """执行 HTTP GET 请求。
 
@@ -142,20 +391,35 @@ def create_mcp_server(
             query (Dict[str, str | int | float], optional): 可选参数，查询参数键值对。参数值会自动转换为字符串，并且会拼接到 url 里。
                 例如: {'key1': 'value1', 'key2': 2}会被转换为key1=value1&key2=2，并拼接到 url。
             headers (Dict[str, str], optional): 可选参数，自定义的 http 请求头。
+            max_bytes (int, optional): 可选参数，最多读取的响应内容字节数，同时也限制返回内容的字节数，超出的部分会被截断并标注。
+            timeout (float, optional): 可选参数，整个请求最多允许的秒数，默认使用服务的设置，超时后返回超时错误；
+                连接和每次等待读取数据的超时也不会超过它。
+            json_path (str, optional): 可选参数，JSONPath 表达式，如 "$.data.items[?@.price < 10].name"，只对 JSON 响应有效，
+                在服务端解析 JSON，只返回匹配的值组成的 JSON 数组，适合只需要大响应中少量字段的情况；响应状态码不是 2xx 时返回原始内容。
 
         Returns:
             str: 标准HTTP响应格式的字符串，包含状态行、响应头和响应体。
         """
-        return mcp_http_request("GET", url, query=query, headers=headers, user_agent=ua, force_user_agnet=ua_force)
+        try:
+            timeouts = call_timeouts(timeout)
+        except ArgumentError as e:
+            return format_error_result(e)
+        return await async_mcp_http_request("GET", url, query=query, headers=headers,
+                                            max_bytes=limit_bytes(max_bytes, server_max_bytes),
+                                            timeouts=timeouts, json_path=call_json_path(json_path),
+                                            **tool_options("http_get"))
 
     @mcp.tool()
-    def http_post(
+    async def http_post(
         url: str,
         *,
         query: Optional[Dict[str, str | int | float]] = None,
         headers: Optional[Dict[str, str]] = None,
         data: Optional[str] = None,
         json: Optional[Any] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        json_path: Optional[str] = None,
     ) -> str:
         """执行 HTTP POST 请求。
 
@@ -166,20 +430,35 @@ def create_mcp_server(
             headers (Dict[str, str], optional): 可选参数，自定义的 http 请求头。
             data (str, optional): 可选参数，要发送的 http 请求体数据，必须是文本，data 和 json 参数不能同时使用。
             json (Any, optional): 可选参数，要发送的 http 请求体数据，以 JSON 数据，会自动序列化为JSON字符串，data 和 json 参数不能同时使用。
+            max_bytes (int, optional): 可选参数，最多读取的响应内容字节数，同时也限制返回内容的字节数，超出的部分会被截断并标注。
+            timeout (float, optional): 可选参数，整个请求最多允许的秒数，默认使用服务的设置，超时后返回超时错误；
+                连接和每次等待读取数据的超时也不会超过它。
+            json_path (str, optional): 可选参数，JSONPath 表达式，如 "$.data.items[?@.price < 10].name"，只对 JSON 响应有效，
+                在服务端解析 JSON，只返回匹配的值组成的 JSON 数组，适合只需要大响应中少量字段的情况；响应状态码不是 2xx 时返回原始内容。
 
         Returns:
             str: 标准HTTP响应格式的字符串，包含状态行、响应头和响应体。
         """
-        return mcp_http_request("POST", url, query=query, data=data, json=json, headers=headers, user_agent=ua, force_user_agnet=ua_force)
+        try:
+            timeouts = call_timeouts(timeout)
+        except ArgumentError as e:
+            return format_error_result(e)
+        return await async_mcp_http_request("POST", url, query=query, data=data, json=json, headers=headers,
+                                            max_bytes=limit_bytes(max_bytes, server_max_bytes),
+                                            timeouts=timeouts, json_path=call_json_path(json_path),
+                                            **tool_options("http_post"))
 
     @mcp.tool()
-    def http_put(
+    async def http_put(
         url: str,
         *,
         query: Optional[Dict[str, str | int | float]] = None,
         headers: Optional[Dict[str, str]] = None,
         data: Optional[str] = None,
         json: Optional[Any] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        json_path: Optional[str] = None,
     ) -> str:
         """执行 HTTP PUT 请求。
 
@@ -190,20 +469,35 @@ def create_mcp_server(
             headers (Dict[str, str], optional): 可选参数，自定义的 http 请求头。
             data (str, optional): 可选参数，要发送的 http 请求体数据，必须是文本，data 和 json 参数不能同时使用。
             json (Any, optional): 可选参数，要发送的 http 请求体数据，以 JSON 数据，会自动序列化为JSON字符串，data 和 json 参数不能同时使用。
+            max_bytes (int, optional): 可选参数，最多读取的响应内容字节数，同时也限制返回内容的字节数，超出的部分会被截断并标注。
+            timeout (float, optional): 可选参数，整个请求最多允许的秒数，默认使用服务的设置，超时后返回超时错误；
+                连接和每次等待读取数据的超时也不会超过它。
+            json_path (str, optional): 可选参数，JSONPath 表达式，如 "$.data.items[?@.price < 10].name"，只对 JSON 响应有效，
+                在服务端解析 JSON，只返回匹配的值组成的 JSON 数组，适合只需要大响应中少量字段的情况；响应状态码不是 2xx 时返回原始内容。
 
         Returns:
             str: 标准HTTP响应格式的字符串，包含状态行、响应头和响应体。
         """
-        return mcp_http_request("PUT", url, query=query, data=data, json=json, headers=headers, user_agent=ua, force_user_agnet=ua_force)
+        try:
+            timeouts = call_timeouts(timeout)
+        except ArgumentError as e:
+            return format_error_result(e)
+        return await async_mcp_http_request("PUT", url, query=query, data=data, json=json, headers=headers,
+                                            max_bytes=limit_bytes(max_bytes, server_max_bytes),
+                                            timeouts=timeouts, json_path=call_json_path(json_path),
+                                            **tool_options("http_put"))
 
     @mcp.tool()
-    def http_patch(
+    async def http_patch(
         url: str,
         *,
         query: Optional[Dict[str, str | int | float]] = None,
         headers: Optional[Dict[str, str]] = None,
         data: Optional[str] = None,
         json: Optional[Any] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        json_path: Optional[str] = None,
     ) -> str:
         """执行H TTP PATCH 请求。
 
@@ -214,20 +508,35 @@ def create_mcp_server(
             headers (Dict[str, str], optional): 可选参数，自定义的 http 请求头。
             data (str, optional): 可选参数，要发送的 http 请求体数据，必须是文本，data 和 json 参数不能同时使用。
             json (Any, optional): 可选参数，要发送的 http 请求体数据，以 JSON 数据，会自动序列化为JSON字符串，data 和 json 参数不能同时使用。
+            max_bytes (int, optional): 可选参数，最多读取的响应内容字节数，同时也限制返回内容的字节数，超出的部分会被截断并标注。
+            timeout (float, optional): 可选参数，整个请求最多允许的秒数，默认使用服务的设置，超时后返回超时错误；
+                连接和每次等待读取数据的超时也不会超过它。
+            json_path (str, optional): 可选参数，JSONPath 表达式，如 "$.data.items[?@.price < 10].name"，只对 JSON 响应有效，
+                在服务端解析 JSON，只返回匹配的值组成的 JSON 数组，适合只需要大响应中少量字段的情况；响应状态码不是 2xx 时返回原始内容。
 
         Returns:
             str: 标准HTTP响应格式的字符串，包含状态行、响应头和响应体。
         """
-        return mcp_http_request("PATCH", url, query=query, data=data, json=json, headers=headers, user_agent=ua, force_user_agnet=ua_force)
+        try:
+            timeouts = call_timeouts(timeout)
+        except ArgumentError as e:
+            return format_error_result(e)
+        return await async_mcp_http_request("PATCH", url, query=query, data=data, json=json, headers=headers,
+                                            max_bytes=limit_bytes(max_bytes, server_max_bytes),
+                                            timeouts=timeouts, json_path=call_json_path(json_path),
+                                            **tool_options("http_patch"))
 
     @mcp.tool()
-    def http_delete(
+    async def http_delete(
         url: str,
         *,
         query: Optional[Dict[str, str | int | float]] = None,
         headers: Optional[Dict[str, str]] = None,
         data: Optional[str] = None,
         json: Optional[Any] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        json_path: Optional[str] = None,
     ) -> str:
         """执行 HTTP DELETE 请求。
 
@@ -238,11 +547,83 @@ def create_mcp_server(
             headers (Dict[str, str], optional): 可选参数，自定义的 http 请求头。
             data (str, optional): 可选参数，要发送的 http 请求体数据，必须是文本，data 和 json 参数不能同时使用。
             json (Any, optional): 可选参数，要发送的 http 请求体数据，以 JSON 数据，会自动序列化为JSON字符串，data 和 json 参数不能同时使用。
+            max_bytes (int, optional): 可选参数，最多读取的响应内容字节数，同时也限制返回内容的字节数，超出的部分会被截断并标注。
+            timeout (float, optional): 可选参数，整个请求最多允许的秒数，默认使用服务的设置，超时后返回超时错误；
+                连接和每次等待读取数据的超时也不会超过它。
+            json_path (str, optional): 可选参数，JSONPath 表达式，如 "$.data.items[?@.price < 10].name"，只对 JSON 响应有效，
+                在服务端解析 JSON，只返回匹配的值组成的 JSON 数组，适合只需要大响应中少量字段的情况；响应状态码不是 2xx 时返回原始内容。
 
         Returns:
             str: 标准HTTP响应格式的字符串，包含状态行、响应头和响应体。
         """
-        return mcp_http_request("DELETE", url, query=query, data=data, json=json, headers=headers, user_agent=ua, force_user_agnet=ua_force)
+        try:
+            timeouts = call_timeouts(timeout)
+        except ArgumentError as e:
+            return format_error_result(e)
+        return await async_mcp_http_request("DELETE", url, query=query, data=data, json=json, headers=headers,
+                                            max_bytes=limit_bytes(max_bytes, server_max_bytes),
+                                            timeouts=timeouts, json_path=call_json_path(json_path),
+                                            **tool_options("http_delete"))
+
+    @mcp.resource("stats://pool", mime_type="application/json")
+    def pool_stats() -> str:
+        """连接池统计信息：复用次数、未命中次数、命中率以及当前空闲连接数。"""
+        stats = pool.stats()
+        return json.dumps({**dataclasses.asdict(stats), "hit_rate": stats.hit_rate})
+
+    @mcp.resource("stats://cache", mime_type="application/json")
+    def cache_stats() -> str:
+        """HTTP 缓存统计信息：命中、未命中、重新验证次数，以及缓存条目数和占用字节数。"""
+        stats = cache.stats() if cache is not None else None
+        return json.dumps(dataclasses.asdict(stats) if stats is not None else {})
+
+    @mcp.resource("stats://conversion-cache", mime_type="application/json")
+    def conversion_cache_stats() -> str:
+        """HTML 转换缓存统计信息：命中、未命中次数，以及缓存条目数和占用字节数。"""
+        stats = conversion_cache.stats() if conversion_cache is not None else None
+        return json.dumps(dataclasses.asdict(stats) if stats is not None else {})
+
+    @mcp.resource("stats://retry", mime_type="application/json")
+    def retry_stats() -> str:
+        """重试统计信息：重试次数、因重试预算耗尽而放弃重试的次数，以及记录了重试预算的主机数。"""
+        return json.dumps(dataclasses.asdict(retry_budget.stats()))
+
+    @mcp.resource("stats://rate-limit", mime_type="application/json")
+    def rate_limit_stats() -> str:
+        """限流统计信息：请求数、需要排队等待的次数和总等待秒数，以及每个主机当前的并发数、排队数和自适应降速系数。"""
+        return json.dumps(dataclasses.asdict(rate_limiter.stats()))
+
+    @mcp.resource("stats://coalesce", mime_type="application/json")
+    def coalesce_stats() -> str:
+        """请求合并统计信息：可合并的请求数、与同时进行的相同请求合并的次数，以及当前进行中的请求数。"""
+        return json.dumps(dataclasses.asdict(single_flight.stats()))
+
+    @mcp.resource("stats://latency", mime_type="application/json")
+    def latency_stats() -> str:
+        """请求各阶段（排队、DNS、连接、TLS、首字节、下载、转换、总计）耗时的秒数统计：次数、平均值、p50/p95/p99 和最大值，分为总体和按主机统计。"""
+        return json.dumps(dataclasses.asdict(latency.stats()))
+
+    @mcp.resource("metrics://prometheus", mime_type="text/plain")
+    def prometheus_metrics() -> str:
+        """按主机和阶段统计的请求耗时直方图，Prometheus 文本格式。"""
+        return latency.prometheus()
+
+    @mcp.resource("stats://documents", mime_type="application/json")
+    def document_stats() -> str:
+        """分页文档存储统计信息：命中、未命中、过期次数，以及保存的文档数和占用字节数。"""
+        stats = documents.stats() if documents is not None else None
+        return json.dumps(dataclasses.asdict(stats) if stats is not None else {})
+
+    @mcp.resource("stats://delta", mime_type="application/json")
+    def delta_stats() -> str:
+        """增量获取统计信息：第一次获取、没有变化、返回 diff、变化太大返回全部内容以及服务端返回 304 的次数，以及保存的版本数和占用字节数。"""
+        stats = deltas.stats() if deltas is not None else None
+        return json.dumps(dataclasses.asdict(stats) if stats is not None else {})
+
+    @mcp.resource("stats://profile", mime_type="application/json")
+    def profile_stats() -> str:
+        """性能剖析统计信息：被剖析的调用数、已保存的剖析文件数、因另一调用正在被剖析而跳过的次数，以及写入失败次数。"""
+        return json.dumps(dataclasses.asdict(profiler.stats()) if profiler is not None else {})
 
     return mcp
 
@@ -250,20 +631,76 @@ def create_mcp_server(
 @click.group(invoke_without_command=True)
 @click.pass_context
 @click.option("--user-agent", default=None, help='Specify user agent string directly')
-@click.option("--random-user-agent", is_flag=True, flag_value=True, default=None, help="Use a random user agent,")
+@click.option("--random-user-agent", is_flag=False, flag_value="", default=None, help="Use a random user agent, optionally limited with browser=xxx;os=xxx;type=xxx")
+@click.option("--rotate-user-agent", is_flag=True, help="With --random-user-agent, pick a new random user agent for every request")
 @click.option("--force-user-agent", is_flag=True, help="Force the use of specified or randomly generated UA, ignoring UA provided by the model")
 @click.option('--list-os-and-browser', is_flag=True, help='List available browsers and operating systems for UA selection')
+@click.option("--pool-size", type=click.IntRange(min=0), default=DEFAULT_POOL_SIZE, show_default=True, help="Max idle keep-alive connections kept per host")
+@click.option("--pool-idle-timeout", type=click.FloatRange(min=0), default=DEFAULT_IDLE_TIMEOUT, show_default=True, help="Seconds an idle keep-alive connection is kept before being closed")
+@click.option("--cache-size", type=SizeParamType(), default="32M", show_default=True, help="Memory used by the HTTP response cache, such as 512K or 64M, 0 disables the cache")
+@click.option("--conversion-cache-size", type=SizeParamType(), default="16M", show_default=True, help="Memory used to cache HTML conversions, 0 disables the cache")
+@click.option("--document-store-size", type=SizeParamType(), default="64M", show_default=True, help="Memory used to keep the converted documents that fetch returns page by page, 0 disables it")
+@click.option("--document-ttl", type=click.FloatRange(min=0, min_open=True), default=DEFAULT_DOCUMENT_TTL, show_default=True, help="Seconds a paged document is kept after it was last read")
+@click.option("--delta-store-size", type=SizeParamType(), default="32M", show_default=True, help="Memory used to keep the last version of the pages fetched in delta mode, 0 disables delta mode")
+@click.option("--max-content-length", type=SizeParamType(), default=None, help="Reject responses whose Content-Length is larger than this, before downloading them")
+@click.option("--max-bytes", type=SizeParamType(), default=None, help="Read at most this much of a response body and return at most this much content, the rest is truncated")
+@click.option("--batch-concurrency", type=click.IntRange(min=1), default=DEFAULT_BATCH_CONCURRENCY, show_default=True, help="Max requests in flight for one fetch_many call")
+@click.option("--batch-per-host", type=click.IntRange(min=1), default=DEFAULT_BATCH_PER_HOST, show_default=True, help="Max requests in flight to the same host for one fetch_many call")
+@click.option("--connect-timeout", type=click.FloatRange(min=0), default=DEFAULT_CONNECT_TIMEOUT, show_default=True, help="Seconds to wait for a connection to be established, 0 for no limit")
+@click.option("--read-timeout", type=click.FloatRange(min=0), default=DEFAULT_READ_TIMEOUT, show_default=True, help="Seconds to wait for data from the server, 0 for no limit")
+@click.option("--timeout", type=click.FloatRange(min=0), default=DEFAULT_TOTAL_TIMEOUT, show_default=True, help="Total seconds a request may take, including reading the body, 0 for no limit")
+@click.option("--retries", type=click.IntRange(min=0), default=DEFAULT_MAX_RETRIES, show_default=True, help="Max retries of a request after a connection error or a 429/502/503/504 response, 0 disables retries")
+@click.option("--retry-post", is_flag=True, help="Also retry POST requests, which are not idempotent")
+@click.option("--host-rate", type=click.FloatRange(min=0), default=0, show_default=True, help="Max requests per second sent to the same host, 0 for no limit")
+@click.option("--host-burst", type=click.IntRange(min=1), default=DEFAULT_HOST_BURST, show_default=True, help="Requests that may be sent to the same host at once before --host-rate applies")
+@click.option("--host-concurrency", type=click.IntRange(min=0), default=DEFAULT_HOST_CONCURRENCY, show_default=True, help="Max requests in flight to the same host, 0 for no limit")
+@click.option("--adaptive-rate", is_flag=True, help="Slow down for a host that answers 429/503 or gets slower, and speed up again as it recovers")
+@click.option("--report-timing", is_flag=True, help="Add the time spent in each phase of a request to its result")
+@click.option("--profile-dir", type=click.Path(file_okay=False), envvar="MCP_REQUESTS_PROFILE_DIR", default=None, help="Profile tool calls and write the profiles with their URL and timings to this directory")
+@click.option("--profile", "profile_mode", type=click.Choice(PROFILE_MODES), envvar="MCP_REQUESTS_PROFILE", default="cpu", show_default=True, help="Profile the CPU with cProfile, the memory with tracemalloc, or both")
+@click.option("--profile-sample", type=click.FloatRange(min=0, max=1), envvar="MCP_REQUESTS_PROFILE_SAMPLE", default=1.0, show_default=True, help="Share of the tool calls that are profiled")
+@click.option("--profile-slower-than", type=click.FloatRange(min=0), envvar="MCP_REQUESTS_PROFILE_SLOWER_THAN", default=0, show_default=True, help="Only keep the profiles of calls that took at least this many seconds")
+@click.option("--profile-tools", type=str, envvar="MCP_REQUESTS_PROFILE_TOOLS", default=None, help="Comma separated tools to profile, such as fetch,http_get, all of them by default")
 def main(
     context: click.Context,
     user_agent: Optional[str],
     random_user_agent: Optional[str],
+    rotate_user_agent: bool,
     force_user_agent: Optional[bool],
-    list_os_and_browser: bool
+    list_os_and_browser: bool,
+    pool_size: int,
+    pool_idle_timeout: float,
+    cache_size: int,
+    conversion_cache_size: int,
+    document_store_size: int,
+    document_ttl: float,
+    delta_store_size: int,
+    max_content_length: Optional[int],
+    max_bytes: Optional[int],
+    batch_concurrency: int,
+    batch_per_host: int,
+    connect_timeout: float,
+    read_timeout: float,
+    timeout: float,
+    retries: int,
+    retry_post: bool,
+    host_rate: float,
+    host_burst: int,
+    host_concurrency: int,
+    adaptive_rate: bool,
+    report_timing: bool,
+    profile_dir: Optional[str],
+    profile_mode: ProfileMode,
+    profile_sample: float,
+    profile_slower_than: float,
+    profile_tools: Optional[str],
 ):
     if list_os_and_browser and context.invoked_subcommand:
         raise ValueError("Cannot use --list-os-and-browser with subcommand.")
-    if user_agent and random_user_agent:
+    if user_agent and random_user_agent is not None:
         raise ValueError("Cannot use both --user-agent and --random-user-agent.")
+    if rotate_user_agent and random_user_agent is None:
+        raise ValueError("Cannot use --rotate-user-agent without --random-user-agent.")
 
     if list_os_and_browser:
         click.echo("Available browsers:")
@@ -280,39 +717,116 @@ def main(
         ua_random = False
         ua_os = None
         ua_browser = None
+        ua_type = None
         if isinstance(random_user_agent, str):
             limit = parse(random_user_agent)
             ua_random = True
             ua_os = limit.get("os", None)
             ua_browser = limit.get("browser", None)
+            ua_type = limit.get("type", None)
 
         mcp = create_mcp_server(
             ua=user_agent,
             ua_random=ua_random,
             ua_os=ua_os,
             ua_browser=ua_browser,
+            ua_type=ua_type,
+            ua_rotate=rotate_user_agent,
             ua_force=force_user_agent,
+            pool_size=pool_size,
+            pool_idle_timeout=pool_idle_timeout,
+            cache_size=cache_size,
+            conversion_cache_size=conversion_cache_size,
+            document_store_size=document_store_size,
+            document_ttl=document_ttl,
+            delta_store_size=delta_store_size,
+            max_content_length=max_content_length,
+            max_bytes=max_bytes,
+            batch_concurrency=batch_concurrency,
+            batch_per_host=batch_per_host,
+            timeouts=Timeouts(connect=connect_timeout or None, read=read_timeout or None, total=timeout or None),
+            retries=retries,
+            retry_post=retry_post,
+            host_rate=host_rate or None,
+            host_burst=host_burst,
+            host_concurrency=host_concurrency or None,
+            adaptive_rate=adaptive_rate,
+            report_timing=report_timing,
+            profile_dir=profile_dir,
+            profile_mode=profile_mode,
+            profile_sample=profile_sample,
+            profile_threshold=profile_slower_than,
+            profile_tools={t.strip() for t in profile_tools.split(",") if t.strip()} if profile_tools else None,
         )
         mcp.run()
 
 
 @main.command()
 @click.argument("url", type=str, required=True)
-@click.option("--return-content", type=click.Choice(['raw', 'basic_clean', 'strict_clean', 'markdown']), default="markdown", help="return content type")
+@click.option("--return-content", type=click.Choice(['raw', 'basic_clean', 'strict_clean', 'markdown', 'main']), default="markdown", help="return content type")
+@click.option("--css", type=str, default=None, help="only convert the elements matching this CSS selector")
+@click.option("--xpath", type=str, default=None, help="only convert the elements matching this XPath expression")
+@click.option("--json-path", type=str, default=None, help="only print the values of a JSON response matching this JSONPath")
 def fetch(
     url: str,
-    return_content: Literal['raw'] | Literal['basic_clean'] | Literal['strict_clean'] | Literal['markdown']
+    return_content: Literal['raw'] | Literal['basic_clean'] | Literal['strict_clean'] | Literal['markdown'] | Literal['main'],
+    css: Optional[str],
+    xpath: Optional[str],
+    json_path: Optional[str],
 ):
-    res = mcp_http_request("GET", url, format_headers=False, return_content=return_content)
+    selector = Selector(css=css, xpath=xpath) if css is not None or xpath is not None else None
+    res = mcp_http_request("GET", url, format_headers=False, return_content=return_content, selector=selector,
+                           json_path=JSONPath(json_path) if json_path is not None else None)
     click.echo(res)
 
 
+@main.command("fetch-many")
+@click.argument("urls", type=str, nargs=-1, required=True)
+@click.option("--return-content", type=click.Choice(['raw', 'basic_clean', 'strict_clean', 'markdown', 'main']), default="markdown", help="return content type")
+@click.option("--concurrency", type=click.IntRange(min=1), default=DEFAULT_BATCH_CONCURRENCY, show_default=True, help="max requests in flight")
+@click.option("--per-host", type=click.IntRange(min=1), default=DEFAULT_BATCH_PER_HOST, show_default=True, help="max requests in flight to the same host")
+def fetch_many(
+    urls: tuple[str, ...],
+    return_content: Literal['raw'] | Literal['basic_clean'] | Literal['strict_clean'] | Literal['markdown'] | Literal['main'],
+    concurrency: int,
+    per_host: int,
+):
+    import asyncio
+
+    urls = list(urls)
+    try:
+        results = asyncio.run(async_mcp_fetch_many(urls, max_concurrency=concurrency, max_per_host=per_host,
+                                                   format_headers=False, return_content=return_content))
+    except ArgumentError as e:
+        click.echo(format_error_result(e))
+        return
+    click.echo(format_batch_result(urls, results))
+
+
+@main.command()
+@click.argument("urls", type=str, nargs=-1, required=True)
+@click.option("--return-content", type=click.Choice(['raw', 'basic_clean', 'strict_clean', 'markdown', 'main']), default="markdown", help="return content type")
+@click.option("-n", "--repeat", type=click.IntRange(min=1), default=1, show_default=True, help="times to fetch every url")
+def metrics(
+    urls: tuple[str, ...],
+    return_content: Literal['raw'] | Literal['basic_clean'] | Literal['strict_clean'] | Literal['markdown'] | Literal['main'],
+    repeat: int,
+):
+    """Fetch URLS and print the time spent in each phase as Prometheus histograms."""
+    latency = LatencyRecorder()
+    for _ in range(repeat):
+        for url in urls:
+            mcp_http_request("GET", url, return_content=return_content, latency=latency)
+    click.echo(latency.prometheus(), nl=False)
+
+
 @main.command()
 @click.argument("url", type=str, required=True)
 @click.option("--headers", type=str, default="", help="custom headers")
-def get(url: str, headers: str):
+@click.option("--json-path", type=str, default=None, help="only print the values of a JSON response matching this JSONPath")
+def get(url: str, headers: str, json_path: Optional[str]):
     hs = parse(headers)
-    res = mcp_http_request("GET", url, headers=hs)
+    res = mcp_http_request("GET", url, headers=hs, json_path=JSONPath(json_path) if json_path is not None else None)
     click.echo(res)
 
 
@@ -0,0 +1,356 @@
+from dataclasses import dataclass, field, replace
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Callable, Generic, Hashable, Optional, TypeVar
+import collections
+import threading
+import time
+
+if TYPE_CHECKING:
+    from .request import Response
+
+
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024
+
+# status codes that are cacheable by default, RFC 9110 section 15.1
+HEURISTICALLY_CACHEABLE = {200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501}
+# upper bound of the heuristic freshness lifetime, RFC 9111 section 4.2.2
+MAX_HEURISTIC_LIFETIME = 24 * 60 * 60
+
+# headers of a 304 response that must not replace the stored ones
+NOT_UPDATED_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "content-range"}
+
+CALLER_CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since", "If-Match", "If-Unmodified-Since", "If-Range", "Range")
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Thread safe LRU mapping bounded by the total size of its values.
+
+    ``sizeof`` returns the size of a value in bytes, values bigger than
+    ``max_size`` are never stored.
+    """
+
+    def __init__(self, max_size: int, sizeof: Callable[[V], int]):
+        if max_size < 0:
+            raise ValueError("max_size must be greater than or equal to 0")
+        self.max_size = max_size
+        self._sizeof = sizeof
+        self._items: collections.OrderedDict[K, tuple[V, int]] = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key: K, value: V) -> None:
+        size = self._sizeof(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            if size > self.max_size:
+                return
+            self._items[key] = (value, size)
+            self._size += size
+            while self._size > self.max_size:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._size -= evicted_size
+
+    def pop(self, key: K) -> Optional[V]:
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return None
+            self._size -= item[1]
+            return item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def parse_cache_control(value: Optional[str]) -> dict[str, Optional[str]]:
+    directives: dict[str, Optional[str]] = {}
+    if not value:
+        return directives
+    for item in value.split(","):
+        name, sep, arg = item.strip().partition("=")
+        name = name.strip().lower()
+        if not name:
+            continue
+        directives[name] = arg.strip().strip('"') if sep else None
+    return directives
+
+
+def _parse_seconds(value: Optional[str]) -> Optional[int]:
+    try:
+        seconds = int(value) if value is not None else None
+    except ValueError:
+        return None
+    if seconds is not None and seconds < 0:
+        return None
+    return seconds
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _get_header(headers: list[tuple[str, str]], name: str) -> Optional[str]:
+    name = name.lower()
+    for k, v in headers:
+        if k.lower() == name:
+            return v
+    return None
+
+
+def _get_request_header(headers: dict, name: str) -> Optional[str]:
+    name = name.lower()
+    for k, v in headers.items():
+        if k.lower() == name:
+            return str(v)
+    return None
+
+
+@dataclass
+class CacheEntry:
+    response: "Response"
+    vary: dict[str, Optional[str]]
+    request_time: float
+    response_time: float
+    size: int = 0
+
+    def header(self, name: str) -> Optional[str]:
+        return _get_header(self.response.headers, name)
+
+    @property
+    def directives(self) -> dict[str, Optional[str]]:
+        return parse_cache_control(self.header("Cache-Control"))
+
+    def freshness_lifetime(self) -> float:
+        directives = self.directives
+        for name in ("s-maxage", "max-age"):
+            seconds = _parse_seconds(directives.get(name))
+            if seconds is not None:
+                return seconds
+
+        date = _parse_http_date(self.header("Date")) or self.response_time
+        expires = self.header("Expires")
+        if expires is not None:
+            expires_time = _parse_http_date(expires)
+            # an invalid Expires, such as "0", means already expired.
+            return max(0.0, expires_time - date) if expires_time is not None else 0.0
+
+        if self.response.status_code in HEURISTICALLY_CACHEABLE or "public" in directives:
+            last_modified = _parse_http_date(self.header("Last-Modified"))
+            if last_modified is not None and last_modified < date:
+                return min((date - last_modified) / 10, MAX_HEURISTIC_LIFETIME)
+        return 0.0
+
+    def current_age(self, now: float) -> float:
+        """Age of the stored response, RFC 9111 section 4.2.3."""
+        date = _parse_http_date(self.header("Date"))
+        apparent_age = max(0.0, self.response_time - date) if date is not None else 0.0
+        age_value = _parse_seconds(self.header("Age")) or 0
+        corrected_age = age_value + (self.response_time - self.request_time)
+        return max(apparent_age, corrected_age) + (now - self.response_time)
+
+    def is_fresh(self, now: float) -> bool:
+        if "no-cache" in self.directives:
+            return False
+        return self.freshness_lifetime() > self.current_age(now)
+
+    def validators(self) -> dict[str, str]:
+        headers = {}
+        etag = self.header("ETag")
+        if etag:
+            headers["If-None-Match"] = etag
+        last_modified = self.header("Last-Modified")
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def matches(self, request_headers: dict) -> bool:
+        return all(_get_request_header(request_headers, name) == value for name, value in self.vary.items())
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidations: int = 0
+    entries: int = 0
+    size: int = 0
+
+
+@dataclass
+class CacheLookup:
+    """State of a cache lookup, carried from before the request to after it."""
+    cacheable: bool
+    entry: Optional[CacheEntry] = None
+    request_time: float = field(default_factory=time.time)
+
+    @property
+    def validators(self) -> dict[str, str]:
+        return self.entry.validators() if self.entry is not None else {}
+
+
+class HTTPCache:
+    """In memory HTTP cache for GET requests, following RFC 9111.
+
+    Freshness comes from ``Cache-Control``/``Expires`` (or the heuristic
+    based on ``Last-Modified``), stored responses are selected with
+    ``Vary``, and stale responses are revalidated with ``If-None-Match``
+    and ``If-Modified-Since``. It behaves as a shared cache, so responses
+    marked ``private`` or requested with ``Authorization`` are not stored.
+    Memory is bounded by ``max_size`` bytes with LRU eviction.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self._entries: LRUCache[str, list[CacheEntry]] = LRUCache(max_size, lambda entries: sum(e.size for e in entries))
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._revalidations = 0
+
+    @staticmethod
+    def _cacheable_request(method: str, headers: dict, body: Optional[bytes]) -> bool:
+        if method != "GET" or body is not None:
+            return False
+        # conditional and range requests of the caller go to the origin as they are
+        if any(_get_request_header(headers, name) is not None for name in CALLER_CONDITIONAL_HEADERS):
+            return False
+        return "no-store" not in parse_cache_control(_get_request_header(headers, "Cache-Control"))
+
+    def _find(self, url: str, headers: dict) -> Optional[CacheEntry]:
+        entries = self._entries.get(url)
+        if not entries:
+            return None
+        for entry in entries:
+            if entry.matches(headers):
+                return entry
+        return None
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def lookup(self, method: str, url: str, headers: dict, body: Optional[bytes] = None) -> tuple[CacheLookup, Optional["Response"]]:
+        """Look up a request before sending it.
+
+        Returns the lookup state and, if a fresh response is stored, that
+        response. Otherwise ``CacheLookup.validators`` holds the conditional
+        headers needed to revalidate a stale entry.
+        """
+        lookup = CacheLookup(cacheable=self._cacheable_request(method, headers, body))
+        if not lookup.cacheable:
+            return lookup, None
+
+        entry = self._find(url, headers)
+        if entry is None:
+            return lookup, None
+
+        request_directives = parse_cache_control(_get_request_header(headers, "Cache-Control"))
+        if "no-cache" not in request_directives and entry.is_fresh(lookup.request_time):
+            self._count("_hits")
+            return lookup, replace(entry.response, annotations={**entry.response.annotations, "Cache": "HIT"})
+
+        lookup.entry = entry
+        return lookup, None
+
+    def _storable(self, response: "Response", headers: dict) -> bool:
+        if response.status_code in (206, 304) or "Truncated" in response.annotations:
+            return False
+        directives = parse_cache_control(_get_header(response.headers, "Cache-Control"))
+        if "no-store" in directives or "private" in directives:
+            return False
+        if _get_header(response.headers, "Vary") == "*":
+            return False
+        if _get_request_header(headers, "Authorization") is not None and \
+                not ({"public", "s-maxage", "must-revalidate"} & directives.keys()):
+            return False
+        explicit = {"max-age", "s-maxage", "public"} & directives.keys() or _get_header(response.headers, "Expires") is not None
+        return bool(explicit) or response.status_code in HEURISTICALLY_CACHEABLE
+
+    def _store(self, url: str, headers: dict, entry: CacheEntry) -> None:
+        entry.size = len(entry.response.content) + sum(len(k) + len(v) for k, v in entry.response.headers) + len(url)
+        with self._lock:
+            entries = [e for e in self._entries.get(url) or [] if e.vary != entry.vary]
+            entries.insert(0, entry)
+            self._entries.put(url, entries)
+
+    def _vary(self, response: "Response", headers: dict) -> dict[str, Optional[str]]:
+        vary = _get_header(response.headers, "Vary") or ""
+        names = [n.strip().lower() for n in vary.split(",") if n.strip()]
+        return {name: _get_request_header(headers, name) for name in names}
+
+    def update(self, lookup: CacheLookup, url: str, headers: dict, response: "Response") -> "Response":
+        """Store ``response`` if allowed and return the response for the caller.
+
+        A 304 answer to a revalidation returns the stored response with its
+        headers refreshed.
+        """
+        if not lookup.cacheable:
+            return response
+
+        response_time = time.time()
+        entry = lookup.entry
+        if entry is not None and response.status_code == 304:
+            self._count("_revalidations")
+            updated = {k.lower() for k, _ in response.headers if k.lower() not in NOT_UPDATED_HEADERS}
+            merged = [(k, v) for k, v in entry.response.headers if k.lower() not in updated]
+            merged.extend((k, v) for k, v in response.headers if k.lower() not in NOT_UPDATED_HEADERS)
+            stored = replace(entry.response, headers=merged, annotations={})
+            self._store(url, headers, CacheEntry(stored, entry.vary, lookup.request_time, response_time))
+            return replace(stored, annotations={**response.annotations, "Cache": "REVALIDATED"})
+
+        self._count("_misses")
+        if entry is not None:
+            # the stored response was replaced or is no longer valid.
+            self._evict(url, entry)
+        if self._storable(response, headers):
+            vary = self._vary(response, headers)
+            stored = replace(response, annotations={})
+            self._store(url, headers, CacheEntry(stored, vary, lookup.request_time, response_time))
+        return replace(response, annotations={**response.annotations, "Cache": "MISS"})
+
+    def _evict(self, url: str, entry: CacheEntry) -> None:
+        with self._lock:
+            entries = [e for e in self._entries.get(url) or [] if e is not entry]
+            if entries:
+                self._entries.put(url, entries)
+            else:
+                self._entries.pop(url)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                revalidations=self._revalidations,
+                entries=len(self._entries),
+                size=self._entries.size,
+            )
@@ -0,0 +1,213 @@
+from html import escape
+from html.parser import HTMLParser
+from typing import Callable, Iterable, Literal, Optional
+import functools
+import importlib.util
+
+from .markdown import VOID_ELEMENTS
+
+
+Parser = Literal["html.parser", "lxml"]
+
+DEFAULT_CLEAN_TAGS = ("script", "style", "meta", "link", "noscript")
+
+# below this size the stdlib parser is used even when lxml is installed, it
+# starts faster and leaves fragments as they are instead of wrapping them in
+# <html><body>
+LXML_MIN_SIZE = 256 * 1024
+
+# elements whose text is written as is
+RAW_TEXT_ELEMENTS = frozenset(("script", "style"))
+
+
+@functools.cache
+def has_lxml() -> bool:
+    # lxml is only imported when a document is large enough to be parsed by it
+    return importlib.util.find_spec("lxml") is not None
+
+
+def select_parser(size: int) -> Parser:
+    """The parser ``clean_html`` uses for a document of ``size`` characters."""
+    return "lxml" if size >= LXML_MIN_SIZE and has_lxml() else "html.parser"
+
+
+def _start_tag(tag: str, attrs: Iterable[tuple[str, Optional[str]]]) -> str:
+    parts = [f"<{tag}"]
+    for name, value in attrs:
+        parts.append(f" {name}" if value is None else f' {name}="{escape(value)}"')
+    parts.append(">")
+    return "".join(parts)
+
+
+class _Cleaner:
+    """Writes the cleaned document while a parser reports the elements of it.
+
+    The content of ``clean_tags`` is dropped and attributes not in
+    ``allowed_attrs`` are left out, without building a tree. Like
+    BeautifulSoup, an end tag closes every element opened after its start
+    tag, an end tag without a start tag is dropped and the elements still
+    open at the end of the document are closed.
+    """
+
+    def __init__(self, write: Callable[[str], None], allowed_attrs: Iterable[str] | bool, clean_tags: Iterable[str]):
+        self.write = write
+        self.allowed_attrs = allowed_attrs if isinstance(allowed_attrs, bool) else frozenset(allowed_attrs)
+        self.clean_tags = frozenset(clean_tags)
+        self.stack: list[str] = []
+        # index in ``stack`` of the element whose content is dropped
+        self.skip_at: Optional[int] = None
+
+    def start(self, tag: str, attrs: Iterable[tuple[str, Optional[str]]], text: Optional[str] = None) -> None:
+        void = tag in VOID_ELEMENTS
+        if self.skip_at is None and tag in self.clean_tags and not void:
+            self.skip_at = len(self.stack)
+        if not void:
+            self.stack.append(tag)
+        if self.skip_at is not None or tag in self.clean_tags:
+            return
+        if self.allowed_attrs is True and text is not None:
+            self.write(text)
+        elif self.allowed_attrs is True:
+            self.write(_start_tag(tag, attrs))
+        elif not self.allowed_attrs:
+            self.write(f"<{tag}>")
+        else:
+            self.write(_start_tag(tag, [(k, v) for k, v in attrs if k in self.allowed_attrs]))
+
+    def end(self, tag: str) -> None:
+        if tag in VOID_ELEMENTS:
+            return
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i] == tag:
+                self.pop(i)
+                return
+
+    def pop(self, index: int) -> None:
+        while len(self.stack) > index:
+            tag = self.stack.pop()
+            if self.skip_at is None:
+                self.write(f"</{tag}>")
+            elif self.skip_at == len(self.stack):
+                self.skip_at = None
+
+    def text(self, text: str) -> None:
+        if self.skip_at is None:
+            self.write(text)
+
+    @property
+    def in_raw_text(self) -> bool:
+        return bool(self.stack) and self.stack[-1] in RAW_TEXT_ELEMENTS
+
+
+class _StdlibCleaner(HTMLParser):
+    def __init__(self, cleaner: _Cleaner):
+        # character references are passed through as they are written
+        super().__init__(convert_charrefs=False)
+        self.cleaner = cleaner
+
+    def handle_starttag(self, tag, attrs):
+        self.cleaner.start(tag, attrs, self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        self.cleaner.start(tag, attrs, self.get_starttag_text())
+        self.cleaner.end(tag)
+
+    def handle_endtag(self, tag):
+        self.cleaner.end(tag)
+
+    def handle_data(self, data):
+        self.cleaner.text(data)
+
+    def handle_entityref(self, name):
+        self.cleaner.text(f"&{name};")
+
+    def handle_charref(self, name):
+        self.cleaner.text(f"&#{name};")
+
+    def handle_comment(self, data):
+        self.cleaner.text(f"<!--{data}-->")
+
+    def handle_decl(self, decl):
+        self.cleaner.text(f"<!{decl}>")
+
+    def handle_pi(self, data):
+        self.cleaner.text(f"<?{data}>")
+
+    def unknown_decl(self, data):
+        self.cleaner.text(f"<![{data}]>")
+
+    def close(self):
+        super().close()
+        self.cleaner.pop(0)
+
+
+class _LxmlTarget:
+    """Parser target of ``etree.HTMLParser``, the text it reports is already unescaped."""
+
+    def __init__(self, cleaner: _Cleaner):
+        self.cleaner = cleaner
+
+    def doctype(self, name, pubid, system):
+        self.cleaner.text(f"<!DOCTYPE {name}>")
+
+    def start(self, tag, attrib):
+        self.cleaner.start(tag, attrib.items())
+
+    def end(self, tag):
+        self.cleaner.end(tag)
+
+    def data(self, data):
+        self.cleaner.text(data if self.cleaner.in_raw_text else escape(data, quote=False))
+
+    def comment(self, text):
+        self.cleaner.text(f"<!--{text}-->")
+
+    def pi(self, target, data=None):
+        self.cleaner.text(f"<?{target} {data}>" if data else f"<?{target}>")
+
+    def close(self):
+        self.cleaner.pop(0)
+
+
+def clean_html(
+    html: str,
+    *,
+    allowed_attrs: Iterable[str] | bool = True,
+    clean_tags: Iterable[str] = DEFAULT_CLEAN_TAGS,
+    parser: Optional[Parser] = None,
+) -> str:
+    """Remove ``clean_tags`` with their content and the attributes not in ``allowed_attrs``.
+
+    ``allowed_attrs`` is ``True`` to keep every attribute, ``False`` to remove
+    them all. The document is cleaned in one pass while it is parsed, with
+    ``parser``, or the parser ``select_parser`` picks for its size.
+    """
+    output: list[str] = []
+    feed_html(html, _Cleaner(output.append, allowed_attrs, clean_tags), parser)
+    return "".join(output)
+
+
+def feed_html(html: str, cleaner: _Cleaner, parser: Optional[Parser] = None) -> None:
+    """Report the elements of ``html`` to ``cleaner`` as ``parser`` parses it.
+
+    The text is reported as HTML, with its character references as they are
+    written or escaped again. Anything with the methods of ``_Cleaner`` can
+    take its place.
+    """
+    if parser is None:
+        parser = select_parser(len(html))
+
+    if parser == "lxml":
+        try:
+            from lxml import etree
+        except ImportError:
+            raise ImportError("the lxml parser requires lxml, install it with: pip install lxml") from None
+        lxml_parser = etree.HTMLParser(target=_LxmlTarget(cleaner), remove_comments=False, remove_pis=False)
+        lxml_parser.feed(html)
+        lxml_parser.close()
+    elif parser == "html.parser":
+        stdlib_parser = _StdlibCleaner(cleaner)
+        stdlib_parser.feed(html)
+        stdlib_parser.close()
+    else:
+        raise ValueError(f"unknown parser: {parser!r}, expected 'html.parser' or 'lxml'")
@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Callable, Literal, Optional
+import hashlib
+import sys
+import threading
+
+from .cache import LRUCache
+from .clean import clean_html
+from .readability import main_content_to_markdown
+from .selector import Selector
+from .utils import html_to_markdown
+
+
+ReturnContent = Literal['raw', 'basic_clean', 'strict_clean', 'markdown', 'main']
+
+DEFAULT_CONVERSION_CACHE_SIZE = 16 * 1024 * 1024
+
+# return_content -> (converter, settings), the settings are part of the
+# conversion cache key so changing them never returns a stale conversion.
+CONVERTERS: dict[str, tuple[Callable[..., str], dict]] = {
+    "basic_clean": (clean_html, {"allowed_attrs": True}),
+    "strict_clean": (clean_html, {"allowed_attrs": ("id", "src", "href")}),
+    "markdown": (html_to_markdown, {}),
+    "main": (main_content_to_markdown, {}),
+}
+
+
+@dataclass
+class ConversionStats:
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    size: int = 0
+
+
+class ConversionCache:
+    """Bounded LRU cache of HTML conversions.
+
+    Entries are keyed by the SHA-256 digest of the HTML, the
+    ``return_content`` mode and the converter settings, so byte identical
+    pages are converted once no matter whether the HTTP layer cached them.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CONVERSION_CACHE_SIZE):
+        self._results: LRUCache[tuple, str] = LRUCache(max_size, sys.getsizeof)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: tuple) -> Optional[str]:
+        result = self._results.get(key)
+        with self._lock:
+            if result is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return result
+
+    def put(self, key: tuple, result: str) -> None:
+        self._results.put(key, result)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def stats(self) -> ConversionStats:
+        with self._lock:
+            return ConversionStats(hits=self._hits, misses=self._misses, entries=len(self._results), size=self._results.size)
+
+
+def conversion_key(
+    return_content: str,
+    digest: bytes,
+    converter: Callable[..., str],
+    settings: dict,
+    selector: Optional[Selector] = None,
+) -> tuple:
+    return (digest, return_content, f"{converter.__module__}.{converter.__qualname__}", repr(sorted(settings.items())), selector)
+
+
+def convert_html(
+    html: str,
+    return_content: ReturnContent,
+    *,
+    cache: Optional[ConversionCache] = None,
+    digest: Optional[bytes] = None,
+    selector: Optional[Selector] = None,
+) -> str:
+    """Convert ``html``, or only the part of it ``selector`` matches, according to ``return_content``.
+
+    ``digest`` is the SHA-256 digest of the HTML source, computed from
+    ``html`` when it is not given. It is only needed when ``cache`` is used.
+    """
+    if return_content not in CONVERTERS:
+        return selector.select(html) if selector is not None else html
+
+    converter, settings = CONVERTERS[return_content]
+    if cache is None:
+        return converter(selector.select(html) if selector is not None else html, **settings)
+
+    if digest is None:
+        digest = hashlib.sha256(html.encode("utf-8")).digest()
+    key = conversion_key(return_content, digest, converter, settings, selector)
+
+    result = cache.get(key)
+    if result is None:
+        result = converter(selector.select(html) if selector is not None else html, **settings)
+        cache.put(key, result)
+    return result
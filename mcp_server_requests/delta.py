@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from typing import Optional
+import difflib
+import sys
+import threading
+
+from .cache import LRUCache
+
+
+DEFAULT_DELTA_STORE_SIZE = 32 * 1024 * 1024
+# lines of context around each change of a diff
+DIFF_CONTEXT = 3
+
+UNCHANGED = "[unchanged: the content is the same as in the last fetch]"
+
+
+@dataclass
+class Version:
+    """The content last returned for a URL, with the validators of its response."""
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def validators(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclass
+class DeltaStats:
+    new: int = 0
+    unchanged: int = 0
+    # changes returned as a diff, and changes too large for one
+    diffs: int = 0
+    replaced: int = 0
+    # 304 answers to the validators of a stored version
+    not_modified: int = 0
+    entries: int = 0
+    size: int = 0
+
+
+def diff_text(old: str, new: str, context: int = DIFF_CONTEXT) -> tuple[str, int, int]:
+    """The unified diff of the lines of ``old`` and ``new``, and the number of removed and added lines."""
+    lines = list(difflib.unified_diff(old.splitlines(), new.splitlines(), "previous", "current", n=context, lineterm=""))
+    removed = sum(1 for line in lines[2:] if line.startswith("-"))
+    added = sum(1 for line in lines[2:] if line.startswith("+"))
+    return "\n".join(lines), removed, added
+
+
+class DeltaStore:
+    """The last converted version of every URL fetched in delta mode, to return what changed since.
+
+    The least recently fetched versions are dropped when their text takes
+    more than ``max_size`` bytes, the next fetch of their URL then returns
+    the whole content again.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_DELTA_STORE_SIZE):
+        self._versions: LRUCache[str, Version] = LRUCache(max_size, lambda version: sys.getsizeof(version.text))
+        self._lock = threading.Lock()
+        self._stats = DeltaStats()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self._stats, name, getattr(self._stats, name) + 1)
+
+    def get(self, key: str) -> Optional[Version]:
+        return self._versions.get(key)
+
+    def not_modified(self, key: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> tuple[str, str]:
+        """The result of a 304 answer to the validators of the version of ``key``, see ``update``."""
+        self._count("not_modified")
+        version = self._versions.get(key)
+        if version is not None and (etag or last_modified):
+            self._versions.put(key, Version(version.text, etag or version.etag, last_modified or version.last_modified))
+        return UNCHANGED, "unchanged, not modified"
+
+    def update(self, key: str, version: Version) -> tuple[str, str]:
+        """Store ``version`` as the version of ``key``, and return the content to return and how it changed.
+
+        The content is the whole text the first time, a note when it did not
+        change, and otherwise a unified diff against the stored version, or
+        the whole text if the diff would not be shorter.
+        """
+        with self._lock:
+            previous = self._versions.get(key)
+            self._versions.put(key, version)
+        if previous is None:
+            self._count("new")
+            return version.text, "new"
+        if previous.text == version.text:
+            self._count("unchanged")
+            return UNCHANGED, "unchanged"
+        diff, removed, added = diff_text(previous.text, version.text)
+        if len(diff) >= len(version.text):
+            self._count("replaced")
+            return version.text, f"replaced, -{removed} +{added} lines"
+        self._count("diffs")
+        return diff, f"diff, -{removed} +{added} lines"
+
+    def stats(self) -> DeltaStats:
+        with self._lock:
+            return DeltaStats(**{**self._stats.__dict__, "entries": len(self._versions), "size": self._versions.size})
@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+from typing import Optional
+import collections
+import hashlib
+import sys
+import threading
+import time
+
+from .jsonpath import JSONPath
+from .selector import Selector
+
+
+DEFAULT_DOCUMENT_STORE_SIZE = 64 * 1024 * 1024
+# seconds a document is kept after it was last read
+DEFAULT_DOCUMENT_TTL = 10 * 60
+# characters returned when an offset is given without a limit
+DEFAULT_PAGE_SIZE = 20000
+
+
+@dataclass
+class Document:
+    """The converted content of a fetched page, read one page at a time."""
+    handle: Optional[str]
+    url: str
+    status_line: str
+    text: str
+
+
+@dataclass
+class DocumentStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    entries: int = 0
+    size: int = 0
+
+
+def document_handle(
+    url: str,
+    return_content: str,
+    max_bytes: Optional[int],
+    selector: Optional[Selector] = None,
+    json_path: Optional[JSONPath] = None,
+) -> str:
+    """The handle of the document of ``url`` converted with ``return_content`` and cut to ``max_bytes``."""
+    key = f"{return_content} {max_bytes} {selector!r} {json_path!r} {url}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def page_text(text: str, offset: int, limit: int) -> tuple[str, int]:
+    """The page of ``text`` that starts at ``offset``, and the offset of the next page.
+
+    A page longer than ``limit`` is not returned, a page that does not reach
+    the end of the text ends after its last line break if that is in its
+    second half, so lines are not split between pages.
+    """
+    end = min(len(text), offset + limit)
+    if end < len(text):
+        newline = text.rfind("\n", offset + limit // 2, end)
+        if newline != -1:
+            end = newline + 1
+    return text[offset:end], end
+
+
+class DocumentStore:
+    """Converted documents kept in memory for their following pages.
+
+    Documents expire ``ttl`` seconds after they were last read, and the least
+    recently read ones are dropped when their text takes more than
+    ``max_size`` bytes.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_DOCUMENT_STORE_SIZE, ttl: float = DEFAULT_DOCUMENT_TTL):
+        if max_size < 0:
+            raise ValueError("max_size must be greater than or equal to 0")
+        if ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        self.max_size = max_size
+        self.ttl = ttl
+        # handle -> (document, size, expiry time), least recently read first
+        self._documents: collections.OrderedDict[str, tuple[Document, int, float]] = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = DocumentStats()
+
+    def get(self, handle: str) -> Optional[Document]:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            item = self._documents.get(handle)
+            if item is None:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+            document, size, _ = item
+            self._documents[handle] = (document, size, now + self.ttl)
+            self._documents.move_to_end(handle)
+            return document
+
+    def put(self, document: Document) -> None:
+        size = sys.getsizeof(document.text)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            old = self._documents.pop(document.handle, None)
+            if old is not None:
+                self._size -= old[1]
+            if size > self.max_size:
+                return
+            self._documents[document.handle] = (document, size, now + self.ttl)
+            self._size += size
+            while self._size > self.max_size:
+                _, (_, evicted_size, _) = self._documents.popitem(last=False)
+                self._size -= evicted_size
+
+    def _expire(self, now: float) -> None:
+        # every read moves a document to the end with a later expiry time, so
+        # the expired documents are at the start
+        while self._documents:
+            handle, (_, size, expires) = next(iter(self._documents.items()))
+            if expires > now:
+                break
+            del self._documents[handle]
+            self._size -= size
+            self._stats.expired += 1
+
+    def stats(self) -> DocumentStats:
+        with self._lock:
+            self._expire(time.monotonic())
+            return DocumentStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                expired=self._stats.expired,
+                entries=len(self._documents),
+                size=self._size,
+            )
@@ -0,0 +1,142 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# brotli before 1.2 cannot bound the output of a call, so a small body could
+# be inflated into memory all at once
+if brotli is not None and not hasattr(brotli.Decompressor, "can_accept_more_data"):
+    brotli = None
+
+
+def supported_encodings() -> list[str]:
+    encodings = ["gzip", "deflate"]
+    if brotli is not None:
+        encodings.append("br")
+    return encodings
+
+
+ACCEPT_ENCODING = ", ".join(supported_encodings())
+
+
+class DecodeError(ValueError):
+    pass
+
+
+class Decoder(ABC):
+    """Incremental decoder of a content-coding.
+
+    Compressed data is passed to ``feed``, decoded data is taken out with
+    ``read`` in pieces of at most ``max_length`` bytes, so the output of a
+    small compressed chunk never has to be held in memory all at once.
+    """
+
+    def __init__(self):
+        self._pending = b""
+
+    @abstractmethod
+    def _decompress(self, max_length: int) -> bytes:
+        """Decode at most about ``max_length`` bytes of the data fed so far."""
+
+    def _flush(self) -> bytes:
+        return b""
+
+    @abstractmethod
+    def feed(self, data: bytes) -> None:
+        """Add compressed data to decode."""
+
+    def read(self, max_length: int) -> bytes:
+        if not self._pending:
+            try:
+                self._pending = self._decompress(max_length)
+            except Exception as e:
+                raise DecodeError(str(e)) from e
+        data, self._pending = self._pending[:max_length], self._pending[max_length:]
+        return data
+
+    def flush(self) -> bytes:
+        """Decode what is left once all data has been fed."""
+        try:
+            return self._pending + self._flush()
+        except Exception as e:
+            raise DecodeError(str(e)) from e
+        finally:
+            self._pending = b""
+
+
+class ZlibDecoder(Decoder):
+    def __init__(self, wbits: int):
+        super().__init__()
+        self._obj = zlib.decompressobj(wbits)
+        self._input = b""
+
+    def feed(self, data: bytes) -> None:
+        self._input = self._input + data if self._input else data
+
+    def _decompress(self, max_length: int) -> bytes:
+        data = self._obj.decompress(self._input, max_length)
+        self._input = self._obj.unconsumed_tail
+        return data
+
+    def _flush(self) -> bytes:
+        data = self._obj.decompress(self._input) if self._input else b""
+        self._input = b""
+        return data + self._obj.flush()
+
+
+class DeflateDecoder(ZlibDecoder):
+    """``deflate`` is zlib wrapped data, but some servers send raw deflate data."""
+
+    def __init__(self):
+        super().__init__(zlib.MAX_WBITS)
+        self._first = True
+
+    def _decompress(self, max_length: int) -> bytes:
+        if not self._first:
+            return super()._decompress(max_length)
+        first_input = self._input
+        try:
+            data = super()._decompress(max_length)
+        except zlib.error:
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            self._input = first_input
+            data = super()._decompress(max_length)
+        if data:
+            self._first = False
+        return data
+
+
+class BrotliDecoder(Decoder):
+    def __init__(self):
+        super().__init__()
+        self._obj = brotli.Decompressor()
+        self._input = b""
+
+    def feed(self, data: bytes) -> None:
+        self._input += data
+
+    def _decompress(self, max_length: int) -> bytes:
+        # the decompressor keeps the input it has not decoded yet, and takes
+        # no more until it asks for it, even if it still has output to give
+        data = b""
+        if self._obj.can_accept_more_data():
+            data, self._input = self._input, b""
+        if not data and self._obj.is_finished():
+            return b""
+        return self._obj.process(data, output_buffer_limit=max_length)
+
+
+def get_decoder(content_encoding: Optional[str]) -> Optional[Decoder]:
+    """Return a decoder for ``content_encoding``, or ``None`` if the content is not encoded or the encoding is unknown."""
+    encoding = (content_encoding or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return ZlibDecoder(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return DeflateDecoder()
+    if encoding == "br" and brotli is not None:
+        return BrotliDecoder()
+    return None
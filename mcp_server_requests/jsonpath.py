@@ -0,0 +1,541 @@
+from dataclasses import dataclass
+from json.decoder import scanstring
+from typing import Any, Callable, Generator, Iterator, Optional
+import functools
+import json
+import re
+
+
+class JSONPathError(ValueError):
+    """An invalid or unsupported JSONPath expression."""
+
+
+# a query is a tuple of segments, a segment is (descendant, selectors), and a
+# selector one of ("name", name), ("wildcard",), ("index", i),
+# ("slice", start, stop, step) and ("filter", expression)
+Segment = tuple[bool, tuple[tuple, ...]]
+Query = tuple[Segment, ...]
+
+_NOTHING = object()
+
+_WS = re.compile(r"[ \t\n\r]*")
+_SHORTHAND = re.compile(r"[A-Za-z_\u0080-\U0010ffff][A-Za-z0-9_\u0080-\U0010ffff]*")
+_INT = re.compile(r"-?(?:0|[1-9][0-9]*)")
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+_STRING = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"", re.DOTALL)
+_COMPARISONS = ("==", "!=", "<=", ">=", "<", ">")
+
+# JSON scalars, and everything up to the next bracket of a container,
+# strings included
+_SCALAR = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?|true|false|null')
+_TO_BRACKET = re.compile(r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*')
+
+_decoder = json.JSONDecoder()
+
+# containers of up to this many characters are decoded in one go and
+# queried in memory, the larger ones are scanned
+DECODE_SIZE = 4096
+
+
+class _Parser:
+    """Parse a JSONPath expression (RFC 9535) without function extensions."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def error(self, message: str) -> JSONPathError:
+        return JSONPathError(f"invalid JSONPath {self.text!r} at {self.pos}: {message}")
+
+    def skip_ws(self) -> None:
+        self.pos = _WS.match(self.text, self.pos).end()
+
+    def accept(self, token: str) -> bool:
+        if self.text.startswith(token, self.pos):
+            self.pos += len(token)
+            return True
+        return False
+
+    def expect(self, token: str) -> None:
+        if not self.accept(token):
+            raise self.error(f"expected {token!r}")
+
+    def parse(self) -> Query:
+        self.skip_ws()
+        query = self.query("$")
+        self.skip_ws()
+        if self.pos != len(self.text):
+            raise self.error("unexpected characters")
+        return query
+
+    def query(self, root: str) -> Query:
+        self.expect(root)
+        segments = []
+        while True:
+            if self.accept(".."):
+                segments.append((True, self.segment_selectors()))
+            elif self.accept("."):
+                if self.accept("*"):
+                    segments.append((False, (("wildcard",),)))
+                else:
+                    segments.append((False, (("name", self.shorthand()),)))
+            elif self.accept("["):
+                segments.append((False, self.bracket()))
+            else:
+                return tuple(segments)
+
+    def segment_selectors(self) -> tuple[tuple, ...]:
+        # after ".."
+        if self.accept("*"):
+            return (("wildcard",),)
+        if self.accept("["):
+            return self.bracket()
+        return (("name", self.shorthand()),)
+
+    def shorthand(self) -> str:
+        m = _SHORTHAND.match(self.text, self.pos)
+        if m is None:
+            raise self.error("expected a member name")
+        self.pos = m.end()
+        return m.group()
+
+    def bracket(self) -> tuple[tuple, ...]:
+        # after "["
+        selectors = []
+        while True:
+            self.skip_ws()
+            selectors.append(self.selector())
+            self.skip_ws()
+            if self.accept("]"):
+                return tuple(selectors)
+            self.expect(",")
+
+    def selector(self) -> tuple:
+        if self.accept("*"):
+            return ("wildcard",)
+        if self.accept("?"):
+            self.skip_ws()
+            return ("filter", self.logical_or())
+        if self.text.startswith(("'", '"'), self.pos):
+            return ("name", self.string())
+        start = self.integer()
+        self.skip_ws()
+        if not self.accept(":"):
+            if start is None:
+                raise self.error("expected a selector")
+            return ("index", start)
+        self.skip_ws()
+        stop = self.integer()
+        self.skip_ws()
+        step = None
+        if self.accept(":"):
+            self.skip_ws()
+            step = self.integer()
+        return ("slice", start, stop, 1 if step is None else step)
+
+    def integer(self) -> Optional[int]:
+        m = _INT.match(self.text, self.pos)
+        if m is None:
+            return None
+        self.pos = m.end()
+        return int(m.group())
+
+    def string(self) -> str:
+        m = _STRING.match(self.text, self.pos)
+        if m is None:
+            raise self.error("unterminated string")
+        self.pos = m.end()
+        if m.group(1) is not None:
+            # a single quoted string, as a double quoted JSON string
+            body = re.sub(r"""(\\.)|\"""", lambda e: ("'" if e.group(1) == "\\'" else e.group(1)) if e.group(1) else '\\"', m.group(1))
+        else:
+            body = m.group(2)
+        try:
+            return json.loads(f'"{body}"')
+        except json.JSONDecodeError as e:
+            raise self.error(f"invalid string: {e}") from e
+
+    def logical_or(self) -> tuple:
+        expression = self.logical_and()
+        while self.accept("||"):
+            self.skip_ws()
+            expression = ("or", expression, self.logical_and())
+        return expression
+
+    def logical_and(self) -> tuple:
+        expression = self.basic()
+        while self.accept("&&"):
+            self.skip_ws()
+            expression = ("and", expression, self.basic())
+        return expression
+
+    def basic(self) -> tuple:
+        if self.accept("!"):
+            self.skip_ws()
+            expression = ("not", self.basic())
+        elif self.accept("("):
+            self.skip_ws()
+            expression = self.logical_or()
+            self.expect(")")
+        else:
+            left = self.comparable()
+            self.skip_ws()
+            op = next((op for op in _COMPARISONS if self.accept(op)), None)
+            if op is None:
+                if left[0] != "query":
+                    raise self.error("expected a comparison")
+                expression = ("exists", left[1])
+            else:
+                self.skip_ws()
+                right = self.comparable()
+                for side in (left, right):
+                    if side[0] == "query" and not _singular(side[1]):
+                        raise self.error("only queries of single values can be compared")
+                expression = ("compare", op, left, right)
+        self.skip_ws()
+        return expression
+
+    def comparable(self) -> tuple:
+        if self.text.startswith("@", self.pos):
+            return ("query", self.query("@"))
+        if self.text.startswith("$", self.pos):
+            raise self.error("absolute queries are not supported in filters, use @")
+        if self.text.startswith(("'", '"'), self.pos):
+            return ("value", self.string())
+        for name, value in (("true", True), ("false", False), ("null", None)):
+            if self.accept(name):
+                return ("value", value)
+        m = _NUMBER.match(self.text, self.pos)
+        if m is not None:
+            self.pos = m.end()
+            return ("value", json.loads(m.group()))
+        if _SHORTHAND.match(self.text, self.pos):
+            raise self.error("functions are not supported")
+        raise self.error("expected a query or a literal")
+
+
+def _singular(query: Query) -> bool:
+    return all(not descendant and len(selectors) == 1 and selectors[0][0] in ("name", "index")
+               for descendant, selectors in query)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_query(expression: str) -> Query:
+    return _Parser(expression).parse()
+
+
+# evaluation on decoded values, for filters and below a filter
+
+def _children(value: Any) -> Iterator[Any]:
+    if isinstance(value, dict):
+        return iter(value.values())
+    if isinstance(value, list):
+        return iter(value)
+    return iter(())
+
+
+def _descendants(value: Any) -> Iterator[Any]:
+    # the value itself, then its descendants in document order
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        yield value
+        if isinstance(value, (dict, list)):
+            stack.extend(reversed(list(_children(value))))
+
+
+def _slice_indices(start: Optional[int], stop: Optional[int], step: int, length: int) -> range:
+    if step == 0:
+        return range(0)
+    return range(*slice(start, stop, step).indices(length))
+
+
+def _select_value(value: Any, selector: tuple) -> Iterator[Any]:
+    kind = selector[0]
+    if kind == "name":
+        if isinstance(value, dict) and selector[1] in value:
+            yield value[selector[1]]
+    elif kind == "wildcard":
+        yield from _children(value)
+    elif kind == "index":
+        if isinstance(value, list) and -len(value) <= selector[1] < len(value):
+            yield value[selector[1]]
+    elif kind == "slice":
+        if isinstance(value, list):
+            for i in _slice_indices(*selector[1:], len(value)):
+                yield value[i]
+    else:
+        yield from (child for child in _children(value) if _test(selector[1], child))
+
+
+def _evaluate(value: Any, query: Query, i: int = 0) -> Iterator[Any]:
+    if i == len(query):
+        yield value
+        return
+    descendant, selectors = query[i]
+    for node in _descendants(value) if descendant else (value,):
+        for selector in selectors:
+            for child in _select_value(node, selector):
+                yield from _evaluate(child, query, i + 1)
+
+
+def _test(expression: tuple, node: Any) -> bool:
+    kind = expression[0]
+    if kind == "or":
+        return _test(expression[1], node) or _test(expression[2], node)
+    if kind == "and":
+        return _test(expression[1], node) and _test(expression[2], node)
+    if kind == "not":
+        return not _test(expression[1], node)
+    if kind == "exists":
+        return next(_evaluate(node, expression[1]), _NOTHING) is not _NOTHING
+    _, op, left, right = expression
+    return _compare(op, _operand(left, node), _operand(right, node))
+
+
+def _operand(operand: tuple, node: Any) -> Any:
+    if operand[0] == "value":
+        return operand[1]
+    return next(_evaluate(node, operand[1]), _NOTHING)
+
+
+def _equal(a: Any, b: Any) -> bool:
+    if a is _NOTHING or b is _NOTHING:
+        return a is b
+    # true is not 1 in JSON
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    return a == b
+
+
+def _less(a: Any, b: Any) -> bool:
+    numbers = (int, float)
+    if isinstance(a, numbers) and isinstance(b, numbers) and not isinstance(a, bool) and not isinstance(b, bool):
+        return a < b
+    return isinstance(a, str) and isinstance(b, str) and a < b
+
+
+def _compare(op: str, a: Any, b: Any) -> bool:
+    if op == "==":
+        return _equal(a, b)
+    if op == "!=":
+        return not _equal(a, b)
+    if op == "<":
+        return _less(a, b)
+    if op == ">":
+        return _less(b, a)
+    if op == "<=":
+        return _less(a, b) or _equal(a, b)
+    return _less(b, a) or _equal(a, b)
+
+
+# evaluation on the JSON text, the values that are not selected are skipped
+# without decoding them, and the selected ones are decoded one at a time.
+# The generators yield the selected values and return the position after
+# the value they were given.
+
+Scan = Generator[Any, None, int]
+
+
+def _error(message: str, s: str, pos: int) -> json.JSONDecodeError:
+    return json.JSONDecodeError(message, s, pos)
+
+
+def _skip(s: str, pos: int) -> int:
+    c = s[pos:pos + 1]
+    if c == '"':
+        return scanstring(s, pos + 1)[1]
+    if c not in ("{", "["):
+        m = _SCALAR.match(s, pos)
+        if m is None:
+            raise _error("expecting value", s, pos)
+        return m.end()
+    # decoding a small container is faster than finding its end in Python
+    small = _decode_small(s, pos)
+    if small is not None:
+        return small[1]
+    depth = 0
+    while True:
+        pos = _TO_BRACKET.match(s, pos).end()
+        c = s[pos:pos + 1]
+        if not c:
+            raise _error("unterminated container", s, pos)
+        pos += 1
+        if c in "{[":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+def _decode_small(s: str, pos: int) -> Optional[tuple[Any, int]]:
+    """The container at ``pos`` and the position after it, if it ends within ``DECODE_SIZE`` characters."""
+    # a container cut by the slice does not decode, and neither does an
+    # invalid one, which is then scanned to report the error
+    try:
+        value, size = _decoder.raw_decode(s[pos:pos + DECODE_SIZE])
+    except json.JSONDecodeError:
+        return None
+    return value, pos + size
+
+
+def _decode_child(s: str, pos: int) -> tuple[Any, int]:
+    value, end = _decoder.raw_decode(s, pos)
+    # a value in a container cannot end the document, in a truncated one it
+    # may be a number that was cut
+    if end == len(s):
+        raise _error("unterminated container", s, end)
+    return value, end
+
+
+def _skipped(s: str, pos: int) -> Scan:
+    return _skip(s, pos)
+    yield  # a generator that yields nothing
+
+
+def _members(s: str, pos: int, visit: Callable[[Any, int], Scan]) -> Scan:
+    """Call ``visit`` with the key or index and the position of every child of the container at ``pos``."""
+    close = "}" if s[pos] == "{" else "]"
+    pos = _WS.match(s, pos + 1).end()
+    if s.startswith(close, pos):
+        return pos + 1
+    index = 0
+    while True:
+        if close == "}":
+            if not s.startswith('"', pos):
+                raise _error("expecting property name enclosed in double quotes", s, pos)
+            key, pos = scanstring(s, pos + 1)
+            pos = _WS.match(s, pos).end()
+            if not s.startswith(":", pos):
+                raise _error("expecting ':' delimiter", s, pos)
+            pos = _WS.match(s, pos + 1).end()
+        else:
+            key = index
+            index += 1
+        pos = yield from visit(key, pos)
+        pos = _WS.match(s, pos).end()
+        if s.startswith(",", pos):
+            pos = _WS.match(s, pos + 1).end()
+        elif s.startswith(close, pos):
+            return pos + 1
+        else:
+            raise _error("expecting ',' delimiter", s, pos)
+
+
+def _scan(s: str, pos: int, query: Query, i: int) -> Scan:
+    if i == len(query):
+        value, end = _decode_child(s, pos) if i > 0 else _decoder.raw_decode(s, pos)
+        yield value
+        return end
+    if not s.startswith(("{", "["), pos):
+        return _skip(s, pos)
+    small = _decode_small(s, pos)
+    if small is not None:
+        yield from _evaluate(small[0], query, i)
+        return small[1]
+    descendant, selectors = query[i]
+    end = None
+    for selector in selectors:
+        end = (yield from _scan_selector(s, pos, selector, query, i + 1)) or end
+    if descendant:
+        end = yield from _members(s, pos, lambda key, p: _scan(s, p, query, i))
+    return end if end is not None else _skip(s, pos)
+
+
+def _scan_selector(s: str, pos: int, selector: tuple, query: Query, i: int) -> Generator[Any, None, Optional[int]]:
+    # returns None without reading the container if the selector does not apply to it
+    kind = selector[0]
+    is_array = s.startswith("[", pos)
+    if kind == "wildcard":
+        return (yield from _members(s, pos, lambda key, p: _scan(s, p, query, i)))
+    if kind == "name":
+        if is_array:
+            return None
+        name = selector[1]
+        return (yield from _members(s, pos, lambda key, p: _scan(s, p, query, i) if key == name else _skipped(s, p)))
+    if kind == "filter":
+        def visit(key: Any, p: int) -> Scan:
+            value, end = _decode_child(s, p)
+            if _test(selector[1], value):
+                yield from _evaluate(value, query, i)
+            return end
+        return (yield from _members(s, pos, visit))
+    if not is_array:
+        return None
+
+    if kind == "index" and selector[1] >= 0:
+        index = selector[1]
+        return (yield from _members(s, pos, lambda key, p: _scan(s, p, query, i) if key == index else _skipped(s, p)))
+    if kind == "slice" and selector[3] > 0 and (selector[1] or 0) >= 0 and (selector[2] is None or selector[2] >= 0):
+        _, start, stop, step = selector
+        start = start or 0
+        selected = lambda key: key >= start and (stop is None or key < stop) and (key - start) % step == 0
+        return (yield from _members(s, pos, lambda key, p: _scan(s, p, query, i) if selected(key) else _skipped(s, p)))
+
+    # counted from the end, or backwards, so the positions of all elements are needed first
+    positions = []
+
+    def collect(key: Any, p: int) -> Scan:
+        positions.append(p)
+        return _skipped(s, p)
+
+    end = yield from _members(s, pos, collect)
+    if kind == "index":
+        indices = [selector[1] + len(positions)] if -len(positions) <= selector[1] < 0 else []
+    else:
+        indices = _slice_indices(*selector[1:], len(positions))
+    for index in indices:
+        yield from _scan(s, positions[index], query, i)
+    return end
+
+
+@dataclass(frozen=True)
+class JSONPath:
+    """A JSONPath expression (RFC 9535, without functions) that selects values from a JSON document.
+
+    The document is scanned without decoding it, only the selected values,
+    the elements a filter is tested on and the containers small enough to
+    query in memory are decoded, one at a time, so a large array is filtered
+    without holding all of its elements. A query of a single value, like
+    ``$.data.total``, stops at its match without reading the rest. The
+    values that are skipped are only checked for balanced brackets.
+    """
+    expression: str
+
+    def __str__(self) -> str:
+        return self.expression
+
+    def check(self) -> None:
+        """Raise ``JSONPathError`` if the expression is invalid."""
+        compile_query(self.expression)
+
+    def iter_select(self, text: str) -> Iterator[Any]:
+        """The selected values of the JSON document ``text`` in order, ``json.JSONDecodeError`` if it is invalid."""
+        query = compile_query(self.expression)
+        pos = _WS.match(text).end()
+        try:
+            end = yield from _scan(text, pos, query, 0)
+        except RecursionError as e:
+            raise _error("too deeply nested", text, pos) from e
+        end = _WS.match(text, end).end()
+        if end != len(text):
+            raise _error("extra data", text, end)
+
+    def select(self, text: str, *, partial: bool = False) -> list[Any]:
+        """The selected values of the JSON document ``text``.
+
+        With ``partial`` the values selected before an error in the document,
+        like the end of a truncated one, are returned instead of the error.
+        """
+        single = _singular(compile_query(self.expression))
+        values = []
+        try:
+            for value in self.iter_select(text):
+                values.append(value)
+                if single:
+                    break
+        except json.JSONDecodeError:
+            if not partial:
+                raise
+        return values
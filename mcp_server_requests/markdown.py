@@ -0,0 +1,258 @@
+from html.parser import HTMLParser
+from typing import Callable, Iterable, Iterator, Optional
+import re
+
+
+# elements that never have children or an end tag
+VOID_ELEMENTS = frozenset((
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image", "img",
+    "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source", "spacer", "track", "wbr",
+))
+
+HEADINGS = {f"h{i}": "#" * i for i in range(1, 7)}
+
+_NEWLINES = re.compile(r"\n{3,}")
+
+# modes of a frame, they change how its content is written
+_PLAIN, _SKIP, _LIST, _PRE, _CODE = range(5)
+
+
+class _Frame:
+    __slots__ = ("tag", "mode", "suffix", "items", "quote")
+
+    def __init__(self, tag: str, mode: int = _PLAIN, suffix: str = ""):
+        self.tag = tag
+        self.mode = mode
+        self.suffix = suffix
+        self.items = 0
+        self.quote = False
+
+
+class _Output:
+    """Join runs of 3 or more newlines and strip the start and the end of the written text."""
+
+    def __init__(self, write: Callable[[str], None]):
+        self._write = write
+        self._started = False
+        self._pending = ""
+
+    def write(self, s: str) -> None:
+        s = self._pending + s
+        body = s.rstrip()
+        self._pending = s[len(body):]
+        if not self._started:
+            body = body.lstrip()
+        if body:
+            self._started = True
+            self._write(_NEWLINES.sub("\n\n", body))
+
+
+class MarkdownConverter(HTMLParser):
+    """Convert HTML to Markdown while it is parsed, without building a tree.
+
+    The output is passed to ``write`` as soon as it is known, the converter
+    only keeps the stack of open elements. It produces the same Markdown as
+    ``utils.simple_html_to_markdown`` for the tags documented there, the
+    text of comments included, except that text outside of any element is
+    kept.
+
+        converter = MarkdownConverter(chunks.append)
+        converter.feed(html)
+        converter.close()
+    """
+
+    def __init__(
+        self,
+        write: Callable[[str], None],
+        *,
+        remove_tags: Iterable[str] = ("script", "style", "meta", "link", "noscript"),
+    ):
+        super().__init__(convert_charrefs=True)
+        self._out = _Output(write)
+        self._remove_tags = frozenset(remove_tags)
+        self._stack: list[_Frame] = []
+        self._text: list[str] = []
+        self._quotes = 0
+        # the content of a <pre> is held back until it is known whether it has a <code>
+        self._pre_buffer: Optional[list[str]] = None
+        self._pre_quotes = 0
+        self._skipping = 0
+        self._in_code = False
+
+    def _emit(self, s: str) -> None:
+        if self._pre_buffer is not None:
+            # quotes opened inside the <pre> are applied now, the others when it is flushed
+            for _ in range(self._quotes - self._pre_quotes):
+                s = s.replace("\n", "\n> ")
+            self._pre_buffer.append(s)
+            return
+        for _ in range(self._quotes):
+            s = s.replace("\n", "\n> ")
+        self._out.write(s)
+
+    def _flush_text(self) -> None:
+        if not self._text:
+            return
+        text = "".join(self._text)
+        self._text.clear()
+        if self._skipping:
+            return
+        if self._in_code:
+            self._emit(text)
+        elif not (self._stack and self._stack[-1].mode == _LIST):
+            # a list only keeps its <li> children
+            self._emit(text.strip())
+
+    def handle_data(self, data: str) -> None:
+        self._text.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self._flush_text()
+        # like the text nodes, a comment in an element is written on its own,
+        # but it is not part of the text of a <code>
+        if self._stack and not self._in_code:
+            self._text.append(data)
+            self._flush_text()
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        self._flush_text()
+        void = tag in VOID_ELEMENTS
+        parent = self._stack[-1] if self._stack else None
+
+        if tag == "code" and self._pre_buffer is not None and self._code_allowed():
+            # the first <code> of a <pre> replaces all of its content, it is
+            # found even where a list drops its other children
+            self._pre_buffer = None
+            for f in reversed(self._stack):
+                if f.mode == _PRE:
+                    break
+                f.mode = _PLAIN
+                f.quote = False
+            self._skipping = 0
+            self._quotes = self._pre_quotes
+            self._emit("```\n")
+            self._in_code = True
+            self._stack.append(_Frame(tag, _CODE, "\n```\n\n"))
+            return
+
+        if self._skipping or self._in_code or tag in self._remove_tags or (parent and parent.mode == _LIST and tag != "li"):
+            if not void:
+                frame = _Frame(tag, _SKIP if not self._in_code or tag in self._remove_tags else _PLAIN)
+                self._skipping += frame.mode == _SKIP
+                self._stack.append(frame)
+            return
+
+        if void:
+            a = dict(attrs)
+            if tag == "img":
+                self._emit(f"![{a.get('alt') or ''}]({a.get('src') or ''})")
+            elif tag == "hr":
+                self._emit("---\n\n")
+            return
+
+        frame = _Frame(tag)
+        if parent and parent.mode == _LIST and tag == "li":
+            parent.items += 1
+            marker = "* " if parent.tag == "ul" else f"{parent.items}. "
+            self._emit(marker if parent.items == 1 else "\n" + marker)
+        elif tag in HEADINGS:
+            self._emit(HEADINGS[tag] + " ")
+            frame.suffix = "\n\n"
+        elif tag == "p":
+            frame.suffix = "\n\n"
+        elif tag == "a":
+            self._emit("[")
+            frame.suffix = f"]({dict(attrs).get('href') or ''})"
+        elif tag in ("ul", "ol"):
+            frame.mode = _LIST
+            frame.suffix = "\n\n"
+        elif tag == "pre" and self._pre_buffer is None and not any(f.mode == _PRE for f in self._stack):
+            frame.mode = _PRE
+            self._pre_buffer = []
+            self._pre_quotes = self._quotes
+        elif tag in ("strong", "b"):
+            self._emit(" **")
+            frame.suffix = "** "
+        elif tag in ("em", "i"):
+            self._emit(" _")
+            frame.suffix = "_ "
+        elif tag == "blockquote":
+            self._emit("> ")
+            self._quotes += 1
+            frame.quote = True
+            frame.suffix = "\n\n"
+        self._stack.append(frame)
+
+    def _code_allowed(self) -> bool:
+        # the content of removed tags is never searched
+        for f in reversed(self._stack):
+            if f.mode == _PRE:
+                return True
+            if f.mode == _SKIP and f.tag in self._remove_tags:
+                return False
+        return True
+
+    def handle_endtag(self, tag: str) -> None:
+        self._flush_text()
+        # like the tree builders, an end tag closes every element opened after
+        # the matching start tag, and an end tag without a start tag is ignored
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i].tag == tag:
+                break
+        else:
+            return
+        while len(self._stack) > i:
+            self._close(self._stack.pop())
+
+    def _close(self, frame: _Frame) -> None:
+        if frame.mode == _SKIP:
+            self._skipping -= 1
+            return
+        if self._skipping:
+            return
+        if frame.mode == _CODE:
+            self._in_code = False
+            self._emit(frame.suffix)
+            # what follows the <code> in the <pre> is dropped
+            for f in reversed(self._stack):
+                if f.mode == _PRE:
+                    f.mode = _SKIP
+                    self._skipping += 1
+                    break
+            return
+        if frame.mode == _PRE:
+            content, self._pre_buffer = "".join(self._pre_buffer), None
+            self._emit(content)
+            return
+        if frame.quote:
+            self._quotes -= 1
+        if frame.suffix:
+            self._emit(frame.suffix)
+
+    def close(self) -> None:
+        super().close()
+        self._flush_text()
+        while self._stack:
+            self._close(self._stack.pop())
+        self._out.write("")
+
+
+def iter_html_to_markdown(chunks: Iterable[str], **kwargs) -> Iterator[str]:
+    """Convert HTML arriving in ``chunks`` to Markdown, yielding the Markdown as it is produced."""
+    output: list[str] = []
+    converter = MarkdownConverter(output.append, **kwargs)
+    for chunk in chunks:
+        converter.feed(chunk)
+        yield from output
+        output.clear()
+    converter.close()
+    yield from output
+
+
+def stream_html_to_markdown(html: str, **kwargs) -> str:
+    """Convert ``html`` to Markdown with ``MarkdownConverter``, see ``utils.simple_html_to_markdown``."""
+    output: list[str] = []
+    converter = MarkdownConverter(output.append, **kwargs)
+    converter.feed(html)
+    converter.close()
+    return "".join(output)
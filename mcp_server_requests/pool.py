@@ -0,0 +1,193 @@
+from dataclasses import dataclass
+from typing import Optional
+import base64
+import collections
+import http.client
+import select
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+ConnectionKey = tuple[str, str, int, Optional[str]]
+
+
+@dataclass
+class PoolStats:
+    reused: int = 0
+    missed: int = 0
+    idle: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.reused + self.missed
+        return self.reused / total if total else 0.0
+
+
+@dataclass
+class Proxy:
+    host: str
+    port: int
+    authorization: Optional[str] = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+def find_proxy(scheme: str, host: str) -> Optional[Proxy]:
+    """Look up the proxy urllib would use for ``scheme://host``, if any."""
+    proxy_url = urllib.request.getproxies().get(scheme)
+    if not proxy_url or urllib.request.proxy_bypass(host):
+        return None
+
+    if "://" not in proxy_url:
+        proxy_url = "http://" + proxy_url
+    parsed = urllib.parse.urlsplit(proxy_url)
+    if not parsed.hostname:
+        return None
+
+    authorization = None
+    if parsed.username is not None:
+        user = urllib.parse.unquote(parsed.username)
+        password = urllib.parse.unquote(parsed.password or "")
+        token = base64.b64encode(f"{user}:{password}".encode("utf-8")).decode("ascii")
+        authorization = f"Basic {token}"
+
+    return Proxy(parsed.hostname, parsed.port or 80, authorization)
+
+
+class ConnectionPool:
+    """Per-host pool of idle HTTP/1.1 keep-alive connections.
+
+    Connections are checked out with ``acquire`` and handed back with
+    ``release`` once their response has been read completely. At most
+    ``max_per_host`` idle connections are kept for each host, and idle
+    connections older than ``idle_timeout`` seconds are closed.
+    """
+
+    def __init__(self, *, max_per_host: int = DEFAULT_POOL_SIZE, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        if max_per_host < 0:
+            raise ValueError("max_per_host must be greater than or equal to 0")
+        if idle_timeout < 0:
+            raise ValueError("idle_timeout must be greater than or equal to 0")
+
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._idle: dict[ConnectionKey, collections.deque[tuple[http.client.HTTPConnection, float]]] = {}
+        self._reused = 0
+        self._missed = 0
+        self._ssl_context: Optional[ssl.SSLContext] = None
+
+    @staticmethod
+    def _is_dropped(conn: http.client.HTTPConnection) -> bool:
+        sock = conn.sock
+        if sock is None:
+            return True
+        try:
+            # an idle keep-alive socket must not be readable, otherwise the
+            # peer has closed it or sent something we did not ask for.
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    def _new_connection(self, key: ConnectionKey, proxy: Optional[Proxy], timeout: Optional[float]) -> http.client.HTTPConnection:
+        scheme, host, port, _ = key
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        if scheme == "https":
+            if proxy is not None:
+                conn = http.client.HTTPSConnection(proxy.host, proxy.port, context=self._get_ssl_context(), **kwargs)
+                tunnel_headers = {"Proxy-Authorization": proxy.authorization} if proxy.authorization else None
+                conn.set_tunnel(host, port, headers=tunnel_headers)
+            else:
+                conn = http.client.HTTPSConnection(host, port, context=self._get_ssl_context(), **kwargs)
+        else:
+            if proxy is not None:
+                conn = http.client.HTTPConnection(proxy.host, proxy.port, **kwargs)
+            else:
+                conn = http.client.HTTPConnection(host, port, **kwargs)
+        return conn
+
+    def acquire(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        *,
+        proxy: Optional[Proxy] = None,
+        timeout: Optional[float] = None,
+    ) -> tuple[http.client.HTTPConnection, ConnectionKey, bool]:
+        """Return ``(connection, key, reused)`` for the given origin."""
+        key: ConnectionKey = (scheme, host, port, proxy.url if proxy else None)
+        now = time.monotonic()
+        expired = []
+        conn = None
+
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                candidate, released_at = idle.pop()
+                if now - released_at >= self.idle_timeout or self._is_dropped(candidate):
+                    expired.append(candidate)
+                    continue
+                conn = candidate
+                break
+            if conn is not None:
+                self._reused += 1
+            else:
+                self._missed += 1
+
+        for c in expired:
+            c.close()
+
+        if conn is not None:
+            if timeout is not None and conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, key, True
+
+        return self._new_connection(key, proxy, timeout), key, False
+
+    def release(self, conn: http.client.HTTPConnection, key: ConnectionKey) -> None:
+        """Give a connection back to the pool, or close it if it cannot be reused."""
+        if conn.sock is None or self.max_per_host == 0:
+            conn.close()
+            return
+
+        with self._lock:
+            idle = self._idle.setdefault(key, collections.deque())
+            if len(idle) >= self.max_per_host:
+                conn.close()
+                return
+            idle.append((conn, time.monotonic()))
+
+    def clear(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            idle = sum(len(conns) for conns in self._idle.values())
+            return PoolStats(reused=self._reused, missed=self._missed, idle=idle)
+
+
+default_pool = ConnectionPool()
@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Literal, Optional
+import cProfile
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+import urllib.parse
+
+from .timing import Timings
+
+
+ProfileMode = Literal["cpu", "memory", "both"]
+PROFILE_MODES = ("cpu", "memory", "both")
+
+# frames kept for each allocation traced in memory mode
+TRACEMALLOC_FRAMES = 16
+
+
+@dataclass
+class ProfilerStats:
+    profiled: int = 0
+    saved: int = 0
+    # calls that were sampled while another call was being profiled
+    busy: int = 0
+    errors: int = 0
+
+
+class Profiler:
+    """Profile calls with cProfile and/or tracemalloc, and save the slow ones to ``directory``.
+
+    A ``sample_rate`` share of the calls is profiled, and the profile of a
+    call is saved when it took at least ``threshold`` seconds. Every saved
+    call gets a ``.json`` file with the URL, the time it took and its phase
+    timings, next to a ``.prof`` file for ``pstats`` (``cpu``) and a
+    ``.tracemalloc`` snapshot for ``tracemalloc.Snapshot.load`` (``memory``).
+
+    Only one call is profiled at a time, cProfile does not support
+    concurrent profilers and tracemalloc traces every thread, so the
+    snapshot of a call also holds what other threads allocated meanwhile.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        mode: ProfileMode = "cpu",
+        sample_rate: float = 1.0,
+        threshold: float = 0.0,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"unknown profile mode: {mode!r}, expected one of {', '.join(PROFILE_MODES)}")
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if threshold < 0:
+            raise ValueError("threshold must be greater than or equal to 0")
+        self.directory = directory
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._stats = ProfilerStats()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self._stats, name, getattr(self._stats, name) + 1)
+
+    @contextmanager
+    def profile(self, method: str, url: str, timings: Optional[Timings] = None) -> Iterator[None]:
+        """Profile the body of the ``with`` statement if the call is sampled."""
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            yield
+            return
+        if not self._busy.acquire(blocking=False):
+            self._count("busy")
+            yield
+            return
+
+        try:
+            self._count("profiled")
+            profiler = cProfile.Profile() if self.mode in ("cpu", "both") else None
+            trace = self.mode in ("memory", "both")
+            started_tracing = trace and not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            if trace:
+                tracemalloc.reset_peak()
+                memory_before = tracemalloc.get_traced_memory()[0]
+
+            started_at = time.time()
+            start = time.perf_counter()
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                elapsed = time.perf_counter() - start
+                snapshot = None
+                memory = None
+                if trace:
+                    current, peak = tracemalloc.get_traced_memory()
+                    memory = {"before": memory_before, "after": current, "peak": peak}
+                    if elapsed >= self.threshold:
+                        snapshot = tracemalloc.take_snapshot()
+                    if started_tracing:
+                        tracemalloc.stop()
+                if elapsed >= self.threshold:
+                    metadata = {
+                        "method": method,
+                        "url": url,
+                        "started_at": started_at,
+                        "elapsed": elapsed,
+                        "timings": dict(timings.phases) if timings is not None else None,
+                        "memory": memory,
+                        "mode": self.mode,
+                    }
+                    self._save(url, metadata, profiler, snapshot)
+        finally:
+            self._busy.release()
+
+    def _save(self, url: str, metadata: dict, profiler: Optional[cProfile.Profile], snapshot: Optional[tracemalloc.Snapshot]) -> None:
+        host = urllib.parse.urlsplit(url).hostname or "unknown"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._counter):04d}-{re.sub(r'[^A-Za-z0-9.-]', '_', host)}"
+        base = os.path.join(self.directory, name)
+        # a profile that cannot be written is dropped, the call itself is not affected
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            if profiler is not None:
+                profiler.dump_stats(base + ".prof")
+                files.append(name + ".prof")
+            if snapshot is not None:
+                snapshot.dump(base + ".tracemalloc")
+                files.append(name + ".tracemalloc")
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump({**metadata, "files": files}, f, indent=2)
+        except OSError:
+            self._count("errors")
+            return
+        self._count("saved")
+
+    def stats(self) -> ProfilerStats:
+        with self._lock:
+            return ProfilerStats(**self._stats.__dict__)
@@ -0,0 +1,212 @@
+from dataclasses import dataclass, field
+from typing import Optional
+import collections
+import threading
+import time
+
+from .timeout import DeadlineExceeded
+
+
+DEFAULT_HOST_BURST = 5
+DEFAULT_HOST_CONCURRENCY = 8
+
+# adaptive slow-down: the limits of a host are scaled by a factor that is
+# halved on 429/503, cut by SLOWDOWN when responses get slow and grows back
+# by RECOVERY after every normal response.
+MIN_SCALE = 1 / 16
+SLOWDOWN = 0.9
+RECOVERY = 0.05
+THROTTLE_STATUSES = (429, 503)
+# a response is slow when it takes this many times the fastest average seen
+LATENCY_FACTOR = 3.0
+LATENCY_SMOOTHING = 0.2
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    waits: int = 0
+    waited: float = 0.0
+    active: int = 0
+    queued: int = 0
+    scale: float = 1.0
+
+
+@dataclass
+class RateLimitStats:
+    requests: int = 0
+    waits: int = 0
+    waited: float = 0.0
+    hosts: dict[str, HostStats] = field(default_factory=dict)
+
+
+class _Host:
+    def __init__(self, burst: int):
+        self.cond = threading.Condition()
+        self.queue: collections.deque[object] = collections.deque()
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.active = 0
+        # threads inside acquire or release, guarded by the lock of the limiter
+        self.users = 0
+        self.scale = 1.0
+        self.latency: Optional[float] = None
+        self.fastest: Optional[float] = None
+        self.stats = HostStats()
+
+
+class RateLimiter:
+    """Per-host politeness: a token bucket and a limit of concurrent requests.
+
+    A host gets ``rate`` requests per second with bursts of up to ``burst``,
+    and at most ``max_concurrency`` requests in flight, ``None`` means no
+    limit. Requests waiting for the same host go in FIFO order. With
+    ``adaptive`` the limits of a host shrink when it answers 429 or 503, or
+    gets slower, and grow back as it recovers.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: Optional[float] = None,
+        burst: int = DEFAULT_HOST_BURST,
+        max_concurrency: Optional[int] = DEFAULT_HOST_CONCURRENCY,
+        adaptive: bool = False,
+        max_hosts: int = 1024,
+    ):
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.adaptive = adaptive
+        self.max_hosts = max_hosts
+        self._hosts: collections.OrderedDict[str, _Host] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _host(self, host: str) -> _Host:
+        """The state of ``host``, to be given back with ``_put`` once it is no longer used."""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _Host(self.burst)
+                state.users += 1
+                if len(self._hosts) > self.max_hosts:
+                    # forget the least recently used host that is not busy; a
+                    # host in use is kept, or its waiters and requests in
+                    # flight would end up in a bucket later requests do not see
+                    for name, other in self._hosts.items():
+                        if not other.users and not other.active and not other.queue:
+                            del self._hosts[name]
+                            break
+            else:
+                self._hosts.move_to_end(host)
+                state.users += 1
+            return state
+
+    def _put(self, state: _Host) -> None:
+        with self._lock:
+            state.users -= 1
+
+    def _refill(self, state: _Host, now: float) -> None:
+        if self.rate is not None:
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate * state.scale)
+        state.updated = now
+
+    def _ready(self, state: _Host) -> Optional[float]:
+        """0 if the head of the queue may go now, else how long it has to wait, ``None`` for until notified."""
+        if self.max_concurrency is not None and state.active >= max(1, int(self.max_concurrency * state.scale)):
+            return None
+        if self.rate is None or state.tokens >= 1:
+            return 0
+        return (1 - state.tokens) / (self.rate * state.scale)
+
+    def acquire(self, host: str, timeout: Optional[float] = None) -> float:
+        """Wait for the turn of a request to ``host``, return the seconds waited.
+
+        Raises ``DeadlineExceeded`` if the turn does not come within ``timeout``.
+        Every ``acquire`` must be followed by a ``release``.
+        """
+        state = self._host(host)
+        try:
+            return self._acquire(state, host, timeout)
+        finally:
+            self._put(state)
+
+    def _acquire(self, state: _Host, host: str, timeout: Optional[float]) -> float:
+        ticket = object()
+        start = time.monotonic()
+        with state.cond:
+            state.queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(state, now)
+                    wait = self._ready(state) if state.queue[0] is ticket else None
+                    if wait == 0:
+                        break
+                    if timeout is not None:
+                        remaining = timeout - (now - start)
+                        if remaining <= 0:
+                            raise DeadlineExceeded(f"waited {now - start:.2f}s for a turn to request {host}")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    state.cond.wait(wait)
+            except BaseException:
+                state.queue.remove(ticket)
+                state.cond.notify_all()
+                raise
+            state.queue.popleft()
+            if self.rate is not None:
+                state.tokens -= 1
+            state.active += 1
+            waited = time.monotonic() - start
+            state.stats.requests += 1
+            if waited > 0.001:
+                state.stats.waits += 1
+                state.stats.waited += waited
+            state.cond.notify_all()
+        return waited
+
+    def release(self, host: str, status: Optional[int] = None, latency: Optional[float] = None) -> None:
+        """The request to ``host`` is done, ``status`` is ``None`` if it failed without a response."""
+        state = self._host(host)
+        try:
+            with state.cond:
+                state.active -= 1
+                if self.adaptive:
+                    self._adapt(state, status, latency)
+                state.cond.notify_all()
+        finally:
+            self._put(state)
+
+    def _adapt(self, state: _Host, status: Optional[int], latency: Optional[float]) -> None:
+        if status in THROTTLE_STATUSES:
+            state.scale = max(MIN_SCALE, state.scale / 2)
+            return
+        if latency is None or status is None:
+            return
+        state.latency = latency if state.latency is None else \
+            (1 - LATENCY_SMOOTHING) * state.latency + LATENCY_SMOOTHING * latency
+        state.fastest = state.latency if state.fastest is None else min(state.fastest, state.latency)
+        if state.latency > LATENCY_FACTOR * state.fastest:
+            state.scale = max(MIN_SCALE, state.scale * SLOWDOWN)
+        else:
+            state.scale = min(1.0, state.scale + RECOVERY)
+
+    def stats(self) -> RateLimitStats:
+        with self._lock:
+            hosts = list(self._hosts.items())
+        result = RateLimitStats()
+        for name, state in hosts:
+            with state.cond:
+                stats = HostStats(**{**state.stats.__dict__, "active": state.active,
+                                     "queued": len(state.queue), "scale": state.scale})
+            result.hosts[name] = stats
+            result.requests += stats.requests
+            result.waits += stats.waits
+            result.waited += stats.waited
+        return result
@@ -0,0 +1,298 @@
+from html import unescape
+from typing import Iterable, Iterator, Optional, Union
+import re
+
+from .clean import RAW_TEXT_ELEMENTS, Parser, _start_tag, feed_html
+from .markdown import VOID_ELEMENTS
+from .utils import html_to_markdown
+
+
+# elements dropped with their content before anything is scored
+DROPPED_TAGS = frozenset((
+    "head", "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed",
+    "nav", "aside", "footer", "dialog", "button", "input", "select", "textarea", "link", "meta",
+))
+
+# class and id values of navigation, comments, ads and the like, which are
+# left out unless they also look like content
+UNLIKELY = re.compile(
+    r"-ad-|ad-break|agegate|banner|breadcrumb|combx|comment|community|consent|cookie|cover-wrap|disqus|extra|"
+    r"footer|gdpr|header|legends|menu|newsletter|pager|pagination|popup|related|remark|replies|rss|share|"
+    r"shoutbox|sidebar|skyscraper|social|sponsor|subscribe|supplemental",
+    re.IGNORECASE,
+)
+MAYBE_CONTENT = re.compile(r"and|article|body|column|content|main|shadow", re.IGNORECASE)
+UNLIKELY_ROLES = frozenset(("alert", "alertdialog", "banner", "complementary", "contentinfo", "dialog", "menu", "menubar", "navigation"))
+
+# class and id values that add to or take from the score of an element
+POSITIVE = re.compile(r"article|blog|body|content|entry|h-entry|hentry|main|page|post|story|text", re.IGNORECASE)
+NEGATIVE = re.compile(
+    r"-ad-|banner|combx|comment|com-|consent|contact|cookie|foot|footer|footnote|gdpr|hidden|masthead|media|meta|"
+    r"newsletter|outbrain|promo|related|scroll|share|shopping|shoutbox|sidebar|skyscraper|sponsor|subscribe|tags|"
+    r"tool|widget",
+    re.IGNORECASE,
+)
+
+# elements whose text is scored and added to their ancestors
+SCORED_TAGS = frozenset(("p", "pre", "td", "blockquote"))
+# a <div> without any of these children is scored like a paragraph
+BLOCK_TAGS = frozenset((
+    "address", "article", "aside", "blockquote", "div", "dl", "fieldset", "figure", "footer", "form", "h1", "h2",
+    "h3", "h4", "h5", "h6", "header", "hr", "main", "ol", "p", "pre", "section", "table", "ul",
+))
+# a start tag of these closes an open <p>, like the HTML tree builders do
+CLOSES_P = BLOCK_TAGS | {"li", "dd", "dt"}
+TAG_SCORES = {
+    "div": 5, "article": 5, "main": 5, "section": 3, "pre": 3, "td": 3, "blockquote": 3,
+    "address": -3, "ol": -3, "ul": -3, "dl": -3, "dd": -3, "dt": -3, "li": -3, "form": -3,
+    "h1": -5, "h2": -5, "h3": -5, "h4": -5, "h5": -5, "h6": -5, "th": -5,
+}
+# elements of the main content that are dropped when they are mostly links or look like boilerplate
+CONDITIONAL_TAGS = frozenset(("div", "section", "header", "ul", "ol", "dl", "table", "form"))
+KEPT_ATTRS = frozenset(("href", "src", "alt", "title"))
+
+# with less text than this the unlikely elements are scored as well
+MIN_CONTENT_LENGTH = 250
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "parent", "unlikely", "text_length", "link_length", "commas")
+
+    def __init__(self, tag: str, attrs: list[tuple[str, Optional[str]]], parent: Optional["_Node"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: list[Union["_Node", str]] = []
+        self.parent = parent
+        self.unlikely = False
+        self.text_length = 0
+        self.link_length = 0
+        self.commas = 0
+
+    def attr(self, name: str) -> str:
+        return next((v or "" for k, v in self.attrs if k == name), "")
+
+    @property
+    def link_density(self) -> float:
+        return self.link_length / self.text_length if self.text_length else 0.0
+
+
+class _TreeBuilder:
+    """Build a tree of ``_Node`` from the elements ``clean.feed_html`` reports.
+
+    Dropped and hidden elements are built but never attached, the text is
+    kept as HTML.
+    """
+
+    def __init__(self):
+        self.root = _Node("#root", [], None)
+        self.stack = [self.root]
+
+    def start(self, tag: str, attrs: Iterable[tuple[str, Optional[str]]], text: Optional[str] = None) -> None:
+        attrs = list(attrs)
+        if tag in CLOSES_P and self.stack[-1].tag == "p" or tag == "li" and self.stack[-1].tag == "li":
+            self.stack.pop()
+        parent = self.stack[-1]
+        node = _Node(tag, attrs, parent)
+        if tag not in DROPPED_TAGS and not _hidden(node):
+            node.unlikely = _unlikely(node)
+            parent.children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(node)
+
+    def end(self, tag: str) -> None:
+        if tag in VOID_ELEMENTS:
+            return
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                self.pop(i)
+                return
+
+    def pop(self, index: int) -> None:
+        del self.stack[max(index, 1):]
+
+    def text(self, text: str) -> None:
+        # comments, doctypes and processing instructions
+        if not text.startswith(("<!", "<?")):
+            self.stack[-1].children.append(text)
+
+    @property
+    def in_raw_text(self) -> bool:
+        return self.stack[-1].tag in RAW_TEXT_ELEMENTS
+
+
+def _hidden(node: _Node) -> bool:
+    style = node.attr("style").replace(" ", "").lower()
+    return any(k == "hidden" for k, _ in node.attrs) or node.attr("aria-hidden") == "true" or "display:none" in style
+
+
+def _unlikely(node: _Node) -> bool:
+    if node.tag in ("html", "body", "article", "main", "a"):
+        return False
+    if node.attr("role") in UNLIKELY_ROLES:
+        return True
+    names = f"{node.attr('class')} {node.attr('id')}"
+    return bool(UNLIKELY.search(names)) and not MAYBE_CONTENT.search(names)
+
+
+def _class_weight(node: _Node) -> int:
+    weight = 0
+    for name in (node.attr("class"), node.attr("id")):
+        if name:
+            weight += 25 if POSITIVE.search(name) else 0
+            weight -= 25 if NEGATIVE.search(name) else 0
+    return weight
+
+
+def _children(node: _Node, with_unlikely: bool) -> Iterator[_Node]:
+    return (c for c in node.children if isinstance(c, _Node) and (with_unlikely or not c.unlikely))
+
+
+def _measure(root: _Node, with_unlikely: bool) -> list[_Node]:
+    """Set the text length, link text length and commas of every node, return the nodes in document order."""
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(reversed(list(_children(node, with_unlikely))))
+    for node in reversed(order):
+        text_length = link_length = commas = 0
+        for child in node.children:
+            if isinstance(child, str):
+                text = unescape(child).strip()
+                text_length += len(text)
+                commas += text.count(",") + text.count("，")
+            elif with_unlikely or not child.unlikely:
+                text_length += child.text_length
+                link_length += child.link_length
+                commas += child.commas
+        node.text_length = text_length
+        node.link_length = text_length if node.tag == "a" else link_length
+        node.commas = commas
+    return order
+
+
+def _score(order: list[_Node], with_unlikely: bool) -> dict[_Node, float]:
+    """Scores of the elements that hold paragraphs, readability style."""
+    scores: dict[_Node, float] = {}
+    for node in order:
+        paragraph = node.tag in SCORED_TAGS or (
+            node.tag == "div" and not any(c.tag in BLOCK_TAGS for c in _children(node, with_unlikely)))
+        if not paragraph or node.text_length < 25:
+            continue
+        score = 1 + node.commas + min(node.text_length // 100, 3)
+        ancestor = node.parent
+        for level in range(3):
+            if ancestor is None or ancestor.tag == "#root":
+                break
+            if ancestor not in scores:
+                scores[ancestor] = TAG_SCORES.get(ancestor.tag, 0) + _class_weight(ancestor)
+            scores[ancestor] += score / (1, 2, 6)[level]
+            ancestor = ancestor.parent
+    return {node: score * (1 - node.link_density) for node, score in scores.items()}
+
+
+def _content_nodes(top: _Node, scores: dict[_Node, float], with_unlikely: bool) -> list[_Node]:
+    """``top`` and its siblings that look like they belong to the same content."""
+    if top.parent is None:
+        return [top]
+    top_score = scores[top]
+    threshold = max(10, top_score * 0.2)
+    nodes = []
+    for sibling in _children(top.parent, with_unlikely):
+        if sibling is top:
+            nodes.append(sibling)
+            continue
+        bonus = top_score * 0.2 if sibling.attr("class") and sibling.attr("class") == top.attr("class") else 0
+        if sibling in scores and scores[sibling] + bonus >= threshold:
+            nodes.append(sibling)
+        elif sibling.tag == "p":
+            if sibling.text_length > 80 and sibling.link_density < 0.25:
+                nodes.append(sibling)
+            elif 0 < sibling.text_length <= 80 and sibling.link_length == 0 and _ends_sentence(sibling):
+                nodes.append(sibling)
+    return nodes
+
+
+def _ends_sentence(node: _Node) -> bool:
+    texts = [c for c in node.children if isinstance(c, str) and c.strip()]
+    return bool(texts) and texts[-1].rstrip().endswith((".", "。", "!", "?"))
+
+
+def _boilerplate(node: _Node, scores: dict[_Node, float]) -> bool:
+    if node.tag not in CONDITIONAL_TAGS:
+        return False
+    weight = _class_weight(node)
+    if weight + scores.get(node, 0) < 0:
+        return True
+    if node.commas >= 10:
+        return False
+    return node.link_density > (0.5 if weight >= 25 else 0.33)
+
+
+def _serialize(nodes: list[_Node], scores: dict[_Node, float], with_unlikely: bool) -> str:
+    """The HTML of ``nodes`` without their unlikely and boilerplate descendants."""
+    out: list[str] = []
+    top = set(nodes)
+    stack: list[Union[_Node, str]] = list(reversed(nodes))
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            # text, or the end tag of an element
+            out.append(item)
+            continue
+        if item.unlikely and not with_unlikely or item not in top and _boilerplate(item, scores):
+            continue
+        out.append(_start_tag(item.tag, [(k, v) for k, v in item.attrs if k in KEPT_ATTRS]))
+        if item.tag in VOID_ELEMENTS:
+            continue
+        stack.append(f"</{item.tag}>")
+        stack.extend(reversed(item.children))
+    return "".join(out)
+
+
+def extract_main_content(html: str, *, parser: Optional[Parser] = None) -> str:
+    """The HTML of the main content of a page, without its navigation, sidebars, footers and banners.
+
+    Paragraphs are scored by their length and commas, their scores are added
+    to their ancestors, weighted by the class and id of the ancestors and
+    reduced by how much of their text is links. The best ancestor is kept
+    with its siblings that score close to it, and its descendants that are
+    mostly links are dropped. Without enough text the elements whose class
+    or id look unlikely are scored as well, and without any paragraph the
+    whole page is kept.
+    """
+    builder = _TreeBuilder()
+    feed_html(html, builder, parser)
+    root = builder.root
+
+    for with_unlikely in (False, True):
+        order = _measure(root, with_unlikely)
+        scores = _score(order, with_unlikely)
+        if not scores:
+            continue
+        top = max(scores, key=scores.get)
+        nodes = _content_nodes(top, scores, with_unlikely)
+        if sum(n.text_length for n in nodes) < MIN_CONTENT_LENGTH and not with_unlikely:
+            continue
+        content = _serialize(nodes, scores, with_unlikely)
+        # the title is often outside of the content, next to the date and the author
+        if not any(n.tag == "h1" for node in nodes for n in _walk(node)):
+            title = next((n for n in order if n.tag == "h1" and n.text_length), None)
+            if title is not None:
+                content = _serialize([title], scores, True) + content
+        return content
+    return html
+
+
+def _walk(node: _Node) -> Iterator[_Node]:
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        stack.extend(c for c in n.children if isinstance(c, _Node))
+
+
+def main_content_to_markdown(html: str) -> str:
+    """Markdown of the main content of a page, see ``extract_main_content``."""
+    return html_to_markdown(extract_main_content(html))
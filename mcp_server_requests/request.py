@@ -1,25 +1,70 @@
-from dataclasses import dataclass
-from typing import Optional, Literal, Union
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Optional, Literal, TypeVar, Union
+import contextlib
+import contextvars
+import functools
+import hashlib
 import json
+import os
+import tempfile
+import threading
+import time
 
 import urllib
-import urllib.error
 import urllib.parse
 import urllib.request
 import http.client
-from urllib.parse import parse_qsl, urlparse, urlencode, urlunparse
+from urllib.parse import parse_qsl, urlparse, urlencode, urlunparse, urlunsplit
 
-from .utils import html_to_markdown, clean_html
+from .cache import CALLER_CONDITIONAL_HEADERS, HTTPCache
+from .convert import ConversionCache, convert_html
+from .delta import DeltaStore, Version
+from .documents import DEFAULT_PAGE_SIZE, Document, DocumentStore, document_handle, page_text
+from .encoding import ACCEPT_ENCODING, DecodeError, get_decoder
+from .jsonpath import JSONPath, JSONPathError
+from .ratelimit import RateLimiter
+from .selector import Selector, SelectorError
+from .singleflight import SingleFlight
+from .retry import DEFAULT_RETRY_POLICY, RetryBudget, RetryPolicy, default_retry_budget
+from .timeout import DEFAULT_TIMEOUTS, Deadline, DeadlineExceeded, Timeouts
+from .timing import LatencyRecorder, Timings, timed_create_connection
+from .profiling import Profiler
+from .pool import ConnectionPool, ConnectionKey, default_pool, find_proxy
 
 
 HTTP_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
 
+# methods whose concurrent identical requests can share one response
+COALESCED_METHODS = ("GET", "HEAD")
+
 VERSION_MAP = {
     10: "HTTP/1.0",
     11: "HTTP/1.1",
     20: "HTTP/2"
 }
 
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# redirects that are cacheable by default, RFC 9110 section 15.4
+PERMANENT_REDIRECT_CODES = (301, 308)
+MAX_REDIRECTIONS = 10
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_USER_AGENT = f"Python-urllib/{urllib.request.__version__}"
+
+# upper bound of blocking requests that may be in flight at the same time
+# for the async_* functions.
+MAX_CONCURRENT_REQUESTS = 64
+
+# limits of one fetch_many call
+MAX_BATCH_URLS = 100
+DEFAULT_BATCH_CONCURRENCY = 16
+DEFAULT_BATCH_PER_HOST = 4
+
+T = TypeVar("T")
+
 
 @dataclass
 class Response:
@@ -29,6 +74,8 @@ class Response:
     reason: str
     headers: list[tuple[str, str]]
     content: str | bytes | bytearray
+    # information added by this service, such as the cache status, formatted as X-MCP-* headers
+    annotations: dict[str, str] = field(default_factory=dict)
 
     @property
     def content_type(self) -> str:
@@ -45,6 +92,10 @@ class McpError(Exception):
         self.reason = reason
 
 
+# reasons of the RequestError raised when a request times out
+TIMEOUT_REASONS = ("connect timeout", "read timeout", "deadline exceeded")
+
+
 class ArgumentError(McpError):
     pass
 
@@ -59,6 +110,29 @@ class ResponseError(McpError):
         self.response = response
 
 
+def is_text_content_type(content_type: str) -> bool:
+    return content_type.startswith("text/") or content_type.startswith("application/json")
+
+
+def check_response(response: Response, *, text_only: bool = False, max_content_length: Optional[int] = None) -> None:
+    """Apply the content policy to a response whose headers have arrived.
+
+    Raises ``ResponseError`` if ``text_only`` is set and the content is not
+    text or JSON, or if the declared ``Content-Length`` is over ``max_content_length``.
+    A 304 response has no content, and often no ``Content-Type``.
+    """
+    content_type = response.content_type
+    if text_only and response.status_code != 304 and not is_text_content_type(content_type):
+        err_message = f'response content type is "{content_type}", cannot be converted to a string'
+        raise ResponseError(response, err_message)
+
+    if max_content_length is not None:
+        for k, v in response.headers:
+            if k.lower() == "content-length" and v.strip().isdigit() and int(v) > max_content_length:
+                err_message = f"response content length is {int(v)} bytes, which exceeds the limit of {max_content_length} bytes"
+                raise ResponseError(response, err_message, "the response is too large")
+
+
 def merge_query_to_url(url: str, query_dict: dict[str, str | int | float]) -> str:
     parsed_url = urlparse(url)
 
@@ -85,15 +159,158 @@ def merge_query_to_url(url: str, query_dict: dict[str, str | int | float]) -> st
     return new_url
 
 
-def http_request(
+def _has_header(headers: dict, name: str) -> bool:
+    name = name.lower()
+    return any(k.lower() == name for k in headers)
+
+
+def _get_header(headers: list[tuple[str, str]], name: str) -> Optional[str]:
+    name = name.lower()
+    for k, v in headers:
+        if k.lower() == name:
+            return v
+    return None
+
+
+def _send_request(
+    pool: ConnectionPool,
     method: str,
     url: str,
-    *,
-    query: Optional[dict] = None,
-    data: Optional[Union[str, bytes, bytearray]] = None,
-    json_: Optional[dict] = None,
-    headers: Optional[dict] = None
-) -> Response:
+    headers: dict,
+    body: Optional[bytes],
+    timeouts: Timeouts,
+    deadline: Deadline,
+    timings: Timings,
+) -> tuple[http.client.HTTPConnection, ConnectionKey, http.client.HTTPResponse]:
+    parsed = urllib.parse.urlsplit(url)
+    scheme = parsed.scheme.lower()
+    if scheme not in ("http", "https"):
+        raise RequestError(f"Failed to send request, unsupported URL scheme: {parsed.scheme}")
+    host = parsed.hostname
+    if not host:
+        raise RequestError(f"Failed to send request, no host given: {url}")
+    try:
+        port = parsed.port or (443 if scheme == "https" else 80)
+    except ValueError as e:
+        raise RequestError(f"Failed to send request, invalid port in URL: {url}") from e
+
+    target = parsed.path or "/"
+    if parsed.query:
+        target += "?" + parsed.query
+
+    headers = dict(headers)
+    proxy = find_proxy(scheme, host)
+    if proxy is not None and scheme == "http":
+        target = urlunsplit((scheme, parsed.netloc, target, "", ""))
+        if proxy.authorization and not _has_header(headers, "Proxy-Authorization"):
+            headers["Proxy-Authorization"] = proxy.authorization
+
+    while True:
+        deadline.check()
+        conn, key, reused = pool.acquire(scheme, host, port, proxy=proxy)
+        try:
+            if conn.sock is None:
+                conn.timeout = deadline.timeout(timeouts.connect)
+                conn._create_connection = timed_create_connection(timings)
+                before = timings.phases.get("dns", 0.0) + timings.phases.get("connect", 0.0)
+                started = time.perf_counter()
+                try:
+                    conn.connect()
+                    if scheme == "https":
+                        # what the connect took beyond the name lookup and the TCP handshake
+                        after = timings.phases.get("dns", 0.0) + timings.phases.get("connect", 0.0)
+                        timings.add("tls", time.perf_counter() - started - (after - before))
+                except TimeoutError as e:
+                    deadline.check()
+                    raise RequestError(f"Timed out connecting to {host}:{port} after {conn.timeout:g}s", "connect timeout") from e
+            # the watchdog of the deadline takes care of the total time,
+            # the socket timeout only limits a single wait for data.
+            conn.sock.settimeout(timeouts.read)
+            deadline.watch(conn)
+            with timings.measure("ttfb"):
+                conn.request(method, target, body=body, headers=headers)
+                response = conn.getresponse()
+            return conn, key, response
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            # the server may have closed an idle keep-alive connection just
+            # as we reused it, in that case try again on a fresh connection.
+            if not reused:
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+
+def _release_connection(
+    pool: ConnectionPool,
+    conn: http.client.HTTPConnection,
+    key: ConnectionKey,
+    response: http.client.HTTPResponse,
+) -> None:
+    if response.will_close or not response.isclosed():
+        conn.close()
+    else:
+        pool.release(conn, key)
+
+
+def _open_response(
+    pool: ConnectionPool,
+    method: str,
+    url: str,
+    headers: dict,
+    body: Optional[bytes],
+    timeouts: Timeouts,
+    deadline: Deadline,
+    timings: Timings,
+    redirects: Optional[list[int]] = None,
+) -> tuple[http.client.HTTPConnection, ConnectionKey, http.client.HTTPResponse, str]:
+    """Send the request and follow redirects the same way urllib does.
+
+    The status of every redirect followed is appended to ``redirects``.
+    """
+    redirections = 0
+    while True:
+        conn, key, response = _send_request(pool, method, url, headers, body, timeouts, deadline, timings)
+
+        location = response.getheader("Location")
+        followable = (response.status in REDIRECT_CODES and method in ("GET", "HEAD")) or \
+            (response.status in (301, 302, 303) and method == "POST")
+        if not location or not followable or redirections >= MAX_REDIRECTIONS:
+            return conn, key, response, url
+
+        new_url = urllib.parse.urljoin(url, location.strip())
+        if urllib.parse.urlsplit(new_url).scheme.lower() not in ("http", "https"):
+            return conn, key, response, url
+
+        try:
+            with timings.measure("download"):
+                response.read()
+            deadline.unwatch()
+        except BaseException:
+            conn.close()
+            raise
+        _release_connection(pool, conn, key, response)
+
+        redirections += 1
+        if redirects is not None:
+            redirects.append(response.status)
+        url = new_url
+        if method != "HEAD":
+            method = "GET"
+        body = None
+        headers = {k: v for k, v in headers.items() if k.lower() not in ("content-length", "content-type")}
+
+
+def _prepare_request(
+    method: str,
+    url: str,
+    query: Optional[dict],
+    data: Optional[Union[str, bytes, bytearray]],
+    json_: Optional[dict],
+    headers: Optional[dict],
+) -> tuple[str, str, dict, Optional[bytes]]:
+    """Check the arguments of a request, return ``(method, url, headers, body)``."""
     if headers is None:
         headers = {}
 
@@ -137,57 +354,464 @@ def http_request(
     if not url.startswith("http://") and not url.startswith("https://"):
         url = "https://" + url
 
+    request_headers = dict(headers)
+    if not _has_header(request_headers, "User-Agent"):
+        request_headers["User-Agent"] = DEFAULT_USER_AGENT
+    if data_bytes is not None and not _has_header(request_headers, "Content-Type"):
+        if json_ is not None:
+            request_headers["Content-Type"] = "application/json"
+        else:
+            request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+    return method, url, request_headers, data_bytes
+
+
+def _request_error(e: Exception, timeouts: Timeouts, deadline: Deadline, message: str) -> RequestError:
+    if isinstance(e, DeadlineExceeded) or deadline.expired:
+        return RequestError(f"Request timed out, the total deadline of {deadline.total:g}s was exceeded", "deadline exceeded")
+    if isinstance(e, TimeoutError) and timeouts.read is not None:
+        return RequestError(f"Request timed out, the server sent no data for {timeouts.read:g}s", "read timeout")
+    return RequestError(f"{message}, {e}")
+
+
+def http_request(
+    method: str,
+    url: str,
+    *,
+    query: Optional[dict] = None,
+    data: Optional[Union[str, bytes, bytearray]] = None,
+    json_: Optional[dict] = None,
+    headers: Optional[dict] = None,
+    pool: Optional[ConnectionPool] = None,
+    cache: Optional[HTTPCache] = None,
+    text_only: bool = False,
+    max_content_length: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    timeouts: Optional[Timeouts] = None,
+    retry: Optional[RetryPolicy] = None,
+    retry_budget: Optional[RetryBudget] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    timings: Optional[Timings] = None,
+    validators: Optional[dict] = None,
+) -> Response:
+    """Send a request and read the response.
+
+    With ``text_only`` or ``max_content_length`` the response is checked by
+    ``check_response`` as soon as its headers arrive, and a rejected body is
+    never downloaded. With ``max_bytes`` at most that many bytes of the body
+    are read, a longer body is cut and marked with a ``Truncated`` annotation.
+
+    Compressed responses are asked for with ``Accept-Encoding`` unless the
+    caller set that header, and are decompressed while they are read.
+
+    ``timeouts`` defaults to ``DEFAULT_TIMEOUTS``, a request that runs out of
+    time raises a ``RequestError`` whose reason is one of ``TIMEOUT_REASONS``.
+
+    Transient failures are retried according to ``retry`` (``DEFAULT_RETRY_POLICY``
+    by default) as long as ``retry_budget`` has tokens left for the host and
+    the total timeout allows it. The retries are reported in a ``Retries``
+    annotation, or in the error message when the request still fails.
+
+    Every attempt waits for its turn with ``rate_limiter``, if given, within
+    the total timeout. The time spent waiting is reported in a
+    ``Rate-Limit-Wait`` annotation.
+
+    The time spent in each phase of the request is added to ``timings``.
+
+    ``validators`` are conditional headers sent when ``cache`` has no stored
+    response to revalidate, a 304 answer to them is returned as it is.
+    """
+    method, url, request_headers, data_bytes = _prepare_request(method, url, query, data, json_, headers)
+    if not _has_header(request_headers, "Accept-Encoding"):
+        request_headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+    if pool is None:
+        pool = default_pool
+
+    send_headers = request_headers
+    if cache is not None:
+        cache_lookup, cached = cache.lookup(method, url, request_headers, data_bytes)
+        if cached is not None:
+            check_response(cached, text_only=text_only, max_content_length=max_content_length)
+            return _truncate_response(cached, max_bytes)
+        if cache_lookup.entry is not None:
+            send_headers = {**request_headers, **cache_lookup.validators}
+    if validators and send_headers is request_headers:
+        send_headers = {**request_headers, **validators}
+
+    if timeouts is None:
+        timeouts = DEFAULT_TIMEOUTS
+    deadline = Deadline(timeouts.total)
+    if timings is None:
+        timings = Timings()
+
+    if retry is None:
+        retry = DEFAULT_RETRY_POLICY
+    if retry_budget is None:
+        retry_budget = default_retry_budget
+    host = urllib.parse.urlsplit(url).hostname or ""
+    retry_budget.deposit(host)
+
+    retries = 0
+    waited = 0.0
+    limited = 0.0
+    redirects: list[int] = []
     try:
-        request = urllib.request.Request(url, method=method, headers=headers, data=data_bytes)
-        response: http.client.HTTPResponse = urllib.request.urlopen(request)
-
-        version = VERSION_MAP.get(response.version, "HTTP/1.1")
-        status_code = response.status
-        reason = response.reason
-        response_headers = response.getheaders()
-        content = response.read()
-
-        result = Response(url, version, status_code, reason, response_headers, content)
-    except urllib.error.HTTPError as e:
-        if e.status is None:
-            raise RequestError(f"Failed to send request, unknown error") from e
-
-        version = "HTTP/1.1"
-        status_code = e.status
-        reason = e.reason
-        response_headers = e.headers.items()
-        content = e.read()
-
-        result = Response(url, version, status_code, reason, response_headers, content)
-    except urllib.error.URLError as e:
-        raise RequestError(f"Failed to send request, {e.reason}") from e
-    except Exception as e:
-        raise RequestError(f"Failed to send request, {e}") from e
+        while True:
+            if rate_limiter is not None:
+                with timings.measure("queue"):
+                    limited += _wait_turn(rate_limiter, host, timeouts, deadline)
+            started = time.monotonic()
+            status = None
+            redirects.clear()
+            try:
+                result = _fetch(pool, method, url, send_headers, data_bytes, timeouts, deadline, timings,
+                                text_only=text_only, max_content_length=max_content_length, max_bytes=max_bytes,
+                                redirects=redirects)
+                status = result.status_code
+            except RequestError as e:
+                if not _is_transient(e):
+                    raise
+                result, error = None, e
+                delay = retry.delay(method, retries)
+            else:
+                error = None
+                delay = retry.delay(method, retries, result.status_code, _get_header(result.headers, "Retry-After"))
+            finally:
+                if rate_limiter is not None:
+                    rate_limiter.release(host, status, time.monotonic() - started)
 
+            remaining = deadline.remaining()
+            if delay is None or (remaining is not None and delay >= remaining) or not retry_budget.withdraw(host):
+                break
+            time.sleep(delay)
+            retries += 1
+            waited += delay
+    finally:
+        deadline.finish()
+
+    if error is not None:
+        if retries:
+            raise RequestError(f"{error.message} (after {retries} retries, {waited:.2f}s of backoff)", error.reason) from error
+        raise error
+    if retries:
+        result.annotations["Retries"] = f"{retries}, {waited:.2f}s of backoff"
+    if limited >= 0.01:
+        result.annotations["Rate-Limit-Wait"] = f"{limited:.2f}s"
+
+    if cache is not None:
+        if all(status in PERMANENT_REDIRECT_CODES for status in redirects):
+            # a permanent redirect is cacheable, the response is stored under
+            # the requested URL, where the next lookup looks for it. The
+            # validators of a stale entry went along the redirects too.
+            result = cache.update(cache_lookup, url, request_headers, result)
+        else:
+            # a temporary redirect is not followed from the cache, the final
+            # response is only stored under the URL it came from, which has
+            # nothing to do with the entry looked up for the requested URL.
+            result = cache.update(replace(cache_lookup, entry=None), result.url, request_headers, result)
     return result
 
 
-def format_response_result(
+def _wait_turn(rate_limiter: RateLimiter, host: str, timeouts: Timeouts, deadline: Deadline) -> float:
+    try:
+        return rate_limiter.acquire(host, deadline.remaining())
+    except DeadlineExceeded as e:
+        raise _request_error(e, timeouts, deadline, "Failed to send request") from e
+
+
+def _is_transient(error: RequestError) -> bool:
+    # the connection failed or broke off, the same request may well succeed
+    return error.reason == "connect timeout" or isinstance(error.__cause__, (ConnectionError, http.client.IncompleteRead))
+
+
+def _fetch(
+    pool: ConnectionPool,
+    method: str,
+    url: str,
+    headers: dict,
+    body: Optional[bytes],
+    timeouts: Timeouts,
+    deadline: Deadline,
+    timings: Timings,
+    *,
+    text_only: bool,
+    max_content_length: Optional[int],
+    max_bytes: Optional[int],
+    redirects: Optional[list[int]] = None,
+) -> Response:
+    """Send the request once, following redirects, and read the response."""
+    try:
+        conn, key, response, url = _open_response(pool, method, url, headers, body, timeouts, deadline, timings, redirects)
+        try:
+            version = VERSION_MAP.get(response.version, "HTTP/1.1")
+            result = Response(url, version, response.status, response.reason, response.getheaders(), b"")
+            # a rejected response is dropped together with its connection, without reading the body
+            check_response(result, text_only=text_only, max_content_length=max_content_length)
+            reader = _BodyReader(response, max_bytes=max_bytes, decode=True, timeouts=timeouts, deadline=deadline)
+            with timings.measure("download"):
+                result.content = reader.read()
+            reader.annotate(result)
+            deadline.unwatch()
+        except BaseException:
+            conn.close()
+            raise
+        _release_connection(pool, conn, key, response)
+    except McpError:
+        # keep the cause, it tells whether the error is worth a retry
+        raise
+    except Exception as e:
+        raise _request_error(e, timeouts, deadline, "Failed to send request") from e
+    return result
+
+
+class _BodyReader:
+    """Read a response body in chunks, stopping once ``max_bytes`` have been read.
+
+    With ``decode`` a gzip, deflate or brotli encoded body is decompressed on
+    the fly, ``max_bytes`` then counts the decoded bytes.
+    """
+
+    def __init__(
+        self,
+        response: http.client.HTTPResponse,
+        *,
+        max_bytes: Optional[int] = None,
+        chunk_size: int = READ_CHUNK_SIZE,
+        decode: bool = False,
+        timeouts: Timeouts = DEFAULT_TIMEOUTS,
+        deadline: Optional[Deadline] = None,
+    ):
+        self.response = response
+        self.timeouts = timeouts
+        self.deadline = deadline if deadline is not None else Deadline(None)
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.read_bytes = 0
+        self.wire_bytes = 0
+        self.truncated = False
+        self.encoding = response.getheader("Content-Encoding") if decode else None
+        self.decoder = get_decoder(self.encoding) if decode else None
+        length = response.getheader("Content-Length")
+        # the declared length is that of the encoded body
+        self.total = int(length) if length and length.strip().isdigit() and self.decoder is None else None
+
+    def _read_raw(self, size: int) -> bytes:
+        data = self.response.read(size)
+        self.wire_bytes += len(data)
+        return data
+
+    def _read_decoded(self, size: int) -> bytes:
+        while True:
+            data = self.decoder.read(size)
+            if data:
+                return data
+            raw = self._read_raw(self.chunk_size)
+            if not raw:
+                return self.decoder.flush()
+            self.decoder.feed(raw)
+
+    def _more_data(self) -> bool:
+        if self.decoder is not None:
+            return bool(self._read_decoded(1))
+        if self.response.length is not None:
+            return self.response.length > 0
+        return bool(self.response.read(1))
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            while True:
+                size = self.chunk_size
+                if self.max_bytes is not None:
+                    size = min(size, self.max_bytes - self.read_bytes)
+                    if size <= 0:
+                        self.truncated = self._more_data()
+                        return
+                chunk = self._read_decoded(size) if self.decoder is not None else self._read_raw(size)
+                if not chunk:
+                    # the watchdog shutting the socket down looks like the end of the body
+                    self.deadline.check()
+                    return
+                self.read_bytes += len(chunk)
+                yield chunk
+        except (OSError, http.client.HTTPException) as e:
+            raise _request_error(e, self.timeouts, self.deadline, "Failed to read response") from e
+        except DecodeError as e:
+            raise RequestError(f"Failed to decode response, content encoding is {self.encoding}, {e}") from e
+
+    def read(self) -> bytes:
+        return b"".join(self)
+
+    def annotate(self, response: Response) -> None:
+        if self.decoder is not None:
+            response.annotations["Content-Decoded"] = f"{self.encoding}, {self.wire_bytes} bytes transferred"
+            # the headers describe the encoded body, which the caller never sees
+            response.headers = [(k, v) for k, v in response.headers if k.lower() not in ("content-encoding", "content-length")]
+            if not self.truncated:
+                response.headers.append(("Content-Length", str(self.read_bytes)))
+        if self.truncated:
+            total = f"{self.total} bytes" if self.total is not None else "unknown"
+            response.annotations["Truncated"] = f"read {self.read_bytes} bytes of {total}"
+
+
+def _truncate_response(response: Response, max_bytes: Optional[int]) -> Response:
+    if max_bytes is None or len(response.content) <= max_bytes:
+        return response
+    annotations = {**response.annotations, "Truncated": f"read {max_bytes} bytes of {len(response.content)} bytes"}
+    return replace(response, content=response.content[:max_bytes], annotations=annotations)
+
+
+def _atomic_write(file_path: str, chunks: Iterable[bytes]) -> int:
+    """Write ``chunks`` to a temporary file next to ``file_path``, then rename it into place."""
+    tmp_path = None
+    written = 0
+    try:
+        directory = os.path.dirname(file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(tmp_path, file_path)
+    except BaseException as e:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        if isinstance(e, OSError):
+            raise McpError(f"Failed to write file {file_path}, {e}") from e
+        raise
+    return written
+
+
+def http_download(
+    method: str,
+    url: str,
+    file_path: str,
+    *,
+    query: Optional[dict] = None,
+    headers: Optional[dict] = None,
+    pool: Optional[ConnectionPool] = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    max_bytes: Optional[int] = None,
+    timeouts: Optional[Timeouts] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    timings: Optional[Timings] = None,
+) -> tuple[Response, Optional[int]]:
+    """Stream the response body of a successful (2xx) request into ``file_path``.
+
+    The body is read in ``chunk_size`` pieces and written as is, whatever its
+    content type, to a temporary file that replaces ``file_path`` once the
+    download is complete. Returns the response, whose content is empty, and
+    the number of bytes written. For other status codes nothing is written,
+    the body is kept in the response and the number of bytes is ``None``.
+    At most ``max_bytes`` bytes are read, ``timeouts``, ``rate_limiter`` and ``timings`` apply, see ``http_request``.
+    """
+    method, url, request_headers, _ = _prepare_request(method, url, query, None, None, headers)
+
+    if pool is None:
+        pool = default_pool
+
+    if timeouts is None:
+        timeouts = DEFAULT_TIMEOUTS
+    deadline = Deadline(timeouts.total)
+    if timings is None:
+        timings = Timings()
+    host = urllib.parse.urlsplit(url).hostname or ""
+
+    limited = 0.0
+    status = None
+    started = None
+    try:
+        if rate_limiter is not None:
+            with timings.measure("queue"):
+                limited = _wait_turn(rate_limiter, host, timeouts, deadline)
+        started = time.monotonic()
+        conn, key, response, url = _open_response(pool, method, url, request_headers, None, timeouts, deadline, timings)
+        try:
+            version = VERSION_MAP.get(response.version, "HTTP/1.1")
+            result = Response(url, version, response.status, response.reason, response.getheaders(), b"")
+            reader = _BodyReader(response, max_bytes=max_bytes, chunk_size=chunk_size, timeouts=timeouts, deadline=deadline)
+            with timings.measure("download"):
+                if 200 <= response.status < 300:
+                    written = _atomic_write(file_path, reader)
+                else:
+                    result.content = reader.read()
+                    written = None
+            reader.annotate(result)
+            deadline.unwatch()
+        except BaseException:
+            conn.close()
+            raise
+        _release_connection(pool, conn, key, response)
+        status = result.status_code
+    except McpError as e:
+        raise e from e
+    except Exception as e:
+        raise _request_error(e, timeouts, deadline, "Failed to send request") from e
+    finally:
+        deadline.finish()
+        if rate_limiter is not None and started is not None:
+            rate_limiter.release(host, status, time.monotonic() - started)
+
+    if limited >= 0.01:
+        result.annotations["Rate-Limit-Wait"] = f"{limited:.2f}s"
+
+    return result, written
+
+
+def _decode_utf8(content: bytes | bytearray, truncated: bool) -> str:
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # a truncated body may end in the middle of a character
+        if truncated and e.reason == "unexpected end of data" and e.start >= len(content) - 3:
+            return content[:e.start].decode('utf-8')
+        raise
+
+
+def truncate_text(content: str, max_bytes: Optional[int]) -> str:
+    """Cut ``content`` to at most ``max_bytes`` UTF-8 bytes and mark it as truncated."""
+    if max_bytes is None or len(content) * 4 <= max_bytes:
+        return content
+    encoded = content.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return content
+    content = encoded[:max_bytes].decode('utf-8', errors='ignore')
+    return content + f"\r\n\r\n[truncated: the content is {len(encoded)} bytes, only the first {max_bytes} bytes are shown]"
+
+
+def response_text(
     response: Response,
     *,
-    format_headers: bool | None = None,
-    return_content: Literal["raw", "basic_clean", "strict_clean", "markdown"] = "raw",
+    return_content: Literal["raw", "basic_clean", "strict_clean", "markdown", "main"] = "raw",
+    conversion_cache: Optional[ConversionCache] = None,
+    selector: Optional[Selector] = None,
+    json_path: Optional[JSONPath] = None,
 ) -> str:
-    """将HTTP响应格式化为字符串"""
-    http_version = response.version
-    status = response.status_code
-    reason = response.reason
-    headers = response.headers
+    """Decode the content of a text or JSON response, and convert it if it is HTML.
+
+    With ``selector`` only the matching part of an HTML page is converted,
+    other content is rejected. With ``json_path`` the content of a successful
+    JSON response is replaced by the JSON array of the values it selects,
+    other successful responses are rejected.
+    """
     content = response.content
     content_type = response.content_type
 
     if not isinstance(content_type, str):
         content_type = 'application/octet-stream'
 
-    if content_type.startswith("text/") or content_type.startswith("application/json"):
+    digest = None
+    if conversion_cache is not None and isinstance(content, (bytes, bytearray)) and content_type.startswith("text/html"):
+        digest = hashlib.sha256(content).digest()
+
+    if is_text_content_type(content_type):
         try:
             if isinstance(content, (bytes, bytearray)):
-                content = content.decode('utf-8')
+                content = _decode_utf8(content, "Truncated" in response.annotations)
             else:
                 content = str(content)
         except UnicodeDecodeError as e:
@@ -200,25 +824,116 @@ def format_response_result(
         err_message = f'response content type is "{content_type}", cannot be converted to a string'
         raise ResponseError(response, err_message)
 
+    # an error response is returned as it is, its message is rarely where the path points
+    if json_path is not None and 200 <= response.status_code < 300:
+        if not content_type.startswith("application/json"):
+            err_message = f'response content type is "{content_type}", a JSON path only applies to JSON'
+            raise ResponseError(response, err_message, "nothing selected")
+        try:
+            # the values before the cut of a truncated body are still returned
+            values = json_path.select(content, partial="Truncated" in response.annotations)
+        except json.JSONDecodeError as e:
+            raise ResponseError(response, f"response content is not valid JSON: {e}", "invalid JSON") from e
+        return json.dumps(values, ensure_ascii=False)
+
     if content_type.startswith("text/html"):
-        if return_content == "raw":
-            pass
-        elif return_content == "basic_clean":
-            content = clean_html(content, allowed_attrs=True)
-        elif return_content == "strict_clean":
-            content = clean_html(content, allowed_attrs=("id", "src", "href"))
-        elif return_content == "markdown":
-            content = html_to_markdown(content)
-
-    strs = []
-
-    strs.append(f"{http_version} {status} {reason}\r\n")
+        try:
+            content = convert_html(content, return_content, cache=conversion_cache, digest=digest, selector=selector)
+        except SelectorError as e:
+            raise ResponseError(response, str(e), "nothing selected") from e
+    elif selector is not None:
+        raise ResponseError(response, f'response content type is "{content_type}", a selector only applies to HTML', "nothing selected")
+
+    return content
+
+
+def format_response_result(
+    response: Response,
+    *,
+    format_headers: bool | None = None,
+    return_content: Literal["raw", "basic_clean", "strict_clean", "markdown", "main"] = "raw",
+    conversion_cache: Optional[ConversionCache] = None,
+    max_bytes: Optional[int] = None,
+    timings: Optional[Timings] = None,
+    report_timing: bool = False,
+    selector: Optional[Selector] = None,
+    json_path: Optional[JSONPath] = None,
+) -> str:
+    """将HTTP响应格式化为字符串，max_bytes 限制转换后内容的字节数
+
+    转换耗时记入 timings，report_timing 为真时各阶段耗时以 X-MCP-Timing 行附加到结果中，
+    指定 selector 时只转换 HTML 中与之匹配的部分，指定 json_path 时只返回 JSON 中与之匹配的值
+    """
+    if timings is None:
+        timings = Timings()
+    with timings.measure("convert"):
+        content = _response_content(response, return_content, conversion_cache, max_bytes, selector, json_path)
+    return _format_response(response, content, format_headers, timings, report_timing)
+
+
+def _format_response(response: Response, content: str, format_headers: bool | None, timings: Timings, report_timing: bool) -> str:
+    header_lines = []
     if format_headers:
-        response_header_str = "\r\n".join(f"{k}: {v}" for k, v in headers)
-        strs.append(response_header_str)
+        header_lines.extend(f"{k}: {v}" for k, v in response.headers)
+    header_lines.extend(f"X-MCP-{k}: {v}" for k, v in response.annotations.items())
+    if report_timing:
+        timings.finish()
+        header_lines.append(f"X-MCP-Timing: {timings.format()}")
+
+    return _format_result(f"{response.version} {response.status_code} {response.reason}", header_lines, content)
+
+
+def format_document_page(
+    document: Document,
+    offset: int,
+    limit: int,
+    *,
+    timings: Optional[Timings] = None,
+    report_timing: bool = False,
+) -> str:
+    """将文档从 offset 开始、最多 limit 个字符的一页格式化为字符串
+
+    结果中带有文档的句柄、这一页的字符范围，以及下一页的 offset（如果还有下一页），
+    offset 超出文档末尾时返回参数错误
+    """
+    if offset > len(document.text):
+        return format_error_result(ArgumentError(
+            f"offset {offset} is past the end of the document, which has {len(document.text)} characters"))
+    content, end = page_text(document.text, offset, limit)
+    header_lines = []
+    if document.handle is not None:
+        header_lines.append(f"X-MCP-Document: {document.handle}")
+    header_lines.append(f"X-MCP-Range: {offset}-{end}/{len(document.text)}")
+    if end < len(document.text):
+        header_lines.append(f"X-MCP-Next-Offset: {end}")
+    if report_timing and timings is not None:
+        timings.finish()
+        header_lines.append(f"X-MCP-Timing: {timings.format()}")
+    return _format_result(document.status_line, header_lines, content)
+
+
+def _response_content(
+    response: Response,
+    return_content: Literal["raw", "basic_clean", "strict_clean", "markdown", "main"],
+    conversion_cache: Optional[ConversionCache],
+    max_bytes: Optional[int],
+    selector: Optional[Selector] = None,
+    json_path: Optional[JSONPath] = None,
+) -> str:
+    content = response_text(response, return_content=return_content, conversion_cache=conversion_cache, selector=selector,
+                            json_path=json_path)
+    content = truncate_text(content, max_bytes)
+    if "Truncated" in response.annotations:
+        content += f"\r\n\r\n[truncated: the response body was cut, {response.annotations['Truncated']}]"
+    return content
+
+
+def _format_result(status_line: str, header_lines: list[str], content: str) -> str:
+    strs = [f"{status_line}\r\n"]
+    if header_lines:
+        strs.append("\r\n".join(header_lines))
     strs.append("\r\n\r\n")
     strs.append(content + "\r\n")
-
     return "\r\n".join(strs)
 
 
@@ -228,6 +943,11 @@ def format_error_result(error: Exception):
             "Content-Type: text/plain\r\n\r\n" \
             f"MCP service found an error while checking parameters:\r\n" \
             f"{error.message}\r\n"
+    elif isinstance(error, RequestError) and error.reason in TIMEOUT_REASONS:
+        return f"HTTP/1.1 504 MCP Service Timeout, {error.reason}\r\n" \
+            "Content-Type: text/plain\r\n\r\n" \
+            "The request sent by the MCP service timed out, with the following error message:\r\n" \
+            f"{error.message}"
     elif isinstance(error, RequestError):
         return "HTTP/1.1 500 MCP Service Internal Error\r\n" \
             "Content-Type: text/plain\r\n\r\n" \
@@ -241,6 +961,11 @@ def format_error_result(error: Exception):
             "The request sent has successfully received a response, but an error occurred during the processing of the response." \
             " The error message is as follows:\r\n" \
             f"{error.message}"
+    elif isinstance(error, McpError):
+        return "HTTP/1.1 500 MCP Service Internal Error\r\n" \
+            "Content-Type: text/plain\r\n\r\n" \
+            "An error occurred in the MCP service, with the following error message:\r\n" \
+            f"{error.message}"
     else:
         return "HTTP/1.1 500 MCP Service Internal Error\r\n" \
             "Content-Type: text/plain\r\n\r\n" \
@@ -248,6 +973,29 @@ def format_error_result(error: Exception):
 
 
 
+def _merge_user_agent(
+    headers: Optional[dict],
+    user_agent: Optional[str | Callable[[], Optional[str]]],
+    force_user_agnet: Optional[bool],
+) -> dict:
+    # a callable user agent is called for every request, to rotate user agents
+    if callable(user_agent):
+        user_agent = user_agent()
+    hs = {}
+
+    if headers:
+        hs.update(headers)
+
+    if force_user_agnet:
+        if user_agent:
+            hs["User-Agent"] = user_agent
+    else:
+        if "User-Agent" not in hs and user_agent:
+            hs["User-Agent"] = user_agent
+
+    return hs
+
+
 def mcp_http_request(
     method: str,
     url: str,
@@ -256,32 +1004,380 @@ def mcp_http_request(
     data: Optional[str | bytes | bytearray] = None,
     json: Optional[dict] = None,
     headers: Optional[dict] = None,
-    user_agent: Optional[str] = None,
+    user_agent: Optional[str | Callable[[], Optional[str]]] = None,
     force_user_agnet: Optional[bool] = None,
     format_headers: bool = True,
-    return_content: Literal['raw', 'basic_clean', 'strict_clean', 'markdown'] = "raw",
+    return_content: Literal['raw', 'basic_clean', 'strict_clean', 'markdown', 'main'] = "raw",
+    pool: Optional[ConnectionPool] = None,
+    cache: Optional[HTTPCache] = None,
+    conversion_cache: Optional[ConversionCache] = None,
+    max_content_length: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    timeouts: Optional[Timeouts] = None,
+    retry: Optional[RetryPolicy] = None,
+    retry_budget: Optional[RetryBudget] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    single_flight: Optional[SingleFlight] = None,
+    latency: Optional[LatencyRecorder] = None,
+    report_timing: bool = False,
+    profiler: Optional[Profiler] = None,
+    documents: Optional[DocumentStore] = None,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    selector: Optional[Selector] = None,
+    json_path: Optional[JSONPath] = None,
+    deltas: Optional[DeltaStore] = None,
+    delta: bool = False,
 ) -> str:
-    hs = {}
+    """Send a request and format its response, see ``http_request`` and ``format_response_result``.
 
-    if headers:
-        hs.update(headers)
+    With ``single_flight``, concurrent GET requests without a body that would
+    produce the same result share one request and one conversion. The phase
+    timings of the request are recorded in ``latency``, and with
+    ``report_timing`` added to the result. ``profiler`` profiles the calls it
+    samples, a coalesced call is profiled once.
 
-    if force_user_agnet:
-        if user_agent:
-            hs["User-Agent"] = user_agent
-    else:
-        if "User-Agent" not in hs and user_agent:
-            hs["User-Agent"] = user_agent
+    With ``offset`` or ``limit`` only that page of the converted content is
+    returned, see ``format_document_page``, without the response headers.
+    The content of a successful GET request is then kept in ``documents``,
+    and the following pages are read from there without sending the request
+    again.
+
+    With ``selector`` only the matching part of an HTML page is converted and
+    returned, and with ``json_path`` only the values of a JSON response it
+    selects. An invalid selector or path is rejected before the request is
+    sent.
 
+    With ``delta`` the converted content of a successful GET request is
+    kept in ``deltas``, and the next fetch of the URL returns only what
+    changed since, see ``DeltaStore.update``, with an ``X-MCP-Delta`` line
+    telling how. When the HTTP ``cache`` has no stored response to
+    revalidate, the validators of the kept version are sent instead, and a
+    304 answer returns that nothing changed without downloading or
+    converting the page.
+    """
+    hs = _merge_user_agent(headers, user_agent, force_user_agnet)
     try:
-        response = http_request(
-            method, url,
-            query=query,
-            headers=hs,
-            data=data,
-            json_=json
-        )
-
-        return format_response_result(response, format_headers=format_headers, return_content=return_content)
-    except Exception as e:
+        _check_max_bytes(max_bytes)
+        if selector is not None:
+            selector.check()
+        if json_path is not None:
+            json_path.check()
+    except ArgumentError as e:
         return format_error_result(e)
+    except (SelectorError, JSONPathError) as e:
+        return format_error_result(ArgumentError(str(e)))
+
+    paged = offset is not None or limit is not None
+    handle = None
+    if paged:
+        try:
+            offset, limit = _page_arguments(offset, limit)
+            if delta:
+                raise ArgumentError("delta cannot be combined with offset or limit")
+        except ArgumentError as e:
+            return format_error_result(e)
+        if documents is not None and method.upper() == "GET" and data is None and json is None:
+            handle = document_handle(merge_query_to_url(url, query) if query else url, return_content, max_bytes, selector, json_path)
+            document = documents.get(handle)
+            if document is not None:
+                return format_document_page(document, offset, limit)
+
+    delta_key = None
+    if delta and deltas is not None and method.upper() == "GET" and data is None and json is None:
+        delta_key = document_handle(merge_query_to_url(url, query) if query else url, return_content, max_bytes, selector, json_path)
+
+    def send() -> str:
+        timings = Timings()
+        with _profile(profiler, method, url, timings):
+            try:
+                previous = deltas.get(delta_key) if delta_key is not None else None
+                conditional = previous is not None and \
+                    not any(_has_header(hs, name) for name in CALLER_CONDITIONAL_HEADERS)
+                # only text can be formatted, anything else is rejected before its body is downloaded
+                response = http_request(
+                    method, url,
+                    query=query,
+                    headers=hs,
+                    data=data,
+                    json_=json,
+                    pool=pool,
+                    cache=cache,
+                    text_only=True,
+                    max_content_length=max_content_length,
+                    max_bytes=max_bytes,
+                    timeouts=timeouts,
+                    retry=retry,
+                    retry_budget=retry_budget,
+                    rate_limiter=rate_limiter,
+                    timings=timings,
+                    validators=previous.validators() if conditional else None,
+                )
+
+                if paged:
+                    with timings.measure("convert"):
+                        content = _response_content(response, return_content, conversion_cache, max_bytes, selector, json_path)
+                    status_line = f"{response.version} {response.status_code} {response.reason}"
+                    # an error page is not kept, the next page fetches the url again
+                    stored = handle is not None and 200 <= response.status_code < 300
+                    document = Document(handle if stored else None, url, status_line, content)
+                    if stored:
+                        documents.put(document)
+                    return format_document_page(document, offset, limit, timings=timings, report_timing=report_timing)
+
+                if delta_key is not None and (200 <= response.status_code < 300 or conditional and response.status_code == 304):
+                    etag, last_modified = _get_header(response.headers, "ETag"), _get_header(response.headers, "Last-Modified")
+                    if response.status_code == 304:
+                        content, change = deltas.not_modified(delta_key, etag, last_modified)
+                    else:
+                        with timings.measure("convert"):
+                            content = _response_content(response, return_content, conversion_cache, max_bytes, selector, json_path)
+                            content, change = deltas.update(delta_key, Version(content, etag, last_modified))
+                    response.annotations["Delta"] = change
+                    return _format_response(response, content, format_headers, timings, report_timing)
+
+                return format_response_result(
+                    response,
+                    format_headers=format_headers,
+                    return_content=return_content,
+                    conversion_cache=conversion_cache,
+                    max_bytes=max_bytes,
+                    timings=timings,
+                    report_timing=report_timing,
+                    selector=selector,
+                    json_path=json_path,
+                )
+            except Exception as e:
+                return format_error_result(e)
+            finally:
+                if latency is not None:
+                    latency.record(urllib.parse.urlsplit(url).hostname or "", timings)
+
+    if single_flight is not None and method.upper() in COALESCED_METHODS and data is None and json is None:
+        key = ("request", method.upper(), url, _freeze(query), _freeze(headers, lower=True),
+               _user_agent_key(user_agent, force_user_agnet), format_headers, return_content, max_content_length, max_bytes, timeouts, offset, limit, selector, json_path,
+               delta_key)
+        return single_flight.do(key, send)
+    return send()
+
+
+def mcp_read_document(
+    handle: str,
+    *,
+    documents: Optional[DocumentStore] = None,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> str:
+    """Format a page of a document kept by a paged ``mcp_http_request``, without sending any request."""
+    try:
+        offset, limit = _page_arguments(offset, limit)
+        document = documents.get(handle) if documents is not None else None
+        if document is None:
+            raise ArgumentError(f"unknown or expired document {handle!r}, fetch its url again with an offset or a limit")
+        return format_document_page(document, offset, limit)
+    except ArgumentError as e:
+        return format_error_result(e)
+
+
+def _check_max_bytes(max_bytes: Optional[int]) -> None:
+    if max_bytes is not None and max_bytes <= 0:
+        raise ArgumentError(f"max_bytes must be greater than 0, got {max_bytes}")
+
+
+def _page_arguments(offset: Optional[int], limit: Optional[int]) -> tuple[int, int]:
+    offset = 0 if offset is None else offset
+    limit = DEFAULT_PAGE_SIZE if limit is None else limit
+    if offset < 0:
+        raise ArgumentError(f"offset must be greater than or equal to 0, got {offset}")
+    if limit <= 0:
+        raise ArgumentError(f"limit must be greater than 0, got {limit}")
+    return offset, limit
+
+
+def _profile(profiler: Optional[Profiler], method: str, url: str, timings: Timings) -> ContextManager[None]:
+    return profiler.profile(method, url, timings) if profiler is not None else contextlib.nullcontext()
+
+
+def _freeze(d: Optional[dict], lower: bool = False) -> Optional[tuple]:
+    """A hashable form of ``d`` for the key of a coalesced request."""
+    if d is None:
+        return None
+    return tuple(sorted((k.lower() if lower else k, str(v)) for k, v in d.items()))
+
+
+def _user_agent_key(user_agent: Optional[str | Callable[[], Optional[str]]], force_user_agnet: Optional[bool]) -> tuple:
+    """The user agent part of the key of a coalesced request.
+
+    A rotated user agent is left out, it differs for every request on purpose.
+    """
+    return (None if callable(user_agent) else user_agent, bool(force_user_agnet))
+
+
+def mcp_http_download(
+    url: str,
+    file_path: str,
+    *,
+    headers: Optional[dict] = None,
+    user_agent: Optional[str | Callable[[], Optional[str]]] = None,
+    force_user_agnet: Optional[bool] = None,
+    return_content: Literal['raw', 'basic_clean', 'strict_clean', 'markdown', 'main'] = "raw",
+    pool: Optional[ConnectionPool] = None,
+    cache: Optional[HTTPCache] = None,
+    conversion_cache: Optional[ConversionCache] = None,
+    max_content_length: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    timeouts: Optional[Timeouts] = None,
+    retry: Optional[RetryPolicy] = None,
+    retry_budget: Optional[RetryBudget] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    single_flight: Optional[SingleFlight] = None,
+    latency: Optional[LatencyRecorder] = None,
+    report_timing: bool = False,
+    profiler: Optional[Profiler] = None,
+    selector: Optional[Selector] = None,
+) -> str:
+    """Save the content of ``url`` to ``file_path``.
+
+    With ``return_content="raw"`` the body is streamed to disk byte for byte,
+    for any content type. The other modes, and ``selector`` which keeps only
+    the matching part of an HTML page, convert the text in memory first.
+    ``max_bytes`` limits both the downloaded body and the converted text.
+    Only the converted modes are retried and coalesced with ``single_flight``,
+    a raw download is sent once. ``latency``, ``report_timing`` and
+    ``profiler`` are the same as for ``mcp_http_request``.
+    """
+    hs = _merge_user_agent(headers, user_agent, force_user_agnet)
+
+    timings = Timings()
+    with _profile(profiler, "GET", url, timings):
+        try:
+            _check_max_bytes(max_bytes)
+            if selector is not None:
+                try:
+                    selector.check()
+                except SelectorError as e:
+                    raise ArgumentError(str(e)) from e
+            if return_content == "raw" and selector is None:
+                response, written = http_download("GET", url, file_path, headers=hs, pool=pool, max_bytes=max_bytes,
+                                                  timeouts=timeouts, rate_limiter=rate_limiter, timings=timings)
+            else:
+                kwargs = dict(headers=hs, pool=pool, cache=cache, text_only=True,
+                              max_content_length=max_content_length, max_bytes=max_bytes, timeouts=timeouts,
+                              retry=retry, retry_budget=retry_budget, rate_limiter=rate_limiter, timings=timings)
+                if single_flight is not None:
+                    key = ("download", "GET", url, _freeze(headers, lower=True), _user_agent_key(user_agent, force_user_agnet),
+                           max_content_length, max_bytes, timeouts)
+                    response = single_flight.do(key, http_request, "GET", url, **kwargs)
+                else:
+                    response = http_request("GET", url, **kwargs)
+                written = None
+                if 200 <= response.status_code < 300:
+                    with timings.measure("convert"):
+                        content = response_text(response, return_content=return_content, conversion_cache=conversion_cache,
+                                                selector=selector)
+                        content = truncate_text(content, max_bytes)
+                    written = _atomic_write(file_path, [content.encode("utf-8")])
+
+            if written is None:
+                err_message = f"the server responded with {response.status_code} {response.reason}, nothing was written to {file_path}"
+                raise ResponseError(response, err_message, "file not written")
+
+            message = f"File written successfully to: {file_path} ({written} bytes, {response.content_type})"
+            if "Truncated" in response.annotations:
+                message += f", truncated: {response.annotations['Truncated']}"
+            if report_timing:
+                timings.finish()
+                message += f", timing: {timings.format()}"
+            return message
+        except Exception as e:
+            return format_error_result(e)
+        finally:
+            if latency is not None:
+                latency.record(urllib.parse.urlsplit(url).hostname or "", timings)
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="mcp-server-requests")
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run ``func`` on the request worker threads and await its result."""
+    # asyncio is imported by the async functions only, the CLI does not need it
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+async def async_http_request(method: str, url: str, **kwargs: Any) -> Response:
+    """``http_request`` for coroutines, accepts the same arguments.
+
+    The request runs on a worker thread, so many requests can be in flight
+    on one event loop without a slow upstream blocking the others.
+    """
+    return await run_blocking(http_request, method, url, **kwargs)
+
+
+async def async_mcp_http_request(method: str, url: str, **kwargs: Any) -> str:
+    """``mcp_http_request`` for coroutines, accepts the same arguments.
+
+    Both the request and the conversion of the response run on a worker thread.
+    """
+    return await run_blocking(mcp_http_request, method, url, **kwargs)
+
+
+async def async_mcp_fetch_many(
+    urls: list[str],
+    *,
+    max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    max_per_host: int = DEFAULT_BATCH_PER_HOST,
+    **kwargs: Any,
+) -> list[str]:
+    """GET every url with ``mcp_http_request`` concurrently, other arguments are passed to it.
+
+    At most ``max_concurrency`` requests are in flight, and at most
+    ``max_per_host`` of them to the same host. The results are in the order
+    of ``urls``, a failed url gets its error formatted in its place.
+    """
+    if not urls:
+        raise ArgumentError("urls must not be empty")
+    if len(urls) > MAX_BATCH_URLS:
+        raise ArgumentError(f"at most {MAX_BATCH_URLS} urls can be fetched at once, got {len(urls)}")
+    if max_concurrency < 1 or max_per_host < 1:
+        raise ArgumentError("max_concurrency and max_per_host must be at least 1")
+    _check_max_bytes(kwargs.get("max_bytes"))
+
+    import asyncio
+
+    limit = asyncio.Semaphore(max_concurrency)
+    host_limits: dict[str, asyncio.Semaphore] = {}
+
+    async def fetch_one(url: str) -> str:
+        try:
+            host = urllib.parse.urlsplit(url).netloc.lower()
+            host_limit = host_limits.setdefault(host, asyncio.Semaphore(max_per_host))
+            # wait for the host first, so a busy host does not hold global slots
+            async with host_limit, limit:
+                return await async_mcp_http_request("GET", url, **kwargs)
+        except Exception as e:
+            return format_error_result(e)
+
+    return list(await asyncio.gather(*(fetch_one(url) for url in urls)))
+
+
+def format_batch_result(urls: list[str], results: list[str]) -> str:
+    return "\r\n\r\n".join(
+        f"--- [{i}/{len(urls)}] {url} ---\r\n{result}"
+        for i, (url, result) in enumerate(zip(urls, results), 1)
+    )
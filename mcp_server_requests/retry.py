@@ -0,0 +1,125 @@
+from dataclasses import dataclass, replace
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import collections
+import datetime
+import random
+import threading
+
+
+DEFAULT_MAX_RETRIES = 2
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS"))
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """When and how long to wait before a request is sent again.
+
+    Only ``methods`` are retried, POST is left out because it is not
+    idempotent, add it with ``retry_post``. A request is retried after a
+    response with one of ``statuses`` or a connection error. The n-th retry
+    waits a random time between 0 and ``min(backoff_max, backoff_base * 2 ** n)``
+    seconds, or as long as the ``Retry-After`` header asks for, unless that is
+    more than ``retry_after_max`` seconds, then the response is returned as is.
+    """
+    max_retries: int = DEFAULT_MAX_RETRIES
+    methods: frozenset[str] = IDEMPOTENT_METHODS
+    statuses: frozenset[int] = RETRY_STATUSES
+    backoff_base: float = 0.5
+    backoff_max: float = 10.0
+    retry_after_max: float = 30.0
+    jitter: bool = True
+
+    def retry_post(self) -> "RetryPolicy":
+        return replace(self, methods=self.methods | {"POST"})
+
+    def backoff(self, retry: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** retry)
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def delay(self, method: str, retry: int, status: Optional[int] = None, retry_after: Optional[str] = None) -> Optional[float]:
+        """Seconds to wait before retry number ``retry`` (counting from 0), ``None`` if it should not be retried.
+
+        ``status`` is ``None`` when the request failed with a connection error.
+        """
+        if retry >= self.max_retries or method not in self.methods:
+            return None
+        if status is not None and status not in self.statuses:
+            return None
+        if retry_after is not None:
+            seconds = parse_retry_after(retry_after)
+            if seconds is not None:
+                return seconds if seconds <= self.retry_after_max else None
+        return self.backoff(retry)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Seconds to wait according to a ``Retry-After`` header, either seconds or an HTTP date."""
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+@dataclass
+class RetryStats:
+    retries: int = 0
+    exhausted: int = 0
+    hosts: int = 0
+
+
+class RetryBudget:
+    """Limit retries per host to a share of the requests sent to it.
+
+    Every host starts with ``max_tokens`` tokens, a retry takes one and every
+    request gives back ``ratio`` of one, so a host that keeps failing gets at
+    most ``ratio`` retries per request instead of ``max_retries``.
+    """
+
+    def __init__(self, *, ratio: float = 0.2, max_tokens: float = 10.0, max_hosts: int = 1024):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.max_hosts = max_hosts
+        self._tokens: collections.OrderedDict[str, float] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._retries = 0
+        self._exhausted = 0
+
+    def _get(self, host: str) -> float:
+        tokens = self._tokens.pop(host, self.max_tokens)
+        if len(self._tokens) >= self.max_hosts:
+            self._tokens.popitem(last=False)
+        return tokens
+
+    def deposit(self, host: str) -> None:
+        with self._lock:
+            self._tokens[host] = min(self.max_tokens, self._get(host) + self.ratio)
+
+    def withdraw(self, host: str) -> bool:
+        """Take a token for a retry to ``host``, ``False`` if none is left."""
+        with self._lock:
+            tokens = self._get(host)
+            if tokens < 1:
+                self._tokens[host] = tokens
+                self._exhausted += 1
+                return False
+            self._tokens[host] = tokens - 1
+            self._retries += 1
+            return True
+
+    def stats(self) -> RetryStats:
+        with self._lock:
+            return RetryStats(retries=self._retries, exhausted=self._exhausted, hosts=len(self._tokens))
+
+
+default_retry_budget = RetryBudget()
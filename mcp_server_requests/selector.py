@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from html import escape
+from typing import Any, Optional
+import functools
+import importlib.util
+
+from .clean import has_lxml
+
+
+class SelectorError(ValueError):
+    """An invalid selector, or a selector that matches nothing in a page."""
+
+
+@functools.cache
+def has_cssselect() -> bool:
+    # with cssselect a CSS selector is translated to XPath and runs on lxml,
+    # without it on a BeautifulSoup tree, which is slower to build
+    return has_lxml() and importlib.util.find_spec("cssselect") is not None
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_xpath(xpath: str) -> Any:
+    if not has_lxml():
+        raise SelectorError("xpath needs lxml, install it with `pip install mcp-server-requests[lxml]`")
+    from lxml import etree
+    try:
+        return etree.XPath(xpath)
+    except etree.XPathSyntaxError as e:
+        raise SelectorError(f"invalid xpath {xpath!r}: {e}") from e
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_css(css: str) -> Any:
+    if has_cssselect():
+        from cssselect import HTMLTranslator, SelectorError as CSSSelectorError
+        try:
+            return _compile_xpath(HTMLTranslator().css_to_xpath(css))
+        except CSSSelectorError as e:
+            raise SelectorError(f"invalid css selector {css!r}: {e}") from e
+    import soupsieve
+    try:
+        return soupsieve.compile(css)
+    except soupsieve.SelectorSyntaxError as e:
+        raise SelectorError(f"invalid css selector {css!r}: {e}") from e
+
+
+@dataclass(frozen=True)
+class Selector:
+    """The parts of a page to keep, given by a CSS selector or an XPath expression.
+
+    Only the matching elements are passed to the converters, the rest of the
+    page is dropped right after it is parsed. An element inside another
+    matching element is kept once, as part of the outer one.
+    """
+    css: Optional[str] = None
+    xpath: Optional[str] = None
+
+    def __str__(self) -> str:
+        return f"css {self.css!r}" if self.css is not None else f"xpath {self.xpath!r}"
+
+    def check(self) -> None:
+        """Raise ``SelectorError`` if the selector cannot be used."""
+        if (self.css is None) == (self.xpath is None):
+            raise SelectorError("exactly one of css and xpath must be given")
+        if self.css is not None:
+            _compile_css(self.css)
+        else:
+            _compile_xpath(self.xpath)
+
+    def select(self, html: str) -> str:
+        """The HTML of the matching elements, one after another."""
+        self.check()
+        if self.xpath is not None or has_cssselect():
+            parts = _select_lxml(html, _compile_css(self.css) if self.css is not None else _compile_xpath(self.xpath))
+        else:
+            parts = _select_soup(html, _compile_css(self.css))
+        if not parts:
+            raise SelectorError(f"no element of the page matches the {self}")
+        return "\n".join(parts)
+
+
+def _select_lxml(html: str, xpath: Any) -> list[str]:
+    from lxml import etree
+    import lxml.html
+
+    if not html.strip():
+        return []
+    try:
+        tree = lxml.html.document_fromstring(html)
+        results = xpath(tree)
+    except etree.XPathEvalError as e:
+        raise SelectorError(f"cannot evaluate xpath {xpath.path!r}: {e}") from e
+    if not isinstance(results, list):
+        # count(), string() and the like
+        return [escape(str(results))]
+    parts = []
+    selected = set()
+    for result in results:
+        if isinstance(result, etree._Element):
+            if any(ancestor in selected for ancestor in result.iterancestors()):
+                continue
+            selected.add(result)
+            parts.append(lxml.html.tostring(result, encoding="unicode", with_tail=False))
+        else:
+            # text() and attribute values
+            parts.append(escape(str(result)))
+    return parts
+
+
+def _select_soup(html: str, css: Any) -> list[str]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml" if has_lxml() else "html.parser")
+    parts = []
+    selected = set()
+    for element in css.select(soup):
+        if any(id(parent) in selected for parent in element.parents):
+            continue
+        selected.add(id(element))
+        parts.append(str(element))
+    return parts
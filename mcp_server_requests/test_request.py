@@ -1,16 +1,162 @@
+import asyncio
+import gzip
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
 import unittest
+from dataclasses import replace
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
+from mcp_server_requests.cache import HTTPCache
+from mcp_server_requests.clean import LXML_MIN_SIZE, clean_html, has_lxml, select_parser
+from mcp_server_requests.convert import CONVERTERS, ConversionCache
+from mcp_server_requests.delta import UNCHANGED, DeltaStore
+from mcp_server_requests.documents import Document, DocumentStore, page_text
+from mcp_server_requests.encoding import ACCEPT_ENCODING, brotli, get_decoder
+from mcp_server_requests import jsonpath
+from mcp_server_requests.jsonpath import JSONPath, JSONPathError, compile_query
+from mcp_server_requests.markdown import iter_html_to_markdown, stream_html_to_markdown
+from mcp_server_requests.pool import ConnectionPool
+from mcp_server_requests.profiling import Profiler
+from mcp_server_requests.readability import extract_main_content
+from mcp_server_requests.ratelimit import RateLimiter
+from mcp_server_requests.retry import RetryBudget, RetryPolicy
+from mcp_server_requests.selector import Selector, SelectorError
+from mcp_server_requests.singleflight import SingleFlight
+from mcp_server_requests.timeout import DeadlineExceeded, Timeouts
+from mcp_server_requests.timing import Histogram, LatencyRecorder, Timings
+from mcp_server_requests.ua import UA_FILE, UALoader, compile_ua
+from mcp_server_requests.utils import html_to_markdown, simple_html_to_markdown
 from mcp_server_requests.request import (
     Response,
     McpError, ArgumentError, RequestError, ResponseError,
     merge_query_to_url,
-    http_request,
+    http_request, async_http_request, http_download, mcp_http_download,
     format_response_result, format_error_result,
-    mcp_http_request
+    mcp_http_request, async_mcp_http_request, mcp_read_document,
+    async_mcp_fetch_many, format_batch_result, MAX_BATCH_URLS,
 )
-import urllib.error
 import http.client
 
+
+class LocalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/text")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/delay":
+            time.sleep(0.3)
+        if self.path.startswith("/bytes/"):
+            # /bytes/<n>: n bytes of binary data, sent in 64 KiB pieces
+            n = int(self.path.rsplit("/", 1)[1])
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(n))
+            self.end_headers()
+            block = bytes(range(256)) * 256
+            try:
+                while n > 0:
+                    self.wfile.write(block[:n])
+                    n -= len(block)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+            return
+        if self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for _ in range(10):
+                piece = "0123456789€".encode("utf-8")
+                self.wfile.write(f"{len(piece):x}\r\n".encode("ascii") + piece + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        if self.path in ("/drip", "/stall"):
+            # /drip sends one byte every 50ms, /stall sends nothing for a second
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", "100")
+            self.end_headers()
+            try:
+                for _ in range(100):
+                    time.sleep(0.05 if self.path == "/drip" else 1)
+                    self.wfile.write(b"x")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+            return
+        if self.path == "/html":
+            body = (b"<html><body><nav><p>menu</p></nav><main><div class=\"story\"><h1>Title</h1><p>first</p></div>"
+                    b"<p>second</p></main><footer><p>footer</p></footer></body></html>")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path == "/json":
+            items = [{"id": i, "name": f"item {i}", "price": i * 1.5} for i in range(100)]
+            body = json.dumps({"total": 100, "items": items}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path == "/missing":
+            self.send_response(404)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", "9")
+            self.end_headers()
+            self.wfile.write(b"not found")
+            return
+        body = f"hello {self.path}".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LocalServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients of the tests drop connections on purpose
+        pass
+
+
+class LocalServerTestCase(unittest.TestCase):
+    handler_class = LocalHandler
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = LocalServer(("127.0.0.1", 0), cls.handler_class)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+
 class TestResponse(unittest.TestCase):
     def test_response_initialization(self):
         headers = [('Content-Type', 'text/plain'), ('X-Test', '123')]
@@ -74,20 +220,25 @@ class TestMergeQueryToUrl(unittest.TestCase):
             merge_query_to_url(url, query)
 
 class TestHttpRequest(unittest.TestCase):
-    @patch('urllib.request.urlopen')
-    def test_http_request_success(self, mock_urlopen):
+    @patch('mcp_server_requests.pool.ConnectionPool.acquire')
+    def test_http_request_success(self, mock_acquire):
         # Setup mock response
         mock_resp = MagicMock(spec=http.client.HTTPResponse)
         mock_resp.version = 11
         mock_resp.status = 200
         mock_resp.reason = "OK"
+        mock_resp.will_close = True
+        mock_resp.getheader.return_value = None
         mock_resp.getheaders.return_value = [('Content-Type', 'text/plain')]
-        mock_resp.read.return_value = b"response content"
-        mock_urlopen.return_value = mock_resp
-        
+        mock_resp.read.side_effect = [b"response content", b""]
+        mock_conn = MagicMock(spec=http.client.HTTPConnection)
+        mock_conn.sock = MagicMock()
+        mock_conn.getresponse.return_value = mock_resp
+        mock_acquire.return_value = (mock_conn, ("http", "example.com", 80, None), False)
+
         # Test request
         response = http_request("GET", "http://example.com")
-        
+
         # Assertions
         self.assertEqual(response.url, "http://example.com")
         self.assertEqual(response.version, "HTTP/1.1")
@@ -95,14 +246,16 @@ class TestHttpRequest(unittest.TestCase):
         self.assertEqual(response.reason, "OK")
         self.assertEqual(response.headers, [('Content-Type', 'text/plain')])
         self.assertEqual(response.content, b"response content")
-    
-    @patch('urllib.request.urlopen')
-    def test_http_request_error(self, mock_urlopen):
-        mock_urlopen.side_effect = urllib.error.URLError("test error")
-        
+        mock_conn.request.assert_called_once()
+        self.assertEqual(mock_conn.request.call_args.args[:2], ("GET", "/"))
+
+    @patch('mcp_server_requests.pool.ConnectionPool.acquire')
+    def test_http_request_error(self, mock_acquire):
+        mock_acquire.side_effect = ConnectionRefusedError("test error")
+
         with self.assertRaises(RequestError):
             http_request("GET", "invalid_url")
-    
+
     def test_http_request_invalid_method(self):
         with self.assertRaises(ArgumentError):
             http_request("INVALID", "http://example.com")
@@ -111,6 +264,834 @@ class TestHttpRequest(unittest.TestCase):
         with self.assertRaises(ArgumentError):
             http_request("POST", "http://example.com", data="data", json_={"key": "value"})
 
+class TestConnectionPool(LocalServerTestCase):
+    def test_same_host_reuses_connection(self):
+        pool = ConnectionPool(max_per_host=2)
+        for i in range(3):
+            response = http_request("GET", f"{self.base_url}/{i}", pool=pool)
+            self.assertEqual(response.content, f"hello /{i}".encode("utf-8"))
+
+        stats = pool.stats()
+        self.assertEqual(stats.missed, 1)
+        self.assertEqual(stats.reused, 2)
+        self.assertEqual(stats.idle, 1)
+        self.assertAlmostEqual(stats.hit_rate, 2 / 3)
+        pool.clear()
+
+    def test_idle_connection_expires(self):
+        pool = ConnectionPool(idle_timeout=0)
+        http_request("GET", f"{self.base_url}/a", pool=pool)
+        http_request("GET", f"{self.base_url}/b", pool=pool)
+        self.assertEqual(pool.stats().reused, 0)
+        self.assertEqual(pool.stats().missed, 2)
+        pool.clear()
+
+    def test_disabled_pool_closes_connections(self):
+        pool = ConnectionPool(max_per_host=0)
+        http_request("GET", f"{self.base_url}/a", pool=pool)
+        self.assertEqual(pool.stats().idle, 0)
+
+    def test_redirect_is_followed_on_pooled_connection(self):
+        pool = ConnectionPool()
+        response = http_request("GET", f"{self.base_url}/redirect", pool=pool)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.url, f"{self.base_url}/text")
+        self.assertEqual(response.content, b"hello /text")
+        self.assertEqual(pool.stats().reused, 1)
+        pool.clear()
+
+
+class TestAsyncRequest(LocalServerTestCase):
+    def test_async_http_request(self):
+        response = asyncio.run(async_http_request("GET", f"{self.base_url}/async", pool=ConnectionPool()))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"hello /async")
+
+    def test_concurrent_requests_overlap(self):
+        async def run():
+            calls = [async_mcp_http_request("GET", f"{self.base_url}/delay") for _ in range(8)]
+            return await asyncio.gather(*calls)
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(results), 8)
+        for result in results:
+            self.assertIn("HTTP/1.1 200 OK", result)
+        # eight 0.3s calls done one after another would take 2.4s
+        self.assertLess(elapsed, 1.2)
+
+
+class TestFetchMany(LocalServerTestCase):
+    def test_results_are_in_input_order(self):
+        urls = [f"{self.base_url}/delay", f"{self.base_url}/a", "ftp://example.com/", f"{self.base_url}/b"]
+        results = asyncio.run(async_mcp_fetch_many(urls, format_headers=False))
+        self.assertEqual(len(results), 4)
+        self.assertIn("hello /delay", results[0])
+        self.assertIn("hello /a", results[1])
+        self.assertIn("500 MCP Service Internal Error", results[2])
+        self.assertIn("hello /b", results[3])
+        formatted = format_batch_result(urls, results)
+        self.assertTrue(formatted.startswith(f"--- [1/4] {urls[0]} ---\r\n"))
+        self.assertIn(f"--- [4/4] {urls[3]} ---\r\n", formatted)
+
+    def test_per_host_limit(self):
+        urls = [f"{self.base_url}/delay"] * 4
+        start = time.perf_counter()
+        asyncio.run(async_mcp_fetch_many(urls, max_per_host=4))
+        parallel = time.perf_counter() - start
+        start = time.perf_counter()
+        asyncio.run(async_mcp_fetch_many(urls, max_per_host=2))
+        limited = time.perf_counter() - start
+        self.assertLess(parallel, 0.55)
+        self.assertGreater(limited, 0.55)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ArgumentError):
+            asyncio.run(async_mcp_fetch_many([]))
+        with self.assertRaises(ArgumentError):
+            asyncio.run(async_mcp_fetch_many([f"{self.base_url}/a"] * (MAX_BATCH_URLS + 1)))
+
+
+class TestTimeouts(LocalServerTestCase):
+    def test_within(self):
+        self.assertEqual(Timeouts(connect=10, read=30, total=120).within(5), Timeouts(connect=5, read=5, total=5))
+        self.assertEqual(Timeouts(connect=10, read=30, total=120).within(20), Timeouts(connect=10, read=20, total=20))
+        self.assertEqual(Timeouts(connect=None, read=None, total=None).within(300), Timeouts(300, 300, 300))
+
+    def test_deadline_holds_against_slow_drip(self):
+        start = time.perf_counter()
+        with self.assertRaises(RequestError) as cm:
+            http_request("GET", f"{self.base_url}/drip", timeouts=Timeouts(read=1, total=0.3))
+        self.assertEqual(cm.exception.reason, "deadline exceeded")
+        self.assertLess(time.perf_counter() - start, 0.6)
+
+    def test_read_timeout(self):
+        with self.assertRaises(RequestError) as cm:
+            http_request("GET", f"{self.base_url}/stall", timeouts=Timeouts(read=0.2))
+        self.assertEqual(cm.exception.reason, "read timeout")
+
+    def test_connect_timeout(self):
+        with patch("socket.create_connection", side_effect=TimeoutError("timed out")):
+            with self.assertRaises(RequestError) as cm:
+                http_request("GET", f"{self.base_url}/text", pool=ConnectionPool())
+        self.assertEqual(cm.exception.reason, "connect timeout")
+
+    def test_timeout_is_formatted(self):
+        result = mcp_http_request("GET", f"{self.base_url}/stall", timeouts=Timeouts(read=0.2))
+        self.assertTrue(result.startswith("HTTP/1.1 504 MCP Service Timeout, read timeout\r\n"))
+
+    def test_fast_request_within_deadline(self):
+        pool = ConnectionPool()
+        response = http_request("GET", f"{self.base_url}/text", pool=pool, timeouts=Timeouts(total=5))
+        self.assertEqual(response.content, b"hello /text")
+        self.assertEqual(pool.stats().idle, 1)
+
+
+class FlakyHandler(LocalHandler):
+    # /<name>/<n>/<status>: the first n requests fail with status, 0 drops the connection
+    calls: dict[str, int] = {}
+
+    def handle_flaky(self):
+        _, name, n, status = self.path.split("/")
+        calls = FlakyHandler.calls[name] = FlakyHandler.calls.get(name, 0) + 1
+        if calls <= int(n) and status == "0":
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        code = int(status) if calls <= int(n) else 200
+        body = f"call {calls}".encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        if code == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = handle_flaky
+
+
+class TestRetry(LocalServerTestCase):
+    handler_class = FlakyHandler
+    policy = RetryPolicy(backoff_base=0.01, jitter=False)
+
+    def test_retried_until_success(self):
+        response = http_request("GET", f"{self.base_url}/a/2/503", retry=self.policy, retry_budget=RetryBudget())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"call 3")
+        self.assertEqual(response.annotations["Retries"], "2, 0.03s of backoff")
+
+    def test_gives_up_after_max_retries(self):
+        response = http_request("GET", f"{self.base_url}/b/5/502", retry=self.policy, retry_budget=RetryBudget())
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(FlakyHandler.calls["b"], 3)
+
+    def test_connection_error_is_retried(self):
+        response = http_request("GET", f"{self.base_url}/c/1/0", retry=self.policy, retry_budget=RetryBudget(),
+                                pool=ConnectionPool())
+        self.assertEqual(response.content, b"call 2")
+        with self.assertRaises(RequestError) as cm:
+            http_request("GET", f"{self.base_url}/d/5/0", retry=self.policy, retry_budget=RetryBudget(),
+                         pool=ConnectionPool())
+        self.assertIn("after 2 retries", cm.exception.message)
+
+    def test_post_only_when_enabled(self):
+        response = http_request("POST", f"{self.base_url}/e/1/503", retry=self.policy, retry_budget=RetryBudget())
+        self.assertEqual(response.status_code, 503)
+        response = http_request("POST", f"{self.base_url}/e/1/503", retry=self.policy.retry_post(), retry_budget=RetryBudget())
+        self.assertEqual(response.status_code, 200)
+
+    def test_retry_after(self):
+        response = http_request("GET", f"{self.base_url}/f/1/429", retry=replace(self.policy, retry_after_max=0.5),
+                                retry_budget=RetryBudget())
+        self.assertEqual(response.status_code, 429)
+        start = time.perf_counter()
+        response = http_request("GET", f"{self.base_url}/g/1/429", retry=self.policy, retry_budget=RetryBudget())
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.perf_counter() - start, 1)
+
+    def test_budget_per_host(self):
+        budget = RetryBudget(ratio=0, max_tokens=1)
+        response = http_request("GET", f"{self.base_url}/h/5/503", retry=self.policy, retry_budget=budget)
+        self.assertEqual(response.annotations["Retries"], "1, 0.01s of backoff")
+        self.assertEqual(budget.stats().exhausted, 1)
+
+
+class TestRateLimiter(LocalServerTestCase):
+    handler_class = FlakyHandler
+
+    def test_token_bucket(self):
+        limiter = RateLimiter(rate=20, burst=2, max_concurrency=None)
+        waited = []
+        for _ in range(4):
+            waited.append(limiter.acquire("a"))
+            limiter.release("a", 200, 0.01)
+        self.assertLess(waited[0] + waited[1], 0.01)
+        self.assertGreater(waited[2] + waited[3], 0.07)
+        self.assertEqual(limiter.stats().hosts["a"].waits, 2)
+        # other hosts have their own bucket
+        self.assertLess(limiter.acquire("b"), 0.01)
+
+    def test_concurrency_fifo(self):
+        limiter = RateLimiter(max_concurrency=1)
+        limiter.acquire("a")
+        order = []
+
+        def worker(i):
+            limiter.acquire("a")
+            order.append(i)
+            limiter.release("a")
+
+        threads = []
+        for i in range(5):
+            t = threading.Thread(target=worker, args=(i,))
+            t.start()
+            threads.append(t)
+            while limiter.stats().hosts["a"].queued < i + 1:
+                time.sleep(0.001)
+        limiter.release("a")
+        for t in threads:
+            t.join()
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+
+    def test_timeout(self):
+        limiter = RateLimiter(max_concurrency=1)
+        limiter.acquire("a")
+        with self.assertRaises(DeadlineExceeded):
+            limiter.acquire("a", 0.05)
+        self.assertEqual(limiter.stats().hosts["a"].queued, 0)
+
+    def test_host_in_use_is_not_evicted(self):
+        limiter = RateLimiter(rate=1, burst=1, max_hosts=1)
+        limiter.acquire("a")
+        limiter.release("a")
+        acquire = limiter._acquire
+
+        def other_host_first(state, host, timeout):
+            if host == "a":
+                # another host is added between the lookup of "a" and its wait
+                limiter.acquire("b")
+                limiter.release("b")
+            return acquire(state, host, timeout)
+
+        with patch.object(limiter, "_acquire", side_effect=other_host_first):
+            with self.assertRaises(DeadlineExceeded):
+                limiter.acquire("a", 0.05)
+        # "a" kept its empty bucket, it did not get a new one
+        with self.assertRaises(DeadlineExceeded):
+            limiter.acquire("a", 0.05)
+        # a host that is not in use is still forgotten
+        limiter.acquire("c")
+        limiter.release("c")
+        self.assertEqual(set(limiter.stats().hosts), {"a", "c"})
+
+    def test_adaptive(self):
+        limiter = RateLimiter(max_concurrency=8, adaptive=True)
+        limiter.acquire("a")
+        limiter.release("a", 429, 0.01)
+        self.assertEqual(limiter.stats().hosts["a"].scale, 0.5)
+        for _ in range(4):
+            limiter.acquire("a")
+        # 4 of the 8 requests are allowed now
+        with self.assertRaises(DeadlineExceeded):
+            limiter.acquire("a", 0.01)
+        for _ in range(4):
+            limiter.release("a", 200, 0.01)
+        self.assertAlmostEqual(limiter.stats().hosts["a"].scale, 0.7)
+        # a host that gets slower is slowed down
+        for latency in (0.01, 1, 1, 1):
+            limiter.acquire("b")
+            limiter.release("b", 200, latency)
+        self.assertLess(limiter.stats().hosts["b"].scale, 1)
+
+    def test_wait_is_reported(self):
+        limiter = RateLimiter(rate=10, burst=1)
+        response = http_request("GET", f"{self.base_url}/r/0/200", rate_limiter=limiter)
+        self.assertNotIn("Rate-Limit-Wait", response.annotations)
+        response = http_request("GET", f"{self.base_url}/r/0/200", rate_limiter=limiter)
+        self.assertIn("Rate-Limit-Wait", response.annotations)
+        self.assertEqual(limiter.stats().hosts["127.0.0.1"].active, 0)
+        limiter = RateLimiter(rate=0.1, burst=1)
+        http_request("GET", f"{self.base_url}/r/0/200", rate_limiter=limiter)
+        with self.assertRaises(RequestError) as cm:
+            http_request("GET", f"{self.base_url}/r/0/200", rate_limiter=limiter, timeouts=Timeouts(total=0.1))
+        self.assertEqual(cm.exception.reason, "deadline exceeded")
+
+
+class CountingHandler(LocalHandler):
+    hits: dict[str, int] = {}
+
+    def do_GET(self):
+        CountingHandler.hits[self.path] = CountingHandler.hits.get(self.path, 0) + 1
+        time.sleep(0.2)
+        body = f"<h1>{self.path}</h1>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestSingleFlight(LocalServerTestCase):
+    handler_class = CountingHandler
+
+    def test_do(self):
+        flight = SingleFlight()
+        calls = []
+
+        def work(x):
+            calls.append(x)
+            time.sleep(0.1)
+            if x == "error":
+                raise ValueError(x)
+            return x * 2
+
+        results, errors = [], []
+
+        def run(x):
+            try:
+                results.append(flight.do(x, work, x))
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(x,)) for x in ["a"] * 5 + ["error"] * 3]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(calls), ["a", "error"])
+        self.assertEqual(results, ["aa"] * 5)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(flight.stats().coalesced, 6)
+        self.assertEqual(flight.stats().in_flight, 0)
+        # nothing is kept once a call is done
+        self.assertEqual(flight.do("a", work, "a"), "aa")
+        self.assertEqual(calls.count("a"), 2)
+
+    def test_identical_requests_share_one(self):
+        flight = SingleFlight()
+
+        async def fetch_all():
+            return await asyncio.gather(
+                *(async_mcp_http_request("GET", f"{self.base_url}/shared", return_content="markdown",
+                                         single_flight=flight) for _ in range(4)),
+                async_mcp_http_request("GET", f"{self.base_url}/shared", return_content="raw", single_flight=flight),
+                async_mcp_http_request("GET", f"{self.base_url}/shared", headers={"X-Other": "1"}, single_flight=flight),
+            )
+
+        results = asyncio.run(fetch_all())
+        self.assertEqual(CountingHandler.hits["/shared"], 3)
+        self.assertEqual(len(set(results[:4])), 1)
+        self.assertNotIn("<h1>", results[0])
+        self.assertEqual(flight.stats().coalesced, 3)
+
+    def test_rotated_user_agents_share_one(self):
+        flight = SingleFlight()
+        agents = iter(f"agent {i}" for i in range(10))
+
+        async def fetch_all():
+            return await asyncio.gather(*(
+                async_mcp_http_request("GET", f"{self.base_url}/rotated", user_agent=lambda: next(agents),
+                                       single_flight=flight) for _ in range(4)))
+
+        asyncio.run(fetch_all())
+        self.assertEqual(CountingHandler.hits["/rotated"], 1)
+        self.assertEqual(flight.stats().coalesced, 3)
+
+    def test_different_user_agents_are_not_merged(self):
+        flight = SingleFlight()
+
+        async def fetch_all():
+            return await asyncio.gather(
+                async_mcp_http_request("GET", f"{self.base_url}/static", user_agent="agent a", single_flight=flight),
+                async_mcp_http_request("GET", f"{self.base_url}/static", user_agent="agent b", single_flight=flight),
+                async_mcp_http_request("GET", f"{self.base_url}/static", headers={"User-Agent": "c"},
+                                       user_agent="agent a", force_user_agnet=True, single_flight=flight),
+                async_mcp_http_request("GET", f"{self.base_url}/static", headers={"User-Agent": "c"},
+                                       user_agent="agent a", single_flight=flight),
+            )
+
+        asyncio.run(fetch_all())
+        self.assertEqual(CountingHandler.hits["/static"], 4)
+        self.assertEqual(flight.stats().coalesced, 0)
+
+    def test_post_is_not_coalesced(self):
+        flight = SingleFlight()
+        mcp_http_request("GET", f"{self.base_url}/single", single_flight=flight)
+        self.assertEqual(flight.stats().calls, 1)
+        with patch("mcp_server_requests.request.http_request", side_effect=RequestError("boom")):
+            mcp_http_request("POST", f"{self.base_url}/single", data="x", single_flight=flight)
+        self.assertEqual(flight.stats().calls, 1)
+
+
+class CacheHandler(LocalHandler):
+    hits: dict[str, int] = {}
+
+    def do_GET(self):
+        CacheHandler.hits[self.path] = CacheHandler.hits.get(self.path, 0) + 1
+        redirects = {"/moved": (301, "/fresh"), "/moved-etag": (308, "/etag"), "/found": (302, "/fresh")}
+        if self.path in redirects:
+            status, location = redirects[self.path]
+            self.send_response(status)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        headers = {"Content-Type": "text/plain"}
+        body = f"body of {self.path}"
+        if self.path == "/fresh":
+            headers["Cache-Control"] = "max-age=60"
+        elif self.path == "/etag":
+            headers["Cache-Control"] = "no-cache"
+            headers["ETag"] = '"v1"'
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                return
+        elif self.path == "/vary":
+            headers["Cache-Control"] = "max-age=60"
+            headers["Vary"] = "Accept-Language"
+            body += f" in {self.headers.get('Accept-Language')}"
+        elif self.path == "/no-store":
+            headers["Cache-Control"] = "no-store"
+
+        data = body.encode("utf-8")
+        self.send_response(200)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestHTTPCache(LocalServerTestCase):
+    handler_class = CacheHandler
+
+    def setUp(self):
+        CacheHandler.hits.clear()
+        self.cache = HTTPCache()
+
+    def get(self, path, headers=None):
+        return http_request("GET", f"{self.base_url}{path}", headers=headers, cache=self.cache)
+
+    def test_fresh_response_is_served_from_cache(self):
+        first = self.get("/fresh")
+        second = self.get("/fresh")
+        self.assertEqual(first.annotations["Cache"], "MISS")
+        self.assertEqual(second.annotations["Cache"], "HIT")
+        self.assertEqual(second.content, b"body of /fresh")
+        self.assertEqual(CacheHandler.hits["/fresh"], 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.revalidations), (1, 1, 0))
+
+    def test_stale_response_is_revalidated(self):
+        first = self.get("/etag")
+        second = self.get("/etag")
+        self.assertEqual(first.annotations["Cache"], "MISS")
+        self.assertEqual(second.annotations["Cache"], "REVALIDATED")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, b"body of /etag")
+        self.assertEqual(CacheHandler.hits["/etag"], 2)
+        self.assertEqual(self.cache.stats().revalidations, 1)
+
+    def test_vary_selects_stored_response(self):
+        en = self.get("/vary", {"Accept-Language": "en"})
+        zh = self.get("/vary", {"Accept-Language": "zh"})
+        self.assertEqual(self.get("/vary", {"Accept-Language": "en"}).content, en.content)
+        self.assertEqual(self.get("/vary", {"Accept-Language": "zh"}).annotations["Cache"], "HIT")
+        self.assertNotEqual(en.content, zh.content)
+        self.assertEqual(CacheHandler.hits["/vary"], 2)
+
+    def test_no_store_is_not_cached(self):
+        self.get("/no-store")
+        self.get("/no-store")
+        self.assertEqual(CacheHandler.hits["/no-store"], 2)
+        self.assertEqual(self.cache.stats().entries, 0)
+
+    def test_permanent_redirect_is_cached(self):
+        first = self.get("/moved")
+        second = self.get("/moved")
+        self.assertEqual(second.annotations["Cache"], "HIT")
+        self.assertEqual(second.url, f"{self.base_url}/fresh")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(CacheHandler.hits["/moved"], 1)
+        # a stale entry is revalidated at the end of the redirect
+        self.get("/moved-etag")
+        self.assertEqual(self.get("/moved-etag").annotations["Cache"], "REVALIDATED")
+        self.assertEqual(CacheHandler.hits["/moved-etag"], 2)
+
+    def test_temporary_redirect_is_followed(self):
+        self.get("/found")
+        second = self.get("/found")
+        self.assertEqual(second.annotations["Cache"], "MISS")
+        self.assertEqual(second.content, b"body of /fresh")
+        self.assertEqual(CacheHandler.hits["/found"], 2)
+
+    def test_cache_status_is_formatted(self):
+        self.get("/fresh")
+        result = format_response_result(self.get("/fresh"), format_headers=False)
+        self.assertIn("X-MCP-Cache: HIT", result)
+
+    def test_size_bound_evicts_least_recently_used(self):
+        self.cache = HTTPCache(max_size=300)
+        self.get("/fresh")
+        self.get("/vary")
+        self.assertEqual(self.cache.stats().entries, 1)
+        self.assertLessEqual(self.cache.stats().size, 300)
+        self.get("/fresh")
+        self.assertEqual(CacheHandler.hits["/fresh"], 2)
+
+
+class TestConversionCache(unittest.TestCase):
+    def html_response(self, body: bytes) -> Response:
+        return Response("http://example.com", "HTTP/1.1", 200, "OK", [("Content-Type", "text/html")], body)
+
+    def test_identical_content_is_converted_once(self):
+        calls = []
+
+        def converter(html):
+            calls.append(html)
+            return "converted"
+
+        cache = ConversionCache()
+        with patch.dict(CONVERTERS, {"markdown": (converter, {})}):
+            for _ in range(3):
+                result = format_response_result(self.html_response(b"<p>page</p>"), return_content="markdown", conversion_cache=cache)
+                self.assertIn("converted", result)
+
+        self.assertEqual(calls, ["<p>page</p>"])
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (2, 1, 1))
+
+    def test_key_includes_content_and_mode(self):
+        cache = ConversionCache()
+        markdown = format_response_result(self.html_response(b"<b>a</b>"), return_content="markdown", conversion_cache=cache)
+        cleaned = format_response_result(self.html_response(b"<b>a</b>"), return_content="strict_clean", conversion_cache=cache)
+        other = format_response_result(self.html_response(b"<b>b</b>"), return_content="markdown", conversion_cache=cache)
+        self.assertIn("**a**", markdown)
+        self.assertIn("<b>a</b>", cleaned)
+        self.assertIn("**b**", other)
+        self.assertEqual(cache.stats().misses, 3)
+
+
+class TestMarkdownConverter(unittest.TestCase):
+    html = (
+        "<html><head><style>p { color: red }</style></head><body>"
+        "<h1>Title</h1><p>Some <strong>bold</strong> and <em>italic</em> text with <a href=\"/x\">a link</a>.</p>"
+        "<ul>ignored<li>one</li><li>two <b>2</b></li></ul><ol><li>first</li><li>second</li></ol>"
+        "<pre>dropped<code>def f():\n    return 1</code>dropped</pre><pre>no code</pre>"
+        "<blockquote><p>quoted</p><blockquote>nested</blockquote></blockquote>"
+        "<hr><div><span><img src=\"a.png\" alt=\"A\"></span></div><script>var x = '<p>';</script>"
+        "</body></html>"
+    )
+
+    def test_same_as_simple_converter(self):
+        self.assertEqual(stream_html_to_markdown(self.html), simple_html_to_markdown(self.html))
+
+    def test_chunked_input(self):
+        chunks = (self.html[i:i + 5] for i in range(0, len(self.html), 5))
+        self.assertEqual("".join(iter_html_to_markdown(chunks)), stream_html_to_markdown(self.html))
+
+    def test_unclosed_tags(self):
+        html = "<div><ul><li>a<li>b</ul><p>c<p>d</div><blockquote>e"
+        self.assertEqual(stream_html_to_markdown(html), "* ab\n\ncd\n\n> e")
+
+    def test_comments(self):
+        # the text of a comment is written like a text node, except in a <code>
+        html = "<!-- top --><p>a<!-- b -->c</p><pre><code>x<!-- y -->z</code></pre><ul><!-- u --><li>d</li></ul>"
+        self.assertEqual(stream_html_to_markdown(html), "abc\n\n```\nxz\n```\n\n* d")
+        self.assertEqual(stream_html_to_markdown(html), simple_html_to_markdown(html))
+
+    def test_saved_pages(self):
+        corpus = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus")
+        if not os.path.isdir(corpus):
+            self.skipTest("benchmarks/corpus is not available")
+        for name in sorted(os.listdir(corpus)):
+            if not name.endswith(".html"):
+                continue
+            with open(os.path.join(corpus, name), encoding="utf-8") as f:
+                page = f.read()
+            with self.subTest(page=name):
+                self.assertEqual(stream_html_to_markdown(page), simple_html_to_markdown(page))
+
+
+class TestCleanHtml(unittest.TestCase):
+    html = (
+        '<div class="a" id="b"><script>if (a < b) x()</script><p style="c">t &amp; u</p>'
+        '<noscript><p>no</p></noscript><img src="s.png" alt="q"><meta charset="utf-8"></div>'
+    )
+
+    def test_clean_tags_and_attrs(self):
+        self.assertEqual(clean_html(self.html, parser="html.parser"),
+                         '<div class="a" id="b"><p style="c">t &amp; u</p><img src="s.png" alt="q"></div>')
+        self.assertEqual(clean_html(self.html, allowed_attrs=("id", "src"), parser="html.parser"),
+                         '<div id="b"><p>t &amp; u</p><img src="s.png"></div>')
+        self.assertEqual(clean_html(self.html, allowed_attrs=False, parser="html.parser"),
+                         '<div><p>t &amp; u</p><img></div>')
+
+    def test_unbalanced_tags(self):
+        # an end tag closes the elements opened after its start tag, even a removed one
+        self.assertEqual(clean_html("<div><b>x</div>y</span>", parser="html.parser"), "<div><b>x</b></div>y")
+        self.assertEqual(clean_html("<div><noscript>x</div>y", parser="html.parser"), "<div></div>y")
+
+    @unittest.skipUnless(has_lxml(), "lxml is not installed")
+    def test_lxml_parser(self):
+        self.assertEqual(clean_html(self.html, allowed_attrs=("id", "src"), parser="lxml"),
+                         '<html><body><div id="b"><p>t &amp; u</p><img src="s.png"></div></body></html>')
+
+    def test_parser_by_size(self):
+        self.assertEqual(select_parser(1000), "html.parser")
+        self.assertEqual(select_parser(LXML_MIN_SIZE), "lxml" if has_lxml() else "html.parser")
+
+
+class TestEarlyAbort(LocalServerTestCase):
+    def test_binary_content_is_rejected_before_download(self):
+        pool = ConnectionPool()
+        start = time.perf_counter()
+        with self.assertRaises(ResponseError) as cm:
+            http_request("GET", f"{self.base_url}/bytes/{4 * 1024 ** 3}", text_only=True, pool=pool)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(cm.exception.response.status_code, 200)
+        self.assertEqual(cm.exception.response.content, b"")
+        self.assertIn("application/octet-stream", cm.exception.message)
+        # the connection with the unread body must not be reused
+        self.assertEqual(pool.stats().idle, 0)
+
+    def test_declared_length_over_limit_is_rejected(self):
+        with self.assertRaises(ResponseError) as cm:
+            http_request("GET", f"{self.base_url}/bytes/100000", max_content_length=1000)
+        self.assertIn("exceeds the limit of 1000 bytes", cm.exception.message)
+
+    def test_mcp_http_request_rejects_binary(self):
+        result = mcp_http_request("GET", f"{self.base_url}/bytes/{4 * 1024 ** 3}")
+        self.assertIn("HTTP/1.1 200 OK, but there was an error", result)
+        self.assertIn('cannot be converted to a string', result)
+
+    def test_text_content_passes(self):
+        response = http_request("GET", f"{self.base_url}/text", text_only=True, max_content_length=1000)
+        self.assertEqual(response.content, b"hello /text")
+
+
+class TestSizeBudget(LocalServerTestCase):
+    def test_body_read_stops_at_budget(self):
+        pool = ConnectionPool()
+        response = http_request("GET", f"{self.base_url}/bytes/{4 * 1024 ** 3}", max_bytes=1000, pool=pool)
+        self.assertEqual(len(response.content), 1000)
+        self.assertEqual(response.annotations["Truncated"], f"read 1000 bytes of {4 * 1024 ** 3} bytes")
+        self.assertEqual(pool.stats().idle, 0)
+
+    def test_body_within_budget_is_not_truncated(self):
+        response = http_request("GET", f"{self.base_url}/text", max_bytes=len(b"hello /text"))
+        self.assertEqual(response.content, b"hello /text")
+        self.assertNotIn("Truncated", response.annotations)
+
+    def test_chunked_body_total_unknown(self):
+        result = mcp_http_request("GET", f"{self.base_url}/chunked", max_bytes=25, format_headers=False)
+        self.assertIn("X-MCP-Truncated: read 25 bytes of unknown", result)
+        # the cut in the middle of the euro sign is dropped
+        self.assertIn("0123456789€0123456789\r\n", result)
+        self.assertIn("[truncated: the response body was cut", result)
+
+    def test_converted_output_is_truncated(self):
+        response = Response("http://example.com", "HTTP/1.1", 200, "OK", [("Content-Type", "text/plain")], "é" * 100)
+        result = format_response_result(response, max_bytes=11)
+        self.assertIn("ééééé\r\n\r\n[truncated: the content is 200 bytes, only the first 11 bytes are shown]", result)
+
+    def test_truncated_response_is_not_cached(self):
+        cache = HTTPCache()
+        response = http_request("GET", f"{self.base_url}/chunked", max_bytes=10, cache=cache)
+        self.assertIn("Truncated", response.annotations)
+        self.assertEqual(cache.stats().entries, 0)
+
+    def test_download_budget(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "data.bin")
+            result = mcp_http_download(f"{self.base_url}/bytes/100000", file_path, max_bytes=4096)
+            self.assertIn("(4096 bytes", result)
+            self.assertIn("truncated: read 4096 bytes of 100000 bytes", result)
+            self.assertEqual(os.path.getsize(file_path), 4096)
+
+
+class TestDownload(LocalServerTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmpdir.name, "sub", "data.bin")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_binary_body_is_written_as_is(self):
+        response, written = http_download("GET", f"{self.base_url}/bytes/100000", self.file_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(written, 100000)
+        with open(self.file_path, "rb") as f:
+            data = f.read()
+        self.assertEqual(data, (bytes(range(256)) * 256 * 2)[:100000])
+        self.assertEqual(os.listdir(os.path.dirname(self.file_path)), ["data.bin"])
+
+    def test_memory_does_not_grow_with_body_size(self):
+        tracemalloc.start()
+        try:
+            _, written = http_download("GET", f"{self.base_url}/bytes/{32 * 1024 * 1024}", self.file_path, chunk_size=64 * 1024)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(written, 32 * 1024 * 1024)
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+    def test_error_status_writes_nothing(self):
+        result = mcp_http_download(f"{self.base_url}/missing", self.file_path)
+        self.assertIn("404", result)
+        self.assertIn("nothing was written", result)
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_converted_content_has_no_status_line(self):
+        result = mcp_http_download(f"{self.base_url}/text", self.file_path, return_content="markdown")
+        self.assertIn("File written successfully", result)
+        with open(self.file_path, "rb") as f:
+            self.assertEqual(f.read(), b"hello /text")
+
+
+class CompressionHandler(LocalHandler):
+    body = ("<p>" + "compressible text " * 1000 + "</p>").encode("utf-8")
+    accept_encoding: list = []
+
+    def do_GET(self):
+        CompressionHandler.accept_encoding.append(self.headers.get("Accept-Encoding"))
+        data = self.body
+        if self.path == "/gzip":
+            data, encoding = gzip.compress(data), "gzip"
+        elif self.path == "/deflate":
+            data, encoding = zlib.compress(data), "deflate"
+        elif self.path == "/raw-deflate":
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            data, encoding = compressor.compress(data) + compressor.flush(), "deflate"
+        elif self.path == "/br":
+            data, encoding = brotli.compress(data), "br"
+        elif self.path == "/broken":
+            data, encoding = b"not gzip data", "gzip"
+        else:
+            encoding = None
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestCompression(LocalServerTestCase):
+    handler_class = CompressionHandler
+
+    def test_gzip_is_decoded(self):
+        response = http_request("GET", f"{self.base_url}/gzip")
+        self.assertEqual(response.content, CompressionHandler.body)
+        self.assertEqual(CompressionHandler.accept_encoding[-1], ACCEPT_ENCODING)
+        self.assertRegex(response.annotations["Content-Decoded"], r"^gzip, \d+ bytes transferred$")
+        self.assertNotIn("Content-Encoding", dict(response.headers))
+        self.assertEqual(dict(response.headers)["Content-Length"], str(len(CompressionHandler.body)))
+        self.assertNotIn("Content-Encoding: gzip", format_response_result(response, format_headers=True))
+
+    def test_deflate_is_decoded(self):
+        for path in ("/deflate", "/raw-deflate"):
+            response = http_request("GET", f"{self.base_url}{path}")
+            self.assertEqual(response.content, CompressionHandler.body)
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_is_decoded(self):
+        response = http_request("GET", f"{self.base_url}/br", max_bytes=1000)
+        self.assertEqual(response.content, CompressionHandler.body[:1000])
+        self.assertEqual(response.annotations["Truncated"], "read 1000 bytes of unknown")
+
+    def test_decompression_bomb_is_decoded_in_bounded_pieces(self):
+        bombs = {"gzip": gzip.compress(bytes(64 * 1024 * 1024))}
+        if brotli is not None:
+            bombs["br"] = brotli.compress(bytes(64 * 1024 * 1024))
+        for encoding, bomb in bombs.items():
+            with self.subTest(encoding=encoding):
+                decoder = get_decoder(encoding)
+                tracemalloc.start()
+                try:
+                    decoder.feed(bomb)
+                    total = 0
+                    while chunk := decoder.read(64 * 1024):
+                        self.assertLessEqual(len(chunk), 64 * 1024)
+                        total += len(chunk)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                self.assertEqual(total + len(decoder.flush()), 64 * 1024 * 1024)
+                self.assertLess(peak, 1024 * 1024)
+
+    def test_caller_accept_encoding_is_kept(self):
+        response = http_request("GET", f"{self.base_url}/identity", headers={"accept-encoding": "identity"})
+        self.assertEqual(CompressionHandler.accept_encoding[-1], "identity")
+        self.assertNotIn("Content-Decoded", response.annotations)
+
+    def test_budget_counts_decoded_bytes(self):
+        response = http_request("GET", f"{self.base_url}/gzip", max_bytes=1000)
+        self.assertEqual(response.content, CompressionHandler.body[:1000])
+        self.assertEqual(response.annotations["Truncated"], "read 1000 bytes of unknown")
+        self.assertNotIn("Content-Length", dict(response.headers))
+
+    def test_broken_encoding_is_request_error(self):
+        with self.assertRaises(RequestError) as cm:
+            http_request("GET", f"{self.base_url}/broken")
+        self.assertIn("Failed to decode response", str(cm.exception))
+
+    def test_download_is_not_decoded(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "page.html")
+            _, written = http_download("GET", f"{self.base_url}/identity", file_path)
+            self.assertEqual(written, len(CompressionHandler.body))
+            self.assertEqual(CompressionHandler.accept_encoding[-1], "identity")
+
+
 class TestFormatFunctions(unittest.TestCase):
     def test_format_response_result_full(self):
         response = Response(
@@ -161,5 +1142,481 @@ class TestMcpHttpRequest(unittest.TestCase):
         self.assertIn("500 MCP Service Internal Error", result)
         self.assertIn("test error", result)
 
+    @patch('mcp_server_requests.request.http_request')
+    def test_invalid_max_bytes_is_rejected(self, mock_http_request):
+        for max_bytes in (-5, 0):
+            result = mcp_http_request("GET", "http://example.com", max_bytes=max_bytes)
+            self.assertIn("invalid argument", result)
+            self.assertIn(f"max_bytes must be greater than 0, got {max_bytes}", result)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result = mcp_http_download("http://example.com", os.path.join(tmpdir, "page.md"), max_bytes=-5)
+        self.assertIn("max_bytes must be greater than 0, got -5", result)
+        mock_http_request.assert_not_called()
+
+
+class TestTiming(LocalServerTestCase):
+    def test_histogram(self):
+        histogram = Histogram()
+        for _ in range(99):
+            histogram.observe(0.003)
+        histogram.observe(50)
+        self.assertGreater(histogram.quantile(0.5), 0.0025)
+        self.assertLessEqual(histogram.quantile(0.5), 0.005)
+        self.assertLessEqual(histogram.quantile(0.99), 0.005)
+        self.assertEqual(histogram.quantile(1), 50)
+        self.assertEqual(Histogram().quantile(0.5), 0)
+
+    def test_phases(self):
+        latency = LatencyRecorder()
+        pool = ConnectionPool()
+        result = mcp_http_request("GET", f"{self.base_url}/text", pool=pool, latency=latency, report_timing=True)
+        timing = next(line for line in result.split("\r\n") if line.startswith("X-MCP-Timing: "))
+        for phase in ("dns", "connect", "ttfb", "download", "convert", "total"):
+            self.assertIn(f"{phase}=", timing)
+        self.assertNotIn("tls=", timing)
+        # the second request reuses the connection
+        result = mcp_http_request("GET", f"{self.base_url}/text", pool=pool, latency=latency)
+        self.assertNotIn("X-MCP-Timing", result)
+        stats = latency.stats()
+        self.assertEqual(stats.phases["ttfb"].count, 2)
+        self.assertEqual(stats.phases["dns"].count, 1)
+        self.assertEqual(stats.hosts["127.0.0.1"]["total"].count, 2)
+        self.assertLessEqual(stats.phases["total"].p50, stats.phases["total"].p99)
+
+        metrics = latency.prometheus()
+        self.assertIn("# TYPE mcp_requests_phase_seconds histogram", metrics)
+        self.assertIn('mcp_requests_phase_seconds_bucket{host="127.0.0.1",phase="ttfb",le="+Inf"} 2', metrics)
+        self.assertIn('mcp_requests_phase_seconds_count{host="127.0.0.1",phase="dns"} 1', metrics)
+
+    def test_failed_requests_are_recorded(self):
+        latency = LatencyRecorder()
+        timings = Timings()
+        with self.assertRaises(RequestError):
+            http_request("GET", f"{self.base_url}/stall", timeouts=Timeouts(read=0.05), timings=timings,
+                         retry=RetryPolicy(max_retries=0))
+        self.assertIn("ttfb", timings.phases)
+        mcp_http_request("GET", f"{self.base_url}/stall", timeouts=Timeouts(read=0.05), latency=latency,
+                         retry=RetryPolicy(max_retries=0))
+        self.assertEqual(latency.stats().phases["total"].count, 1)
+
+
+class TestDocuments(LocalServerTestCase):
+    @staticmethod
+    def header(result: str, name: str) -> str | None:
+        prefix = f"X-MCP-{name}: "
+        return next((line[len(prefix):] for line in result.split("\r\n") if line.startswith(prefix)), None)
+
+    def test_pages(self):
+        documents = DocumentStore()
+        url = f"{self.base_url}/chunked"
+        with patch("mcp_server_requests.request.http_request", wraps=http_request) as request:
+            first = mcp_http_request("GET", url, documents=documents, limit=40)
+            handle = self.header(first, "Document")
+            self.assertEqual(self.header(first, "Range"), "0-40/110")
+            self.assertEqual(self.header(first, "Next-Offset"), "40")
+            self.assertIn("0123456789€" * 3 + "0123456\r\n", first)
+
+            second = mcp_http_request("GET", url, documents=documents, offset=40, limit=40)
+            self.assertEqual(self.header(second, "Document"), handle)
+            self.assertEqual(self.header(second, "Range"), "40-80/110")
+            last = mcp_read_document(handle, documents=documents, offset=80)
+            self.assertEqual(self.header(last, "Range"), "80-110/110")
+            self.assertIsNone(self.header(last, "Next-Offset"))
+            self.assertEqual(self.header(mcp_read_document(handle, documents=documents, offset=110), "Range"), "110-110/110")
+            for past_end in (mcp_read_document(handle, documents=documents, offset=5000),
+                             mcp_http_request("GET", url, documents=documents, offset=111)):
+                self.assertIn("invalid argument", past_end)
+                self.assertIn("past the end of the document, which has 110 characters", past_end)
+                self.assertIsNone(self.header(past_end, "Range"))
+            self.assertEqual(request.call_count, 1)
+
+            # error pages are not kept
+            for _ in range(2):
+                result = mcp_http_request("GET", f"{self.base_url}/missing", documents=documents, limit=10)
+                self.assertIsNone(self.header(result, "Document"))
+            self.assertEqual(request.call_count, 3)
+        self.assertEqual(documents.stats().entries, 1)
+        self.assertIn("expired", mcp_read_document("0" * 16, documents=documents))
+        self.assertIn("limit must be greater than 0", mcp_http_request("GET", url, limit=0))
+
+    def test_store(self):
+        documents = DocumentStore(ttl=0.05)
+        documents.put(Document("a", "http://a", "HTTP/1.1 200 OK", "text"))
+        self.assertIsNotNone(documents.get("a"))
+        time.sleep(0.1)
+        self.assertIsNone(documents.get("a"))
+        self.assertEqual(documents.stats().expired, 1)
+
+        documents = DocumentStore(max_size=2 * sys.getsizeof("x" * 100))
+        for handle in "abc":
+            documents.put(Document(handle, "http://" + handle, "HTTP/1.1 200 OK", "x" * 100))
+        self.assertIsNone(documents.get("a"))
+        self.assertIsNotNone(documents.get("c"))
+
+    def test_page_text(self):
+        text = "line one\nline two\nline three\n"
+        self.assertEqual(page_text(text, 0, 15), ("line one\n", 9))
+        self.assertEqual(page_text(text, 9, 100), ("line two\nline three\n", len(text)))
+        self.assertEqual(page_text("x" * 10, 0, 4), ("xxxx", 4))
+
+
+class TestSelector(LocalServerTestCase):
+    def test_select(self):
+        html = "<div><p>a <b>b</b></p></div><p>c</p><span>d</span>"
+        self.assertEqual(Selector(css="p").select(html), "<p>a <b>b</b></p>\n<p>c</p>")
+        # an element inside another match is only kept as part of it
+        self.assertEqual(Selector(css="div, p, b").select(html), "<div><p>a <b>b</b></p></div>\n<p>c</p>")
+        if has_lxml():
+            self.assertEqual(Selector(xpath="//p").select(html), "<p>a <b>b</b></p>\n<p>c</p>")
+            self.assertEqual(Selector(xpath="//span/text()").select(html), "d")
+        with self.assertRaises(SelectorError):
+            Selector(css="span.missing").select(html)
+        for selector in (Selector(css="p["), Selector(), Selector(css="p", xpath="//p")):
+            with self.assertRaises(SelectorError):
+                selector.check()
+
+    def test_request(self):
+        url = f"{self.base_url}/html"
+        result = mcp_http_request("GET", url, return_content="markdown", selector=Selector(css="main"))
+        self.assertIn("first", result)
+        self.assertIn("second", result)
+        self.assertNotIn("menu", result)
+        self.assertNotIn("footer", result)
+        result = mcp_http_request("GET", url, return_content="raw", selector=Selector(css=".story p"))
+        self.assertIn("<p>first</p>\r\n", result)
+        self.assertNotIn("Title", result)
+
+        self.assertIn("nothing selected", mcp_http_request("GET", url, selector=Selector(css="table")))
+        self.assertIn("only applies to HTML", mcp_http_request("GET", f"{self.base_url}/text", selector=Selector(css="p")))
+        with patch("mcp_server_requests.request.http_request") as request:
+            self.assertIn("invalid argument", mcp_http_request("GET", url, selector=Selector(css="p[")))
+            request.assert_not_called()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "story.html")
+            mcp_http_download(url, path, selector=Selector(css=".story h1"))
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "<h1>Title</h1>")
+
+
+class TestMainContent(unittest.TestCase):
+    PAGE = (
+        "<html><head><title>Post</title><script>var x = 1;</script></head><body>"
+        "<div class=\"site-header\"><a href=\"/\">Home</a> <a href=\"/about\">About</a></div>"
+        "<nav><ul><li><a href=\"/x\">Section X</a></li></ul></nav>"
+        "<div id=\"content\"><h1>The Title</h1><div class=\"post\">"
+        + "".join(f"<p>Paragraph {i} of the post, with some words, a few commas, and enough text to be scored.</p>" for i in range(4))
+        + "<div class=\"share\"><a href=\"/s\">Share this</a> <a href=\"/t\">Tweet this</a></div>"
+        "</div></div>"
+        "<div class=\"sidebar\"><ul><li><a href=\"/r1\">Related post</a></li><li><a href=\"/r2\">Another post</a></li></ul></div>"
+        "<div class=\"footer\"><p>Copyright, the site</p></div></body></html>"
+    )
+
+    def test_extract(self):
+        for parser in ("html.parser", "lxml") if has_lxml() else ("html.parser",):
+            content = extract_main_content(self.PAGE, parser=parser)
+            for i in range(4):
+                self.assertIn(f"Paragraph {i} of the post", content)
+            self.assertIn("<h1>The Title</h1>", content)
+            for boilerplate in ("Home", "Section X", "Share this", "Related post", "Copyright", "var x"):
+                self.assertNotIn(boilerplate, content)
+
+    # saved pages of benchmarks/corpus: text of the main content, and text of the navigation and footer around it
+    CORPUS = {
+        "rust-book-ownership.html": (
+            ["is a set of rules that govern how a Rust program manages memory", "Rust does let us return multiple values using a tuple"],
+            ["Keyboard shortcuts", "Press `?` to show this help"],
+        ),
+        "rust-std-hashmap.html": (
+            ["implemented with quadratic probing and SIMD lookup", "Creates an empty `HashMap`"],
+            ["1159e78c4 2025-09-14", "### [Sections]"],
+        ),
+        "python-docs-idle.html": (
+            ["IDLE is Python’s Integrated Development and Learning Environment.", "The only current default extension is zzdummy"],
+            ["### [Table of Contents]", "The Python Software Foundation is a non-profit corporation", "Please donate."],
+        ),
+        "npm-docs-install.html": (
+            ["This command installs a package and any packages that it depends on.", "This algorithm is deterministic"],
+            ["Table of contents", "Edit this page on GitHub"],
+        ),
+    }
+
+    def test_saved_pages(self):
+        corpus = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus")
+        if not os.path.isdir(corpus):
+            self.skipTest("benchmarks/corpus is not available")
+        for name, (content, boilerplate) in self.CORPUS.items():
+            with open(os.path.join(corpus, name), encoding="utf-8") as f:
+                page = f.read()
+            whole_page = html_to_markdown(page)
+            for parser in ("html.parser", "lxml") if has_lxml() else ("html.parser",):
+                with self.subTest(page=name, parser=parser):
+                    markdown = html_to_markdown(extract_main_content(page, parser=parser))
+                    for text in content:
+                        self.assertIn(text, markdown)
+                    for text in boilerplate:
+                        self.assertIn(text, whole_page)
+                        self.assertNotIn(text, markdown)
+
+    def test_fallback(self):
+        # without paragraphs to score the whole page is kept
+        html = "<table><tr><td><a href=\"/1\">one</a></td></tr></table>"
+        self.assertEqual(extract_main_content(html), html)
+
+    def test_converter(self):
+        converter, settings = CONVERTERS["main"]
+        markdown = converter(self.PAGE, **settings)
+        self.assertTrue(markdown.lstrip().startswith("The Title"))
+        self.assertIn("Paragraph 3 of the post", markdown)
+        self.assertNotIn("Related post", markdown)
+
+
+class TestJSONPath(LocalServerTestCase):
+    DOCUMENT = {
+        "store": {
+            "book": [
+                {"category": "reference", "author": "Nigel Rees", "price": 8.95},
+                {"category": "fiction", "author": "Evelyn Waugh", "price": 12.99},
+                {"category": "fiction", "author": "Herman Melville", "isbn": "0-553-21311-3", "price": 8.99},
+                {"category": "fiction", "author": "J. R. R. Tolkien", "isbn": "0-395-19395-8", "price": 22.99},
+            ],
+            "bicycle": {"color": "red", "price": 399, "tags": ["a\"]", True, None]},
+        },
+    }
+    QUERIES = {
+        "$.store.book[*].author": ["Nigel Rees", "Evelyn Waugh", "Herman Melville", "J. R. R. Tolkien"],
+        "$..price": [8.95, 12.99, 8.99, 22.99, 399],
+        "$.store.book[-1].author": ["J. R. R. Tolkien"],
+        "$.store.book[1:3].price": [12.99, 8.99],
+        "$.store.book[::-2].price": [22.99, 12.99],
+        "$['store'].book[0, 2].price": [8.95, 8.99],
+        "$..book[?@.isbn].author": ["Herman Melville", "J. R. R. Tolkien"],
+        "$..book[?@.price < 10 && @.category == 'fiction'].author": ["Herman Melville"],
+        "$.store.bicycle.tags[?@ == true]": [True],
+        "$..missing": [],
+    }
+
+    def test_select(self):
+        text = json.dumps(self.DOCUMENT, indent=2)
+        # with a tiny DECODE_SIZE every container is scanned instead of decoded
+        for decode_size in (jsonpath.DECODE_SIZE, 1):
+            with patch.object(jsonpath, "DECODE_SIZE", decode_size):
+                for expression, expected in self.QUERIES.items():
+                    self.assertEqual(JSONPath(expression).select(text), expected, expression)
+        with self.assertRaises(json.JSONDecodeError):
+            JSONPath("$.a[*]").select('{"a": [1, 2')
+        self.assertEqual(JSONPath("$.a[*]").select('{"a": [1, 2', partial=True), [1])
+        for expression in ("store", "$.", "$[?@.a ==]", "$[?length(@) > 1]", "$[?@.* == 1]"):
+            with self.assertRaises(JSONPathError):
+                compile_query(expression)
+
+    def test_request(self):
+        url = f"{self.base_url}/json"
+        result = mcp_http_request("GET", url, json_path=JSONPath("$.items[?@.price > 145].name"), format_headers=False)
+        self.assertTrue(result.endswith('\r\n\r\n["item 97", "item 98", "item 99"]\r\n'))
+        result = mcp_http_request("GET", url, json_path=JSONPath("$.total"), format_headers=False)
+        self.assertIn("[100]", result)
+        self.assertIn("only applies to JSON", mcp_http_request("GET", f"{self.base_url}/text", json_path=JSONPath("$")))
+        # an error response is not projected
+        self.assertIn("not found", mcp_http_request("GET", f"{self.base_url}/missing", json_path=JSONPath("$")))
+        with patch("mcp_server_requests.request.http_request") as request:
+            self.assertIn("invalid argument", mcp_http_request("GET", url, json_path=JSONPath("$[")))
+            request.assert_not_called()
+
+
+class DeltaHandler(LocalHandler):
+    lines: list[str] = []
+    sent: int = 0
+
+    def do_GET(self):
+        etag = f'"{len(DeltaHandler.lines)}-{hash(tuple(DeltaHandler.lines))}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        DeltaHandler.sent += 1
+        data = "\n".join(DeltaHandler.lines).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("ETag", etag)
+        if self.path == "/no-store":
+            self.send_header("Cache-Control", "no-store")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestDelta(LocalServerTestCase):
+    handler_class = DeltaHandler
+
+    def setUp(self):
+        DeltaHandler.lines = [f"line {i}" for i in range(50)]
+        DeltaHandler.sent = 0
+        self.deltas = DeltaStore()
+
+    def fetch(self, path="/page", **kwargs):
+        return mcp_http_request("GET", f"{self.base_url}{path}", format_headers=False, deltas=self.deltas, delta=True, **kwargs)
+
+    def test_returns_what_changed(self):
+        first = self.fetch()
+        self.assertIn("X-MCP-Delta: new", first)
+        self.assertIn("line 49", first)
+        DeltaHandler.lines[10] = "line ten"
+        second = self.fetch()
+        self.assertIn("X-MCP-Delta: diff, -1 +1 lines", second)
+        self.assertIn("-line 10\n+line ten", second)
+        self.assertNotIn("line 49", second)
+        DeltaHandler.lines = ["something else"]
+        self.assertIn("X-MCP-Delta: replaced", self.fetch())
+        stats = self.deltas.stats()
+        self.assertEqual((stats.new, stats.diffs, stats.replaced, stats.entries), (1, 1, 1, 1))
+
+    def test_unchanged_page_is_not_downloaded_again(self):
+        self.fetch()
+        result = self.fetch()
+        self.assertIn("X-MCP-Delta: unchanged, not modified", result)
+        self.assertIn(UNCHANGED, result)
+        self.assertEqual(DeltaHandler.sent, 1)
+        self.assertEqual(self.deltas.stats().not_modified, 1)
+
+    def test_unchanged_page_with_http_cache(self):
+        cache = HTTPCache()
+        self.fetch(cache=cache)
+        result = self.fetch(cache=cache)
+        self.assertIn("X-MCP-Cache: REVALIDATED", result)
+        self.assertIn("X-MCP-Delta: unchanged", result)
+        self.assertEqual(DeltaHandler.sent, 1)
+
+    def test_page_the_cache_does_not_store_is_revalidated(self):
+        cache = HTTPCache()
+        self.fetch("/no-store", cache=cache)
+        for _ in range(2):
+            self.assertIn("X-MCP-Delta: unchanged, not modified", self.fetch("/no-store", cache=cache))
+        self.assertEqual(DeltaHandler.sent, 1)
+        self.assertEqual(self.deltas.stats().not_modified, 2)
+
+    def test_without_delta_nothing_is_kept(self):
+        mcp_http_request("GET", f"{self.base_url}/page", deltas=self.deltas)
+        self.assertEqual(self.deltas.stats().entries, 0)
+
+    def test_delta_cannot_be_paged(self):
+        self.assertIn("delta cannot be combined with offset or limit", self.fetch(limit=10))
+
+    def test_least_recently_fetched_versions_are_dropped(self):
+        self.deltas = DeltaStore(max_size=300)
+        self.fetch()
+        self.assertEqual(self.deltas.stats().entries, 0)
+        self.assertIn("X-MCP-Delta: new", self.fetch())
+
+
+class TestProfiling(LocalServerTestCase):
+    def test_profile_saved(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = Profiler(directory, mode="both")
+            mcp_http_request("GET", f"{self.base_url}/text", profiler=profiler)
+            files = sorted(os.listdir(directory))
+            self.assertEqual([os.path.splitext(f)[1] for f in files], [".json", ".prof", ".tracemalloc"])
+            with open(os.path.join(directory, files[0]), encoding="utf-8") as f:
+                metadata = json.load(f)
+            self.assertEqual(metadata["url"], f"{self.base_url}/text")
+            self.assertEqual(metadata["method"], "GET")
+            self.assertIn("ttfb", metadata["timings"])
+            self.assertIn("peak", metadata["memory"])
+            self.assertEqual(profiler.stats().saved, 1)
+
+    def test_sample_and_threshold(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for profiler in (Profiler(directory, sample_rate=0), Profiler(directory, threshold=60)):
+                mcp_http_request("GET", f"{self.base_url}/text", profiler=profiler)
+                self.assertEqual(profiler.stats().saved, 0)
+            self.assertEqual(os.listdir(directory), [])
+        with self.assertRaises(ValueError):
+            Profiler(directory, mode="disk")
+
+
+class TestUserAgent(unittest.TestCase):
+    def test_filter(self):
+        loader = UALoader(UA_FILE)
+        linux = loader.filter(os="linux")
+        self.assertTrue(linux)
+        self.assertTrue(all(d["os"] == "Linux" for d in linux))
+        firefox = loader.filter(browser="Firefox", os="Linux", type="desktop")
+        self.assertTrue(firefox)
+        self.assertTrue(all(d["browser"] == "Firefox" and d["os"] == "Linux" for d in firefox))
+        self.assertEqual(len(loader.filter()), len(loader))
+        self.assertEqual(loader.filter(os="plan9"), [])
+        self.assertIsNone(loader.random(os="plan9"))
+        self.assertIn(loader.random(browser="chrome", os="windows"), loader.filter(browser="Chrome", os="Windows"))
+
+    def test_compiled(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = os.path.join(tmp, "ua.jsonl"), os.path.join(tmp, "ua.bin")
+            with open(UA_FILE, "rb") as f:
+                source = f.read()
+            with open(src, "wb") as f:
+                f.write(source)
+            count = compile_ua(src, dst)
+            self.assertEqual(count, len(UALoader(UA_FILE)))
+            with open(dst, "rb") as f:
+                compiled = f.read()
+            self.assertEqual(UALoader._load_compiled(compiled, source), UALoader(src)._load_data())
+            # a compiled file of another source is ignored
+            with open(src, "ab") as f:
+                f.write(b"\n" + source.splitlines()[0])
+            self.assertIsNone(UALoader._load_compiled(compiled, source + b"\n"))
+            self.assertEqual(len(UALoader(src, dst)), count + 1)
+
+    def test_rotation(self):
+        agents = iter(["ua 1", "ua 2"])
+        with patch("mcp_server_requests.request.http_request", side_effect=RequestError("boom")) as mock:
+            for _ in range(2):
+                mcp_http_request("GET", "http://example.com", user_agent=lambda: next(agents))
+        self.assertEqual([call.kwargs["headers"]["User-Agent"] for call in mock.call_args_list], ["ua 1", "ua 2"])
+
+
+class TestServerTools(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from mcp_server_requests.__main__ import create_mcp_server
+        cls.mcp = create_mcp_server()
+
+    def call(self, tool, **arguments):
+        result = asyncio.run(self.mcp.call_tool(tool, arguments))
+        # newer SDKs also return the structured output
+        contents = result[0] if isinstance(result, tuple) else result
+        return "".join(c.text for c in contents)
+
+    def test_invalid_timeout_is_formatted(self):
+        arguments = {
+            "fetch": {}, "fetch_many": {"urls": ["http://127.0.0.1:1/"]},
+            "fetch_to_file": {"file_path": os.path.join(tempfile.gettempdir(), "out.md")},
+            "http_get": {}, "http_post": {}, "http_put": {}, "http_patch": {}, "http_delete": {},
+        }
+        for tool, extra in arguments.items():
+            for timeout in (0, -1):
+                with self.subTest(tool=tool, timeout=timeout):
+                    if tool != "fetch_many":
+                        extra = {"url": "http://127.0.0.1:1/", **extra}
+                    result = self.call(tool, timeout=timeout, **extra)
+                    self.assertIn("invalid argument", result)
+                    self.assertIn(f"timeout must be greater than 0, got {float(timeout)}", result)
+
+    def test_timeout_clamps_connect_and_read(self):
+        with patch("mcp_server_requests.__main__.async_mcp_http_request", return_value="ok") as request:
+            self.call("fetch", url="http://127.0.0.1:1/", timeout=5)
+            self.call("fetch", url="http://127.0.0.1:1/")
+        self.assertEqual(request.call_args_list[0].kwargs["timeouts"], Timeouts(connect=5, read=5, total=5))
+        self.assertEqual(request.call_args_list[1].kwargs["timeouts"], Timeouts())
+
+
+class TestStartup(unittest.TestCase):
+    def test_cli_does_not_import_heavy_modules(self):
+        code = ("import sys, mcp_server_requests.__main__; "
+                "print(*sorted(m for m in ('mcp', 'bs4', 'markdownify', 'lxml') if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
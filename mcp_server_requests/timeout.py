@@ -0,0 +1,168 @@
+from dataclasses import dataclass
+from typing import Optional
+import heapq
+import http.client
+import itertools
+import socket
+import threading
+import time
+
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_TOTAL_TIMEOUT = 120.0
+
+
+@dataclass(frozen=True)
+class Timeouts:
+    """Timeouts of a request in seconds, ``None`` means no limit.
+
+    ``connect`` limits establishing a connection (including the TLS
+    handshake), ``read`` each wait for data from the server, and ``total``
+    the whole request from sending it to reading the last byte of the body.
+    """
+    connect: Optional[float] = DEFAULT_CONNECT_TIMEOUT
+    read: Optional[float] = DEFAULT_READ_TIMEOUT
+    total: Optional[float] = DEFAULT_TOTAL_TIMEOUT
+
+    def __post_init__(self):
+        for name in ("connect", "read", "total"):
+            value = getattr(self, name)
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} timeout must be greater than 0")
+
+    def within(self, total: float) -> "Timeouts":
+        """These timeouts with ``total`` as the total, connect and read clamped to it."""
+        return Timeouts(
+            connect=total if self.connect is None else min(self.connect, total),
+            read=total if self.read is None else min(self.read, total),
+            total=total,
+        )
+
+
+DEFAULT_TIMEOUTS = Timeouts()
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """The total deadline of one request.
+
+    The connection the request is using is registered with ``watch``. Once the
+    deadline passes the watchdog thread shuts its socket down, which wakes up
+    a blocked read, so a server that trickles one byte at a time cannot keep
+    the request alive past the deadline.
+    """
+
+    def __init__(self, total: Optional[float]):
+        self.total = total
+        self.expires_at = time.monotonic() + total if total is not None else None
+        self.expired = False
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+        self._done = False
+        if self.expires_at is not None:
+            _watchdog.add(self)
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def check(self) -> None:
+        """Raise ``DeadlineExceeded`` if the deadline has passed."""
+        remaining = self.remaining()
+        if self.expired or (remaining is not None and remaining <= 0):
+            self.expired = True
+            raise DeadlineExceeded(f"the total deadline of {self.total:g}s was exceeded")
+
+    def timeout(self, limit: Optional[float]) -> Optional[float]:
+        """``limit`` shortened to the time left before the deadline."""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return limit
+        return remaining if limit is None else min(limit, remaining)
+
+    def watch(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._conn = conn
+            expired = self.expired
+        if expired:
+            _shutdown(conn)
+            self.check()
+
+    def unwatch(self) -> None:
+        """Stop watching the connection, so it can be given back to the pool.
+
+        Raises ``DeadlineExceeded`` if the watchdog already shut it down.
+        """
+        with self._lock:
+            self._conn = None
+        self.check()
+
+    def finish(self) -> None:
+        """The request is done, successfully or not, the watchdog will not touch it any more."""
+        with self._lock:
+            self._conn = None
+            self._done = True
+
+    def expire(self) -> None:
+        with self._lock:
+            if self._done:
+                return
+            self.expired = True
+            conn = self._conn
+        if conn is not None:
+            _shutdown(conn)
+
+
+def _shutdown(conn: http.client.HTTPConnection) -> None:
+    sock = conn.sock
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _Watchdog:
+    """One thread that expires the deadlines of all requests."""
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, Deadline]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, deadline: Deadline) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (deadline.expires_at, next(self._counter), deadline))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mcp-server-requests-watchdog", daemon=True)
+                self._thread.start()
+            elif self._heap[0][2] is deadline:
+                self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                # finished deadlines are dropped once they reach the top of the heap
+                while self._heap and self._heap[0][2]._done:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                _, _, deadline = heapq.heappop(self._heap)
+            deadline.expire()
+
+
+_watchdog = _Watchdog()
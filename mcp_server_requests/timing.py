@@ -0,0 +1,183 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+import bisect
+import collections
+import socket
+import threading
+import time
+
+
+# phases of a request, in the order they happen. ``tls`` includes the CONNECT
+# of an HTTPS proxy, ``ttfb`` is from sending the request to its response
+# headers, and phases that happen more than once (redirects, retries) add up.
+PHASES = ("queue", "dns", "connect", "tls", "ttfb", "download", "convert", "total")
+
+# upper bounds in seconds of the histogram buckets, the last bucket is +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Timings:
+    """Seconds spent in each phase of one request."""
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def finish(self) -> None:
+        """Set ``total`` to the time since the timings were created."""
+        self.phases["total"] = time.perf_counter() - self._start
+
+    def format(self) -> str:
+        return " ".join(f"{phase}={self.phases[phase] * 1000:.1f}ms" for phase in PHASES if phase in self.phases)
+
+
+def timed_create_connection(timings: Timings) -> Callable[..., socket.socket]:
+    """A ``socket.create_connection`` that adds the name lookup to ``dns`` and the TCP handshake to ``connect``."""
+
+    def create_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, **kwargs):
+        host, port = address
+        with timings.measure("dns"):
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        error: Optional[OSError] = None
+        with timings.measure("connect"):
+            # the addresses are tried in order, like socket.create_connection does
+            for *_, sockaddr in infos:
+                try:
+                    return socket.create_connection(sockaddr[:2], timeout, source_address, **kwargs)
+                except OSError as e:
+                    error = e
+        raise error if error is not None else OSError(f"getaddrinfo returned no address for {host}")
+
+    return create_connection
+
+
+class Histogram:
+    """Counts of observations in fixed buckets, from which quantiles are estimated."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate of the ``q`` quantile, interpolated linearly within its bucket like Prometheus does."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / count, self.max)
+            cumulative += count
+        return self.max
+
+
+@dataclass
+class PhaseStats:
+    count: int = 0
+    mean: float = 0.0
+    p50: float = 0.0
+    p95: float = 0.0
+    p99: float = 0.0
+    max: float = 0.0
+
+
+@dataclass
+class LatencyStats:
+    phases: dict[str, PhaseStats] = field(default_factory=dict)
+    hosts: dict[str, dict[str, PhaseStats]] = field(default_factory=dict)
+
+
+def _phase_stats(histogram: Histogram) -> PhaseStats:
+    return PhaseStats(
+        count=histogram.count,
+        mean=histogram.sum / histogram.count if histogram.count else 0.0,
+        p50=histogram.quantile(0.5),
+        p95=histogram.quantile(0.95),
+        p99=histogram.quantile(0.99),
+        max=histogram.max,
+    )
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LatencyRecorder:
+    """Histograms of the phase timings of requests, per phase and per host and phase.
+
+    Only the ``max_hosts`` most recently seen hosts are kept.
+    """
+
+    def __init__(self, *, buckets: tuple[float, ...] = DEFAULT_BUCKETS, max_hosts: int = 256):
+        self.buckets = buckets
+        self.max_hosts = max_hosts
+        self._phases: dict[str, Histogram] = {}
+        self._hosts: collections.OrderedDict[str, dict[str, Histogram]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, host: str, timings: Timings) -> None:
+        if "total" not in timings.phases:
+            timings.finish()
+        with self._lock:
+            host_phases = self._hosts.pop(host, None)
+            if host_phases is None:
+                host_phases = {}
+                if len(self._hosts) >= self.max_hosts:
+                    self._hosts.popitem(last=False)
+            self._hosts[host] = host_phases
+            for phase, seconds in timings.phases.items():
+                for histograms in (self._phases, host_phases):
+                    histogram = histograms.get(phase)
+                    if histogram is None:
+                        histogram = histograms[phase] = Histogram(self.buckets)
+                    histogram.observe(seconds)
+
+    def stats(self) -> LatencyStats:
+        with self._lock:
+            return LatencyStats(
+                phases={phase: _phase_stats(h) for phase, h in self._phases.items()},
+                hosts={host: {phase: _phase_stats(h) for phase, h in phases.items()} for host, phases in self._hosts.items()},
+            )
+
+    def prometheus(self, name: str = "mcp_requests_phase_seconds") -> str:
+        """The per host histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {name} Time spent in each phase of an HTTP request.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for host, phases in self._hosts.items():
+                for phase in sorted(phases, key=lambda p: PHASES.index(p) if p in PHASES else len(PHASES)):
+                    histogram = phases[phase]
+                    labels = f'host="{_label(host)}",phase="{_label(phase)}"'
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        le = bound if isinstance(bound, str) else f"{bound:g}"
+                        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
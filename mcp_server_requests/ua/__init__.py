@@ -4,6 +4,10 @@ from typing import Dict, List, Optional
 import os
 import json
 import random
+import array
+import hashlib
+import struct
+import sys
 
 import click
 
@@ -30,32 +34,98 @@ REQUIRED_FIELDS = {
     'platform'
 }
 
+# fields of an entry in the compiled file, in the order they are stored
+COMPILED_FIELDS = ('useragent', 'type', 'browser', 'browser_version', 'os', 'os_version', 'platform')
+COMPILED_MAGIC = b"MCPUA\x01"
+# magic, sha256 of the source, number of strings, size of the string table, number of entries
+COMPILED_HEADER = struct.Struct("<6s32sIII")
+
+# (browser, os, type), lower case, None matches any value
+IndexKey = tuple[Optional[str], Optional[str], Optional[str]]
+
+
+def compile_ua(src: str, dst: str) -> int:
+    """Write the entries of the ``src`` jsonl file to ``dst`` in the compiled form, return their number.
+
+    The compiled file is a table of the distinct strings followed by the
+    index of every field of every entry in that table, it is loaded without
+    parsing JSON. It records the digest of ``src`` and is ignored once
+    ``src`` changes.
+    """
+    with open(src, 'rb') as f:
+        source = f.read()
+    items = UALoader._parse(source)
+    strings: dict[str, int] = {}
+    indexes = array.array('I', (strings.setdefault(item[k], len(strings)) for item in items for k in COMPILED_FIELDS))
+    if sys.byteorder != 'little':
+        indexes.byteswap()
+    table = "\0".join(strings).encode('utf-8')
+    header = COMPILED_HEADER.pack(COMPILED_MAGIC, hashlib.sha256(source).digest(), len(strings), len(table), len(items))
+    with open(dst, 'wb') as f:
+        f.write(header + table + indexes.tobytes())
+    return len(items)
+
 
 class UALoader:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, compiled_path: Optional[str] = None):
         self._file_path = file_path
+        self._compiled_path = compiled_path
         self._data: Optional[List[Dict]] = None
-        self._os_list: Optional[set[str]] = None
-        self._browser_list: Optional[set[str]] = None
+        self._index: Optional[dict[IndexKey, List[Dict]]] = None
 
     @staticmethod
     def _valid(data: any) -> bool:
         return isinstance(data, dict) and all(isinstance(data.get(key, None), str) for key in REQUIRED_FIELDS)
 
-    def _load_data(self) -> List[Dict]:
+    @staticmethod
+    def _parse(source: bytes) -> List[Dict]:
         items = []
+        for line in source.decode('utf-8').splitlines():
+            try:
+                data = json.loads(line.strip())
+                if not UALoader._valid(data):
+                    continue
+                items.append(data)
+            except json.JSONDecodeError:
+                continue
+        return items
+
+    @staticmethod
+    def _load_compiled(data: bytes, source: bytes) -> Optional[List[Dict]]:
+        if len(data) < COMPILED_HEADER.size:
+            return None
+        magic, digest, n_strings, table_size, n_items = COMPILED_HEADER.unpack_from(data)
+        if magic != COMPILED_MAGIC or digest != hashlib.sha256(source).digest():
+            return None
+        start = COMPILED_HEADER.size
+        strings = data[start:start + table_size].decode('utf-8').split("\0")
+        indexes = array.array('I')
+        indexes.frombytes(data[start + table_size:])
+        if sys.byteorder != 'little':
+            indexes.byteswap()
+        n_fields = len(COMPILED_FIELDS)
+        if len(strings) != n_strings or len(indexes) != n_items * n_fields:
+            return None
+        values = [strings[i] for i in indexes]
+        return [dict(zip(COMPILED_FIELDS, values[i:i + n_fields])) for i in range(0, len(values), n_fields)]
+
+    def _load_data(self) -> List[Dict]:
         try:
-            with open(self._file_path, 'r', encoding='utf-8') as f:
-                for line in f.readlines():
-                    try:
-                        data = json.loads(line.strip())
-                        if not UALoader._valid(data):
-                            continue
-                        items.append(data)
-                    except json.JSONDecodeError:
-                        continue
-                return items
-        except:
+            with open(self._file_path, 'rb') as f:
+                source = f.read()
+        except OSError:
+            return FALLBACK_UA_LIST
+        if self._compiled_path is not None:
+            try:
+                with open(self._compiled_path, 'rb') as f:
+                    items = UALoader._load_compiled(f.read(), source)
+                if items is not None:
+                    return items
+            except (OSError, ValueError, struct.error):
+                pass
+        try:
+            return UALoader._parse(source)
+        except ValueError:
             return FALLBACK_UA_LIST
 
     @property
@@ -64,43 +134,49 @@ class UALoader:
             self._data = self._load_data()
         return self._data
 
+    @property
+    def index(self) -> dict[IndexKey, List[Dict]]:
+        """The entries for every (browser, os, type) key, ``None`` in a key matches any value."""
+        if self._index is None:
+            index: dict[IndexKey, List[Dict]] = {}
+            for d in self.data:
+                browser, os_, type_ = d["browser"].lower(), d["os"].lower(), d["type"].lower()
+                for key in ((b, o, t) for b in (browser, None) for o in (os_, None) for t in (type_, None)):
+                    index.setdefault(key, []).append(d)
+            self._index = index
+        return self._index
+
     def oses(self) -> list[str]:
-        if not self._os_list:
-            self._os_list = {d["os"] for d in self.data}
-        return list(self._os_list)
+        return list({d["os"] for d in self.data})
 
     def browsers(self) -> list[str]:
-        if not self._browser_list:
-            self._browser_list = {d["browser"] for d in self.data}
-        return list(self._browser_list)
-
-    def filter(self, *, browser: Optional[str] = None, os: Optional[str] = None) -> List[Dict]:
-        browser = browser.lower() if browser else None
-        os = os.lower() if os else None
+        return list({d["browser"] for d in self.data})
 
-        def cond(data: dict):
-            return (not browser or data["browser"].lower() == browser) and (not os or data["browser"].lower() == os)
-
-        filtered = [d for d in self.data if cond(d)]
+    @staticmethod
+    def _key(browser: Optional[str], os: Optional[str], type: Optional[str]) -> IndexKey:
+        return (browser.lower() if browser else None, os.lower() if os else None, type.lower() if type else None)
 
-        return filtered
+    def filter(self, *, browser: Optional[str] = None, os: Optional[str] = None, type: Optional[str] = None) -> List[Dict]:
+        return list(self.index.get(UALoader._key(browser, os, type), ()))
 
-    def random(self, *, browser: Optional[str] = None, os: Optional[str] = None) -> Dict | None:
-        filtered = self.filter(browser=browser, os=os)
-        if not filtered:
+    def random(self, *, browser: Optional[str] = None, os: Optional[str] = None, type: Optional[str] = None) -> Dict | None:
+        entries = self.index.get(UALoader._key(browser, os, type))
+        if not entries:
             return None
-        return random.choice(filtered)
+        return random.choice(entries)
 
     def __len__(self) -> int:
         return len(self.data)
 
 
 UA_FILE = os.path.join(os.path.dirname(__file__), 'ua.jsonl')
-loader = UALoader(UA_FILE)
+# optional, written by ``python -m mcp_server_requests.ua --compile``, used when it matches UA_FILE
+UA_COMPILED_FILE = os.path.join(os.path.dirname(__file__), 'ua.bin')
+loader = UALoader(UA_FILE, UA_COMPILED_FILE)
 
 
-def random_ua(*, browser: Optional[str] = None, os: Optional[str] = None) -> str | None:
-    item = loader.random(browser=browser, os=os)
+def random_ua(*, browser: Optional[str] = None, os: Optional[str] = None, type: Optional[str] = None) -> str | None:
+    item = loader.random(browser=browser, os=os, type=type)
     if item is None:
         return None
     return item["useragent"]
@@ -117,8 +193,15 @@ def list_ua_browsers() -> list[str]:
 @click.command()
 @click.option('--browser', "-b", help='Filter by browser type (e.g. Chrome, Edge, Firefox, Opera)')
 @click.option('--os', help='Filter by operating system (e.g. Windows, Linux)')
+@click.option('--type', "type_", help='Filter by device type (e.g. desktop)')
 @click.option('--list', "-l", is_flag=True, help='List all available browser types and operating systems')
-def cli(browser: Optional[str], os: Optional[str], list: bool):
+@click.option('--compile', "compile_", is_flag=True, help=f'Write the compiled form of {os.path.basename(UA_FILE)} that loads faster')
+def cli(browser: Optional[str], os: Optional[str], type_: Optional[str], list: bool, compile_: bool):
+    if compile_:
+        count = compile_ua(UA_FILE, UA_COMPILED_FILE)
+        click.echo(f"Compiled {count} user agents to {UA_COMPILED_FILE}")
+        return
+
     if list:
         click.echo(f"User agents count: {len(loader)}")
         click.echo("Available browsers:")
@@ -130,9 +213,9 @@ def cli(browser: Optional[str], os: Optional[str], list: bool):
         return
 
     try:
-        ua = random_ua(browser=browser, os=os)
+        ua = random_ua(browser=browser, os=os, type=type_)
         if not ua:
-            click.echo(f"No user agent found for browser={browser}, os={os}")
+            click.echo(f"No user agent found for browser={browser}, os={os}, type={type_}")
         click.echo(ua)
     except ValueError as e:
         click.echo(f"Error: {e}", err=True)
@@ -1,44 +1,9 @@
 
-from typing import Iterable, Literal
+from typing import Callable, Iterable, Literal
+import functools
 import re
 
-from bs4 import BeautifulSoup
-from bs4.element import PageElement
-
-
-def clean_html(
-    html: str,
-    *,
-    allowed_attrs: Iterable[str] | bool = True,
-    clean_tags: Iterable[str] = ("script", "style", "meta", "link", "noscript")
-) -> str:
-    clean_tags = set(clean_tags)
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in clean_tags:
-        for element in soup.find_all(tag):
-            element.decompose()
-
-    node: PageElement
-
-    if allowed_attrs == True:
-        pass
-    elif not allowed_attrs:
-        for node in soup.find_all():
-            if isinstance(node, PageElement):
-                node.attrs.clear();
-    else:
-        allowed_attrs = {*allowed_attrs}
-
-        for node in soup.find_all():
-            attrs = node.attrs
-            rm_attrs = []
-            for attr in attrs.keys():
-                if attr not in allowed_attrs:
-                    rm_attrs.append(attr)
-            for rm_attr in rm_attrs:
-                attrs.pop(rm_attr)
-
-    return str(soup)
+from .clean import clean_html
 
 
 def simple_html_to_markdown(html: str, *, remove_tags: Iterable[str] = ("script", "style", "meta", "link", "noscript")) -> str:
@@ -56,6 +21,9 @@ def simple_html_to_markdown(html: str, *, remove_tags: Iterable[str] = ("script"
     - Horizontal rules: hr -> ---
     - Nested tags handling
     """
+    # imported here, it takes longer to import than most requests need
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     markdown = []
 
@@ -119,14 +87,31 @@ def simple_html_to_markdown(html: str, *, remove_tags: Iterable[str] = ("script"
     return result.strip()
 
 
-try:
-    from markdownify import markdownify
+@functools.cache
+def _markdown_converter() -> Callable[[str], str]:
+    # markdownify is imported by the first conversion, not at startup; the
+    # streaming converter only replaces it when it is not installed
+    try:
+        from markdownify import markdownify
+        return markdownify
+    except ImportError:
+        from .markdown import stream_html_to_markdown
+        return stream_html_to_markdown
+
+
+def html_to_markdown(html: str) -> str:
+    return _markdown_converter()(html)
+
+
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2, "g": 1024 ** 3, "gb": 1024 ** 3}
+
 
-    def html_to_markdown(html: str) -> str:
-        return markdownify(html)
-except ImportError:
-    def html_to_markdown(html: str):
-        return simple_html_to_markdown(html)
+def parse_size(s: str) -> int:
+    # 512, 64k, 32M, 1GB -> bytes
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", s)
+    if not m or m.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(f"invalid size: {s!r}, expected a number optionally followed by K, M or G")
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2).lower()])
 
 
 def parse(s: str) -> dict[str, str]:
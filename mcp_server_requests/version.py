@@ -1,6 +1,12 @@
-try:
-    from importlib import metadata
+def __getattr__(name: str) -> str:
+    # reading the installed metadata is slow, it is done on first use
+    if name == "__version__":
+        global __version__
+        try:
+            from importlib import metadata
 
-    __version__ = metadata.version(__package__)
-except ImportError:
-    __version__ = "unknown"
+            __version__ = metadata.version(__package__)
+        except ImportError:
+            __version__ = "unknown"
+        return __version__
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")